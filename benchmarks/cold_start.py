@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import load_test
+from load_test import ENVIRONMENT, EVENT_ID, LAYER, RESOURCES
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+HANDLERS = ['createMeeting', 'dialer', 'endMeeting', 'eventBridge', 'joinMeeting', 'queryMeeting', 'smaHandler']
+
+# The request each handler is first invoked with.  The load test flows make several calls, and only the
+# first of them is timed.
+FIRST_INVOCATIONS = {
+    'createMeeting': load_test.create_meeting,
+    'dialer': load_test.dial_queue,
+    'endMeeting': lambda handler: handler({'body': json.dumps({'meetingId': 'meeting-' + EVENT_ID})}, None),
+    'eventBridge': lambda handler: handler({'detail-type': 'Scheduled Event', 'detail': {}}, None),
+    'joinMeeting': load_test.join_meeting,
+    'queryMeeting': lambda handler: handler({'body': json.dumps({'meetingId': 'meeting-' + EVENT_ID, 'attendeeId': 'attendee-0'})}, None),
+    'smaHandler': load_test.inbound_call,
+}
+
+# The benchmark modules are only imported once the handler has been, so they add nothing to its import time
+PROBE = '''
+import importlib.util, json, sys, time
+start = time.perf_counter()
+modules = len(sys.modules)
+spec = importlib.util.spec_from_file_location('index', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_ms = (time.perf_counter() - start) * 1000
+modules = len(sys.modules) - modules
+import cold_start, load_test, stubs
+load_test.install_stubs({sys.argv[2]: module}, stubs.Latency())
+first = []
+def timed(event, context):
+    start = time.perf_counter()
+    try:
+        return module.handler(event, context)
+    finally:
+        if not first:
+            first.append((time.perf_counter() - start) * 1000)
+try:
+    cold_start.FIRST_INVOCATIONS[sys.argv[2]](timed)
+except Exception:
+    pass
+print(json.dumps({'import_ms': import_ms, 'first_ms': first[0], 'modules': modules}))
+'''
+
+
+def measure(name, repeats):
+    path = os.path.join(RESOURCES, name)
+    environment = dict(os.environ, **ENVIRONMENT)
+    environment['PYTHONPATH'] = os.pathsep.join([path, LAYER, BENCHMARKS])
+    environment['PYTHONDONTWRITEBYTECODE'] = '1'
+    samples = []
+    for index in range(repeats):
+        output = subprocess.run([sys.executable, '-c', PROBE, os.path.join(path, 'index.py'), name],
+                                env=environment, capture_output=True, text=True, check=True)
+        # The handlers may log to stdout, so the result is the last line
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        'import_ms': round(statistics.median(sample['import_ms'] for sample in samples), 1),
+        'first_ms': round(statistics.median(sample['first_ms'] for sample in samples), 1),
+        'cold_ms': round(statistics.median(sample['import_ms'] + sample['first_ms'] for sample in samples), 1),
+        'modules': samples[-1]['modules'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cold start of each handler in a fresh interpreter, its import and first invocation against stubbed AWS clients.')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--handler', action='append', choices=HANDLERS, help='defaults to every handler')
+    args = parser.parse_args()
+
+    print('%-14s %12s %12s %12s %10s' % ('handler', 'import ms', 'first ms', 'cold ms', 'modules'))
+    for name in args.handler or HANDLERS:
+        result = measure(name, args.repeats)
+        print('%-14s %12.1f %12.1f %12.1f %10d' % (name, result['import_ms'], result['first_ms'], result['cold_ms'], result['modules']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+from itertools import count
+
+LAYER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'resources', 'layer', 'python')
+sys.path.insert(0, LAYER)
+
+from sma_dialer.pacing import COUNTS, MAX_ACTIVE_CALLS, REDIAL_LIMIT, Pacer, hold_delay, redial_delay  # noqa: E402
+from sma_dialer.rate_limit import TokenBucket  # noqa: E402
+
+EVENT_ID = '123456'
+BATCH_SIZE = 10
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CallOutcomes:
+    # Draws what happens to each call placed: how long it rings, whether it is answered, what the participant
+    # presses, and how long an accepted call then stays in the meeting
+    def __init__(self, answer_rate, accept_rate, decline_rate, ring_seconds=30, meeting_seconds=600, seed=0):
+        self.answer_rate = answer_rate
+        self.accept_rate = accept_rate
+        self.decline_rate = decline_rate
+        self.ring_seconds = ring_seconds
+        self.meeting_seconds = meeting_seconds
+        self.random = random.Random(seed)
+
+    def draw(self):
+        # Returns the outcome, when it is known and when the call hangs up, in seconds after it was placed
+        if self.random.random() >= self.answer_rate:
+            return 'unanswered', self.ring_seconds, self.ring_seconds
+        resolved = self.random.uniform(4, 12) + self.random.uniform(3, 10)
+        choice = self.random.random()
+        if choice < self.accept_rate:
+            return 'accepted', resolved, resolved + self.random.uniform(0.5, 1.5) * self.meeting_seconds
+        if choice < self.accept_rate + self.decline_rate:
+            return 'declined', resolved, resolved
+        return 'abandoned', resolved, resolved
+
+
+def simulate(outcomes, roster, calls_per_second, dialers, pacer_options, redial_limit, max_seconds):
+    # Steps through the campaign one second at a time.  Every dialer reads the counters at the start of a
+    # second before any of them places a call, which is the worst case for dialers running at once.
+    clock = Clock()
+    pacers = [Pacer(shares=dialers, clock=clock, **pacer_options) for dialer in range(dialers)]
+    buckets = [TokenBucket(calls_per_second / dialers, clock=clock) for dialer in range(dialers)]
+    sequence = count()
+    queue = [(0.0, next(sequence), {'redials': 0, 'holds': 0}) for participant in range(roster)]
+    heapq.heapify(queue)
+    calls = []
+    counters = dict.fromkeys(COUNTS, 0)
+    counters['queued'] = roster
+    result = {'held': 0, 'redialed': 0, 'peak_active_calls': 0, 'finish_s': None}
+    active_calls = 0
+    unresolved = 0
+
+    while clock.now <= max_seconds:
+        while calls and calls[0][0] <= clock.now:
+            at, sequence_number, kind, job, outcome = heapq.heappop(calls)
+            if kind == 'resolve':
+                counters[outcome] += 1
+                unresolved -= 1
+                if outcome == 'unanswered' and job['redials'] < redial_limit:
+                    heapq.heappush(queue, (at + redial_delay(job['redials']), next(sequence), {'redials': job['redials'] + 1, 'holds': 0}))
+                    counters['redialed'] += 1
+                    result['redialed'] += 1
+            else:
+                counters['ended'] += 1
+                active_calls -= 1
+        if not queue and not unresolved:
+            result['finish_s'] = clock.now
+            break
+
+        reading = active_calls, {EVENT_ID: dict(counters)}
+        for pacer, bucket in zip(pacers, buckets):
+            placed = 0
+            batch = []
+            while queue and queue[0][0] <= clock.now and len(batch) < BATCH_SIZE:
+                batch.append(heapq.heappop(queue)[2])
+            pacer.observe(*reading, waiting={EVENT_ID: len(batch)})
+            for job in batch:
+                if not pacer.acquire(EVENT_ID):
+                    heapq.heappush(queue, (clock.now + hold_delay(job['holds']), next(sequence), dict(job, holds=job['holds'] + 1)))
+                    result['held'] += 1
+                    continue
+                if not bucket.try_acquire():
+                    pacer.release(EVENT_ID)
+                    heapq.heappush(queue, (clock.now + 1, next(sequence), job))
+                    continue
+                outcome, resolved, ended = outcomes.draw()
+                heapq.heappush(calls, (clock.now + resolved, next(sequence), 'resolve', job, outcome))
+                heapq.heappush(calls, (clock.now + ended, next(sequence), 'end', job, outcome))
+                placed += 1
+                active_calls += 1
+                unresolved += 1
+                result['peak_active_calls'] = max(result['peak_active_calls'], active_calls)
+            counters['placed'] += placed
+        clock.now += 1
+
+    rates = pacers[0].outcomes(EVENT_ID).rates()
+    result.update((name, counters[name]) for name in ('placed', 'accepted', 'declined', 'abandoned', 'unanswered'))
+    result['answer_rate'] = round(rates['answer_rate'], 2)
+    result['event_limit'] = pacers[0].event_limit(EVENT_ID)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run dial campaigns against simulated call outcomes, with and without the pacer.')
+    parser.add_argument('--roster', type=int, default=200)
+    parser.add_argument('--answer-rate', type=float, action='append', help='share of calls answered, defaults to 0.2, 0.5 and 0.8')
+    parser.add_argument('--accept-rate', type=float, default=0.6, help='share of answered calls that press 1')
+    parser.add_argument('--decline-rate', type=float, default=0.3, help='share of answered calls that press 2, the rest hang up')
+    parser.add_argument('--meeting-seconds', type=float, default=600, help='mean time an accepted call stays in the meeting')
+    parser.add_argument('--calls-per-second', type=float, default=1.0)
+    parser.add_argument('--dialers', type=int, default=2)
+    parser.add_argument('--max-active-calls', type=int, default=MAX_ACTIVE_CALLS)
+    parser.add_argument('--max-hours', type=float, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    modes = {
+        # Every job dialed as fast as the call rate allows and no-answers left alone, as before pacing
+        'unpaced': ({'max_active_calls': 10 ** 9}, 0),
+        'paced': ({'max_active_calls': args.max_active_calls}, REDIAL_LIMIT),
+    }
+    results = {}
+    for answer_rate in args.answer_rate or [0.2, 0.5, 0.8]:
+        for mode, (pacer_options, redial_limit) in modes.items():
+            outcomes = CallOutcomes(answer_rate, args.accept_rate, args.decline_rate, meeting_seconds=args.meeting_seconds, seed=args.seed)
+            result = simulate(outcomes, args.roster, args.calls_per_second, args.dialers, pacer_options, redial_limit, args.max_hours * 3600)
+            if mode == 'unpaced':
+                result['event_limit'] = None
+            results['%s@%.2f' % (mode, answer_rate)] = result
+
+    over_limit = [name for name, result in results.items() if name.startswith('paced') and result['peak_active_calls'] > args.max_active_calls]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print('%-14s %9s %8s %8s %8s %8s %8s %8s %8s %11s %8s %6s' % (
+            'campaign', 'finish s', 'placed', 'accept', 'decline', 'abandon', 'no ans', 'redials', 'held', 'peak calls', 'answer', 'limit'))
+        for name, result in results.items():
+            print('%-14s %9s %8d %8d %8d %8d %8d %8d %8d %11d %8.2f %6s' % (
+                name, '%d' % result['finish_s'] if result['finish_s'] is not None else '-', result['placed'], result['accepted'], result['declined'],
+                result['abandoned'], result['unanswered'], result['redialed'], result['held'], result['peak_active_calls'], result['answer_rate'],
+                '-' if result['event_limit'] is None else result['event_limit']))
+    if over_limit:
+        print('peak active calls over %d in %s' % (args.max_active_calls, ', '.join(over_limit)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+import argparse
+import importlib.util
+import io
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+import stubs
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'resources')
+LAYER = os.path.join(RESOURCES, 'layer', 'python')
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'MEETING_TABLE': 'benchmark-meetings',
+    'FROM_NUMBER': '+17035550100',
+    'FROM_EMAIL': 'dialer@example.com',
+    'SIP_MEDIA_APPLICATION_ID': 'benchmark-sma',
+    'DISTRIBUTION': 'example.cloudfront.net',
+    'EMAIL_TEMPLATE': 'benchmark-invitation',
+}
+EVENT_ID = '123456'
+PASSCODE = '654321'
+POOLED_PASSCODE = '111111'
+pool_table = None
+objects = {}
+PHONE_NUMBER = '+13125551212'
+MANIFEST_EVENT_IDS = [str(200000 + index) for index in range(8)]
+
+
+def load_handler(name):
+    for key, value in ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+    if LAYER not in sys.path:
+        sys.path.insert(0, LAYER)
+    path = os.path.join(RESOURCES, name)
+    sys.path.insert(0, path)
+    try:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(path, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(path)
+    return module
+
+
+def install_stubs(modules, latency, throttle=None):
+    # Every stub sits behind a circuit breaker, as the real clients do, and behind the throttle if given
+    from sma_dialer.circuit import GuardedClient, get_breaker
+    from sma_dialer.pacing import Pacer
+    from sma_dialer.rate_limit import TokenBucket
+
+    def client(stub, service_name):
+        if throttle is not None:
+            stub = stubs.Throttled(stub, throttle)
+        return GuardedClient(stub, get_breaker('%s:stub' % service_name))
+
+    table = stubs.StubTable(latency)
+    table.put_item(Item={'EventId': EVENT_ID, 'MeetingPasscode': PASSCODE, 'MeetingId': 'meeting-' + EVENT_ID, 'PhoneNumber': PHONE_NUMBER, 'Name': 'Benchmark'})
+    table.put_item(Item=pooled_row())
+    global pool_table
+    pool_table = table
+    for module in modules.values():
+        module.meeting_clients = stubs.StubRegions(client(stubs.meeting_client(latency), 'chime-sdk-meetings'))
+        module.meeting_table = client(table, 'dynamodb')
+        if hasattr(module, 'chime_sdk_voice_client'):
+            module.chime_sdk_voice_client = client(stubs.voice_client(latency), 'chime-sdk-voice')
+        if hasattr(module, 'ses_client'):
+            module.ses_client = client(stubs.email_client(latency), 'ses')
+        if hasattr(module, 's3_client'):
+            module.s3_client = client(stubs.object_client(latency, objects), 's3')
+        if hasattr(module, 'tracer'):
+            module.tracer.emit = lambda document: None
+        if hasattr(module, 'dial_bucket'):
+            # Measure the worker itself rather than the configured call rate
+            module.dial_bucket = TokenBucket(1e9, burst=1e9)
+        if hasattr(module, 'pacer'):
+            # Nothing ever hangs up here, so the active call count would otherwise hold every job back.
+            # benchmarks/dial_simulation.py exercises the pacer itself.
+            module.pacer = Pacer(max_active_calls=10 ** 9)
+    return table
+
+
+def pooled_row():
+    return {
+        'EventId': EVENT_ID,
+        'MeetingPasscode': POOLED_PASSCODE,
+        'MeetingId': 'meeting-' + EVENT_ID,
+        'AttendeeId': 'attendee-pooled',
+        'JoinToken': 'token-pooled',
+        'PoolStatus': 'READY',
+        'PhoneNumber': PHONE_NUMBER,
+        'Name': 'Benchmark'
+    }
+
+
+def sma_event(event_type, transaction_attributes, participants=1, action_data=None):
+    event = {
+        'SchemaVersion': '1.0',
+        'Sequence': 1,
+        'InvocationEventType': event_type,
+        'CallDetails': {
+            'TransactionId': 'transaction',
+            'AwsAccountId': '000000000000',
+            'AwsRegion': 'us-east-1',
+            'SipMediaApplicationId': ENVIRONMENT['SIP_MEDIA_APPLICATION_ID'],
+            'TransactionAttributes': transaction_attributes,
+            'Participants': [{
+                'CallId': 'call-%d' % index,
+                'ParticipantTag': 'LEG-%s' % 'AB'[index],
+                'To': '+17035550100',
+                'From': PHONE_NUMBER,
+                'Direction': 'Inbound',
+                'StartTimeInMilliseconds': '1700000000000',
+                'Status': 'Connected'
+            } for index in range(participants)]
+        }
+    }
+    if action_data:
+        event['ActionData'] = action_data
+    return event
+
+
+def digits(received_digits):
+    return {'Type': 'SpeakAndGetDigits', 'ReceivedDigits': received_digits, 'Parameters': {}}
+
+
+JOINED = {'Type': 'JoinChimeMeeting', 'Parameters': {}}
+
+
+def inbound_call(handler):
+    attributes = handler(sma_event('NEW_INBOUND_CALL', None), None)['TransactionAttributes']
+    attributes = handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=digits(EVENT_ID)), None)['TransactionAttributes']
+    attributes = handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=digits(PASSCODE)), None)['TransactionAttributes']
+    attributes = handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=JOINED), None)['TransactionAttributes']
+    handler(sma_event('HANGUP', attributes, participants=2), None)
+    return 5
+
+
+def pooled_inbound_call(handler):
+    # Puts the attendee back in the pool, as the refiller would, without counting a table call
+    item = pooled_row()
+    pool_table.items[(item['EventId'], item['MeetingPasscode'])] = item
+    attributes = handler(sma_event('NEW_INBOUND_CALL', None), None)['TransactionAttributes']
+    attributes = handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=digits(EVENT_ID)), None)['TransactionAttributes']
+    attributes = handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=digits(POOLED_PASSCODE)), None)['TransactionAttributes']
+    attributes = handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=JOINED), None)['TransactionAttributes']
+    handler(sma_event('HANGUP', attributes, participants=2), None)
+    return 5
+
+
+def outbound_call(handler):
+    arguments = {
+        'meeting_id': 'meeting-' + EVENT_ID,
+        'attendee_id': 'attendee-0',
+        'join_token': 'token-0',
+        'event_id': EVENT_ID,
+        'meeting_passcode': PASSCODE,
+        'phone_number': PHONE_NUMBER,
+    }
+    action_data = {'Type': 'CallAndBridge', 'Parameters': {'Arguments': arguments}}
+    attributes = handler(sma_event('NEW_OUTBOUND_CALL', None, action_data=action_data), None)['TransactionAttributes']
+    attributes = handler(sma_event('CALL_ANSWERED', attributes), None)['TransactionAttributes']
+    attributes = handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=digits('1')), None)['TransactionAttributes']
+    handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=JOINED), None)
+    return 4
+
+
+def create_meeting(handler):
+    body = {
+        'eventId': EVENT_ID,
+        'attendeeName': 'Benchmark',
+        'attendeePhoneNumber': PHONE_NUMBER,
+        'attendeeEmail': 'benchmark@example.com',
+        'attendeeCall': True
+    }
+    handler({'body': json.dumps(body)}, None)
+    return 1
+
+
+def create_manifest(handler):
+    # A new object version each time, so every iteration is a new run rather than a repeated notification.
+    # The previous run's rows are dropped first, without counting a table call.
+    create_manifest.version = getattr(create_manifest, 'version', 0) + 1
+    for key in [key for key in pool_table.items if key[0] in MANIFEST_EVENT_IDS]:
+        del pool_table.items[key]
+    objects['manifest.json'] = json.dumps({'Events': [{
+        'EventId': event_id,
+        'Participants': [{
+            'Name': 'Benchmark',
+            'PhoneNumber': '+1312555%04d' % participant,
+            'Email': 'benchmark@example.com',
+            'CallParticipant': True
+        } for participant in range(20)]
+    } for event_id in MANIFEST_EVENT_IDS]}).encode('utf-8')
+    record = {'s3': {'bucket': {'name': 'benchmark'}, 'object': {'key': 'manifest.json', 'versionId': str(create_manifest.version)}}}
+    handler({'Records': [record]}, None)
+    return 1
+
+
+def join_meeting(handler):
+    body = {'EventId': EVENT_ID, 'MeetingPasscode': PASSCODE, 'PhoneNumber': PHONE_NUMBER}
+    handler({'body': json.dumps(body)}, None)
+    return 1
+
+
+def dial_queue(handler):
+    from sma_dialer.dial_queue import InMemoryDialQueue
+    queue = InMemoryDialQueue()
+    queue.send([{
+        'meeting_id': 'meeting-' + EVENT_ID,
+        'attendee_id': 'attendee-%d' % index,
+        'join_token': 'token-%d' % index,
+        'event_id': EVENT_ID,
+        'meeting_passcode': PASSCODE,
+        'phone_number': PHONE_NUMBER,
+    } for index in range(25)])
+    return queue.drain(handler)
+
+
+SCENARIOS = {
+    'sma-inbound': ('smaHandler', inbound_call),
+    'sma-outbound': ('smaHandler', outbound_call),
+    'sma-pooled': ('smaHandler', pooled_inbound_call),
+    'create-meeting': ('createMeeting', create_meeting),
+    'create-manifest': ('createMeeting', create_manifest),
+    'join-meeting': ('joinMeeting', join_meeting),
+    'dialer': ('dialer', dial_queue),
+}
+
+
+def percentile(samples, fraction):
+    # None when every flow broke off before a handler returned
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_flow(scenario, handler):
+    # Returns the events handled and whether the flow broke off, which only a throttle should cause
+    try:
+        return scenario(handler), 0
+    except Exception:
+        return 0, 1
+
+
+def milliseconds(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def run_scenario(handler, scenario, iterations):
+    latencies = []
+
+    def timed(event, context):
+        start = time.perf_counter()
+        result = handler(event, context)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    start = time.perf_counter()
+    events = failed = 0
+    for index in range(iterations):
+        flow_events, flow_failed = run_flow(scenario, timed)
+        events += flow_events
+        failed += flow_failed
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    traced_events = 0
+    allocated = 0
+    for index in range(max(1, iterations // 10)):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        traced_events += run_flow(scenario, handler)[0]
+        allocated += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    # Sized on a separate pass so serializing the responses is not timed or traced
+    sizes = []
+
+    def sized(event, context):
+        result = handler(event, context)
+        sizes.append(len(json.dumps(result, separators=(',', ':'), default=str)))
+        return result
+    run_flow(scenario, sized)
+
+    return {
+        'events': events,
+        'failed_flows': failed,
+        'p50_ms': milliseconds(percentile(latencies, 0.50)),
+        'p99_ms': milliseconds(percentile(latencies, 0.99)),
+        'events_per_second': round(events / elapsed, 1),
+        'peak_kib_per_event': round(allocated / max(1, traced_events) / 1024, 2),
+        'response_bytes': round(sum(sizes) / max(1, len(sizes))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay SMA call flows and API requests against the handlers with stubbed AWS clients.')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='mean latency added to every stubbed AWS call')
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of stubbed AWS calls that fail with ThrottlingException')
+    parser.add_argument('--log-level', default='INFO')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='defaults to every scenario')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    os.environ['LOG_LEVEL'] = args.log_level
+    logging.getLogger().addHandler(logging.StreamHandler(io.StringIO()))
+    latency = stubs.Latency(args.latency_ms, args.jitter_ms)
+    scenarios = args.scenario or sorted(SCENARIOS)
+    modules = {name: load_handler(name) for name in {SCENARIOS[scenario][0] for scenario in scenarios}}
+    logging.getLogger().setLevel(args.log_level)
+    throttle = stubs.Throttle(args.throttle_rate) if args.throttle_rate else None
+    install_stubs(modules, latency, throttle)
+
+    results = {}
+    for scenario in scenarios:
+        name, flow = SCENARIOS[scenario]
+        results[scenario] = run_scenario(modules[name].handler, flow, args.iterations)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print('%-16s %8s %8s %10s %10s %12s %14s %10s' % ('scenario', 'events', 'failed', 'p50 ms', 'p99 ms', 'events/s', 'peak KiB/evt', 'resp bytes'))
+    for scenario, result in results.items():
+        print('%-16s %8d %8d %10s %10s %12.1f %14.2f %10d' % (
+            scenario, result['events'], result['failed_flows'], '-' if result['p50_ms'] is None else '%.3f' % result['p50_ms'],
+            '-' if result['p99_ms'] is None else '%.3f' % result['p99_ms'], result['events_per_second'], result['peak_kib_per_event'],
+            result['response_bytes']))
+    if throttle is not None:
+        from sma_dialer.circuit import breakers
+        print('throttled %d calls, circuit breakers rejected %d' % (throttle.throttled, sum(breaker.rejected for breaker in breakers())))
+
+
+if __name__ == '__main__':
+    main()
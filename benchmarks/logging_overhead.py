@@ -0,0 +1,58 @@
+import argparse
+import io
+import json
+import logging
+import sys
+import timeit
+
+from load_test import LAYER, digits, sma_event
+
+sys.path.insert(0, LAYER)
+
+from sma_dialer.log import LazyJson, log_payload  # noqa: E402
+
+PREFIX = 'SMA Handler: '
+
+
+def eager(logger, event, response):
+    logger.info('%s RECV Event: %s', PREFIX, json.dumps(event, indent=4))
+    logger.info('%s RESPONSE %s', PREFIX, json.dumps(response, indent=4))
+
+
+def lazy(logger, event, response):
+    logger.info('%s RECV %s %s', PREFIX, event['InvocationEventType'], event['ActionData']['Type'])
+    log_payload(logger, '%s RECV Event: %s', PREFIX, event, event['CallDetails']['TransactionId'])
+    logger.info('%s RESPONSE %s', PREFIX, [action['Type'] for action in response['Actions']])
+    log_payload(logger, '%s RESPONSE %s', PREFIX, response)
+
+
+def lazy_info(logger, event, response):
+    logger.info('%s RECV Event: %s', PREFIX, LazyJson(event))
+    logger.info('%s RESPONSE %s', PREFIX, LazyJson(response))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-event logging cost of eager json.dumps against lazy structured logging.')
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    event = sma_event('ACTION_SUCCESSFUL', {'call_type': 'inbound', 'event_id': '123456'}, participants=2, action_data=digits('654321'))
+    response = {
+        'SchemaVersion': '1.0',
+        'Actions': [{'Type': 'JoinChimeMeeting', 'Parameters': {'JoinToken': 'token', 'CallId': 'call-0', 'MeetingId': 'meeting'}}],
+        'TransactionAttributes': event['CallDetails']['TransactionAttributes']
+    }
+    logger = logging.getLogger('benchmark')
+    logger.propagate = False
+    logger.addHandler(logging.StreamHandler(io.StringIO()))
+
+    print('%-8s %-26s %12s' % ('level', 'pattern', 'us/event'))
+    for level in ['WARN', 'INFO', 'DEBUG']:
+        logger.setLevel(level)
+        for name, pattern in [('eager json.dumps(indent=4)', eager), ('lazy summary + payload', lazy), ('lazy payload at INFO', lazy_info)]:
+            seconds = timeit.timeit(lambda: pattern(logger, event, response), number=args.number)
+            print('%-8s %-26s %12.2f' % (level, name, seconds / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
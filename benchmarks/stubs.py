@@ -0,0 +1,269 @@
+import copy
+import random
+import re
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+class Latency:
+    def __init__(self, mean_ms=0.0, jitter_ms=0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    def wait(self):
+        delay = self.mean_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+
+class Throttle:
+    # Fails a share of stubbed calls the way a throttled service does, after botocore has given up
+    def __init__(self, rate=0.0, code='ThrottlingException'):
+        self.rate = rate
+        self.code = code
+        self.throttled = 0
+
+    def check(self, operation_name):
+        if self.rate and random.random() < self.rate:
+            self.throttled += 1
+            raise ClientError({'Error': {'Code': self.code, 'Message': 'Rate exceeded'}, 'ResponseMetadata': {'HTTPStatusCode': 400}}, operation_name)
+
+
+class Throttled:
+    # Puts a Throttle in front of a stub client or table, leaving its other attributes alone
+    def __init__(self, client, throttle):
+        self.client = client
+        self.throttle = throttle
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+
+        def operation(*args, **kwargs):
+            self.throttle.check(name)
+            return attribute(*args, **kwargs)
+        return operation
+
+
+class StubClient:
+    def __init__(self, latency, **operations):
+        self.latency = latency
+        self.operations = operations
+        self.calls = 0
+
+    def __getattr__(self, name):
+        if name not in self.operations:
+            raise AttributeError(name)
+
+        def operation(*args, **kwargs):
+            self.calls += 1
+            self.latency.wait()
+            return self.operations[name](*args, **kwargs)
+        return operation
+
+
+def meeting_client(latency):
+    counter = {'attendees': 0}
+
+    def attendee(external_user_id):
+        counter['attendees'] += 1
+        return {
+            'AttendeeId': 'attendee-%d' % counter['attendees'],
+            'ExternalUserId': external_user_id,
+            'JoinToken': 'token-%d' % counter['attendees']
+        }
+
+    def create_meeting_with_attendees(**kwargs):
+        return {
+            'Meeting': {'MeetingId': 'meeting-' + kwargs['ExternalMeetingId'], 'ExternalMeetingId': kwargs['ExternalMeetingId']},
+            'Attendees': [attendee(item['ExternalUserId']) for item in kwargs['Attendees']],
+            'Errors': []
+        }
+
+    def batch_create_attendee(**kwargs):
+        return {'Attendees': [attendee(item['ExternalUserId']) for item in kwargs['Attendees']], 'Errors': []}
+
+    return StubClient(
+        latency,
+        create_meeting_with_attendees=create_meeting_with_attendees,
+        batch_create_attendee=batch_create_attendee,
+        list_attendees=lambda **kwargs: {'Attendees': []},
+        delete_attendee=lambda **kwargs: {},
+        delete_meeting=lambda **kwargs: {},
+    )
+
+
+class StubRegions:
+    # Hands out the same stub whatever control region the handler asks for
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, region_name=None):
+        return self.client
+
+
+def voice_client(latency):
+    return StubClient(latency, create_sip_media_application_call=lambda **kwargs: {'SipMediaApplicationCall': {'TransactionId': 'transaction'}})
+
+
+def email_client(latency):
+    def send_bulk_templated_email(**kwargs):
+        return {'Status': [{'Status': 'Success', 'MessageId': 'message-%d' % index} for index in range(len(kwargs['Destinations']))]}
+
+    return StubClient(latency, send_bulk_templated_email=send_bulk_templated_email)
+
+
+class StubBody:
+    def __init__(self, body):
+        self.body = body
+
+    def read(self, amt=None):
+        data, self.body = (self.body, b'') if amt is None else (self.body[:amt], self.body[amt:])
+        return data
+
+    def close(self):
+        pass
+
+
+def object_client(latency, objects):
+    # Objects are kept as bytes by key, with the content type taken from the extension
+    def get_object(Bucket, Key, **kwargs):
+        if Key not in objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'The specified key does not exist.'}}, 'GetObject')
+        content_type = 'text/csv' if Key.endswith('.csv') else 'application/json'
+        body = objects[Key]
+        if 'Range' in kwargs:
+            start, end = (int(position) for position in kwargs['Range'][len('bytes='):].split('-'))
+            body = body[start:end + 1]
+        return {'Body': StubBody(body), 'ContentType': content_type, 'ContentLength': len(body), 'ETag': '"stub"', 'Metadata': {}}
+
+    def put_object(Bucket, Key, Body, **kwargs):
+        objects[Key] = Body
+        return {}
+
+    return StubClient(latency, get_object=get_object, put_object=put_object)
+
+
+class StubTable:
+    # Every request holds a lock, so handlers that call the table from thread pools see each request applied
+    # atomically, as DynamoDB does
+    def __init__(self, latency):
+        self.latency = latency
+        self.items = {}
+        self.calls = 0
+        self.lock = threading.RLock()
+
+    def _call(self):
+        self.calls += 1
+        self.latency.wait()
+
+    def _key(self, key):
+        return (str(key['EventId']), str(key['MeetingPasscode']))
+
+    def _check(self, key, kwargs):
+        if 'ConditionExpression' in kwargs and not self._matches(self.items.get(key, {}), kwargs['ConditionExpression'], kwargs):
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'The conditional request failed'}}, 'UpdateItem')
+
+    def _matches(self, item, condition, kwargs):
+        # Evaluates the comparisons, attribute_exists checks and AND/OR/parentheses the handlers use
+        names = kwargs.get('ExpressionAttributeNames') or {}
+        values = kwargs.get('ExpressionAttributeValues') or {}
+
+        def attribute(name):
+            return repr(names.get(name, name))
+
+        expression = re.sub(r'attribute_(not_)?exists\((#?\w+)\)',
+                            lambda match: '(%s %sin item)' % (attribute(match.group(2)), 'not ' if match.group(1) else ''),
+                            condition)
+        expression = re.sub(r'(#?\w+)\s*(=|<>|<|>)\s*(:\w+)',
+                            lambda match: '(item.get(%s) %s values[%r])' % (attribute(match.group(1)), {'=': '==', '<>': '!='}.get(match.group(2), match.group(2)), match.group(3)),
+                            expression)
+        expression = re.sub(r'\bAND\b', 'and', re.sub(r'\bOR\b', 'or', expression))
+        try:
+            return eval(expression, {}, {'item': item, 'values': values})
+        except TypeError:
+            return False
+
+    def put_item(self, Item, **kwargs):
+        self._call()
+        with self.lock:
+            self._check(self._key(Item), kwargs)
+            self.items[self._key(Item)] = copy.deepcopy(Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self._call()
+        with self.lock:
+            item = self.items.get(self._key(Key))
+            return {'Item': copy.deepcopy(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression='', ExpressionAttributeValues=None, **kwargs):
+        # Applies plain SET and ADD clauses, which is all the handlers use
+        self._call()
+        with self.lock:
+            self._check(self._key(Key), dict(kwargs, ExpressionAttributeValues=ExpressionAttributeValues or {}))
+            item = self.items.setdefault(self._key(Key), dict(Key))
+            values = ExpressionAttributeValues or {}
+            names = kwargs.get('ExpressionAttributeNames') or {}
+            for action, clause in re.findall(r'(SET|ADD|REMOVE)\s+(.*?)(?=\s+(?:SET|ADD|REMOVE)\s|$)', UpdateExpression, re.IGNORECASE):
+                for assignment in re.split(r',(?![^(]*\))', clause):
+                    if action.upper() == 'REMOVE':
+                        item.pop(names.get(assignment.strip(), assignment.strip()), None)
+                    elif action.upper() == 'ADD':
+                        name, value = assignment.split()
+                        name = names.get(name, name)
+                        item[name] = item.get(name, 0) + values[value]
+                    elif '=' in assignment:
+                        name, value = (part.strip() for part in assignment.split('=', 1))
+                        name = names.get(name, name)
+                        default = re.match(r'if_not_exists\(\s*[#\w]+\s*,\s*(:\w+)\s*\)', value)
+                        if default:
+                            item.setdefault(name, values[default.group(1)])
+                        elif value in values:
+                            item[name] = values[value]
+            return {'Attributes': copy.deepcopy(item)}
+
+    def scan(self, **kwargs):
+        self._call()
+        with self.lock:
+            items = [copy.deepcopy(item) for item in self.items.values() if 'ActiveMeetingId' in item]
+        return {'Items': items, 'Count': len(items)}
+
+    def query(self, ExpressionAttributeValues=None, IndexName=None, **kwargs):
+        # Base table queries are always on the EventId partition, and index queries on MeetingAttendeeIndex
+        self._call()
+        with self.lock:
+            values = ExpressionAttributeValues or {}
+            if IndexName == 'MeetingAttendeeIndex':
+                items = [
+                    copy.deepcopy(item) for item in self.items.values()
+                    if item.get('MeetingId') == values.get(':m') and (':a' not in values or item.get('AttendeeId') == values[':a'])
+                ]
+            elif IndexName is not None:
+                return {'Items': [], 'Count': 0}
+            else:
+                items = [copy.deepcopy(item) for key, item in self.items.items() if key[0] == str(values.get(':e'))]
+            if 'FilterExpression' in kwargs:
+                items = [item for item in items if self._matches(item, kwargs['FilterExpression'], dict(kwargs, ExpressionAttributeValues=ExpressionAttributeValues))]
+            return {'Items': items, 'Count': len(items)}
+
+    def delete_item(self, Key, **kwargs):
+        self._call()
+        with self.lock:
+            self._check(self._key(Key), kwargs)
+            self.items.pop(self._key(Key), None)
+        return {}
+
+    def batch_write(self, requests):
+        self._call()
+        with self.lock:
+            for request in requests:
+                if 'PutRequest' in request:
+                    item = request['PutRequest']['Item']
+                    self.items[self._key(item)] = copy.deepcopy(item)
+                else:
+                    self.items.pop(self._key(request['DeleteRequest']['Key']), None)
+        return []
@@ -30,3 +30,5 @@ export const AmplifyConfig = {
         ],
     },
 };
+
+export const RosterFeedUrl = config.rosterFeedUrl;
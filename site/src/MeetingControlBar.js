@@ -15,7 +15,7 @@ import { API, Auth } from 'aws-amplify';
 import '@aws-amplify/ui-react/styles.css';
 import '@cloudscape-design/global-styles/index.css';
 
-const MeetingControlBar = ({ meetingId }) => {
+const MeetingControlBar = ({ meetingId, mediaRegion }) => {
     const meetingManager = useMeetingManager();
     const navigate = useNavigate();
 
@@ -40,7 +40,7 @@ const MeetingControlBar = ({ meetingId }) => {
         console.log(`Auth ${JSON.stringify(await Auth.currentUserInfo())}`);
         event.preventDefault();
         try {
-            await API.post('meetingAPI', 'end', { body: { meetingId: meetingId } });
+            await API.post('meetingAPI', 'end', { body: { meetingId: meetingId, mediaRegion: mediaRegion } });
         } catch (err) {
             console.log(`{err in handleEnd: ${err}`);
         }
@@ -3,40 +3,96 @@ import './App.css';
 import { Roster, RosterGroup, RosterAttendee, useRosterState } from 'amazon-chime-sdk-component-library-react';
 import '@aws-amplify/ui-react/styles.css';
 import '@cloudscape-design/global-styles/index.css';
-import { API } from 'aws-amplify';
+import { API, Auth } from 'aws-amplify';
+import { RosterFeedUrl } from './Config';
+
+const applyDeltas = (attendees, deltas) => {
+    const updated = { ...attendees };
+    for (const delta of deltas) {
+        if (delta.Type === 'Upsert') {
+            updated[delta.Attendee.AttendeeId] = { ...updated[delta.Attendee.AttendeeId], ...delta.Attendee };
+        } else if (delta.Type === 'Remove') {
+            delete updated[delta.AttendeeId];
+        }
+    }
+    return updated;
+};
 
 const RosterContainer = (meetingId) => {
     const { roster } = useRosterState();
     const rosterAttendees = Object.values(roster);
+    const [queriedAttendees, setQueriedAttendees] = useState({});
     const [mergedAttendees, setMergedAttendees] = useState([]);
-    let attendees = [];
 
     useEffect(() => {
-        async function queryMeeting() {
+        if (meetingId.meetingId === '') {
+            return;
+        }
+        let socket;
+        let closed = false;
+        let pending = [];
+        let snapshotLoaded = false;
+
+        async function subscribe() {
+            const token = (await Auth.currentSession()).getAccessToken().getJwtToken();
+            socket = new WebSocket(
+                `${RosterFeedUrl}?meetingId=${encodeURIComponent(meetingId.meetingId)}&token=${encodeURIComponent(token)}`,
+            );
+            socket.onmessage = (message) => {
+                const update = JSON.parse(message.data);
+                console.log(`Roster Update:  ${JSON.stringify(update)}`);
+                if (snapshotLoaded) {
+                    setQueriedAttendees((attendees) => applyDeltas(attendees, update.Deltas));
+                } else {
+                    pending = pending.concat(update.Deltas);
+                }
+            };
+            if (closed) {
+                socket.close();
+            }
+        }
+
+        async function querySnapshot() {
             console.log(`MeetingId:  ${JSON.stringify(meetingId)}`);
-            if (meetingId.meetingId !== '') {
-                const queriedAttendees = await API.post('meetingAPI', 'query', {
-                    body: { meetingId: meetingId.meetingId },
+            let snapshot = {};
+            let nextToken;
+            do {
+                const page = await API.post('meetingAPI', 'query', {
+                    body: { meetingId: meetingId.meetingId, nextToken: nextToken },
                 });
-                console.log(`Queried Attendees:  ${JSON.stringify(queriedAttendees)}`);
-                console.log(`Roster Attendees:  ${JSON.stringify(rosterAttendees)}`);
-                for (let i = 0; i < rosterAttendees.length; i++) {
-                    console.log(`RosterAttendeeFor:  ${JSON.stringify(rosterAttendees[i])}`);
-                    console.log(`QueriedAttendeeFor:  ${JSON.stringify(queriedAttendees)}`);
-                    attendees.push({
-                        ...rosterAttendees[i],
-                        ...queriedAttendees.find(
-                            (attendee) => attendee.AttendeeId === rosterAttendees[i].chimeAttendeeId,
-                        ),
-                    });
+                for (const attendee of page.Attendees) {
+                    snapshot[attendee.AttendeeId] = attendee;
                 }
-                console.log(`MergedAttendees:   ${JSON.stringify(attendees)}`);
+                nextToken = page.NextToken;
+            } while (nextToken);
+            console.log(`Queried Attendees:  ${JSON.stringify(snapshot)}`);
+            // Updates that arrived while the snapshot was loading are applied on top of it
+            snapshotLoaded = true;
+            setQueriedAttendees(applyDeltas(snapshot, pending));
+            pending = [];
+        }
 
-                setMergedAttendees(attendees);
+        // Subscribe before reading the snapshot so no update falls between the two
+        subscribe()
+            .catch((error) => console.log(`Roster feed unavailable:  ${error}`))
+            .then(querySnapshot);
+        return () => {
+            closed = true;
+            if (socket) {
+                socket.close();
             }
-        }
-        queryMeeting();
-    }, [roster]);
+        };
+    }, [meetingId.meetingId]);
+
+    useEffect(() => {
+        console.log(`Roster Attendees:  ${JSON.stringify(rosterAttendees)}`);
+        const attendees = rosterAttendees.map((rosterAttendee) => ({
+            ...rosterAttendee,
+            ...queriedAttendees[rosterAttendee.chimeAttendeeId],
+        }));
+        console.log(`MergedAttendees:   ${JSON.stringify(attendees)}`);
+        setMergedAttendees(attendees);
+    }, [roster, queriedAttendees]);
 
     const attendeeItems = mergedAttendees.map((attendee) => {
         console.log(`Attendee:  ${JSON.stringify(attendee)}`);
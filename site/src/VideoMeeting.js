@@ -25,6 +25,7 @@ const VideoMeeting = ({}) => {
     const meetingManager = useMeetingManager();
     const [search, setSearch] = useSearchParams();
     const [meetingId, setMeetingId] = useState('');
+    const [mediaRegion, setMediaRegion] = useState('');
 
     useEffect(() => {
         async function joinMeeting() {
@@ -54,6 +55,7 @@ const VideoMeeting = ({}) => {
                 await meetingManager.start();
                 meetingManager.invokeDeviceProvider(DeviceLabels.AudioAndVideo);
                 setMeetingId(joinResponse.Meeting.MeetingId);
+                setMediaRegion(joinResponse.Meeting.MediaRegion);
             } catch (err) {
                 console.log(`err in handleJoin: ${err}`);
             }
@@ -79,7 +81,7 @@ const VideoMeeting = ({}) => {
                 <>
                     <SpaceBetween direction="horizontal" size="l">
                         <RosterContainer meetingId={meetingId} />
-                        <Container footer={<MeetingControlBar meetingId={meetingId} />}>
+                        <Container footer={<MeetingControlBar meetingId={meetingId} mediaRegion={mediaRegion} />}>
                             <div style={{ height: '600px', width: '720px' }}>
                                 <VideoTileGrid />
                             </div>
@@ -16,6 +16,9 @@ import {
   DistributionResources,
   CloudWatchResources,
   EventBridgeResources,
+  CommonLayer,
+  DialerResources,
+  RosterFeed,
 } from '.';
 
 interface SMAMeetingDialerProps extends StackProps {
@@ -26,6 +29,10 @@ interface SMAMeetingDialerProps extends StackProps {
   allowedDomain: string;
   fromEmail: string;
   logLevel: string;
+  debugSampleRate: string;
+  callsPerSecond: string;
+  maxActiveCalls: string;
+  mediaRegion: string;
 }
 
 interface CognitoOutput {
@@ -41,11 +48,28 @@ export class SMAMeetingDialer extends Stack {
 
     const database = new Database(this, 'Database');
 
+    const commonLayer = new CommonLayer(this, 'CommonLayer');
+
     const distribution = new DistributionResources(this, 'Distribution');
 
     const pstnAudio = new PSTNAudio(this, 'PSTNAudio', {
       meetingTable: database.meetingTable,
+      commonLayer: commonLayer.layer,
+      mediaRegion: props.mediaRegion,
+      logLevel: props.logLevel,
+      debugSampleRate: props.debugSampleRate,
+    });
+
+    const dialer = new DialerResources(this, 'Dialer', {
+      meetingTable: database.meetingTable,
+      fromNumber: pstnAudio.smaPhoneNumber,
+      sipMediaApplicationId: pstnAudio.sipMediaApplicationId,
+      commonLayer: commonLayer.layer,
+      callsPerSecond: props.callsPerSecond,
+      maxActiveCalls: props.maxActiveCalls,
+      smaHandler: pstnAudio.smaHandler,
       logLevel: props.logLevel,
+      debugSampleRate: props.debugSampleRate,
     });
 
     let cognito: CognitoOutput;
@@ -68,16 +92,35 @@ export class SMAMeetingDialer extends Stack {
     }
 
     const eventBridge = new EventBridgeResources(this, 'EventBridgeResources', {
+      meetingTable: database.meetingTable,
+      commonLayer: commonLayer.layer,
       logLevel: props.logLevel,
+      debugSampleRate: props.debugSampleRate,
     });
+
+    const rosterFeed = new RosterFeed(this, 'RosterFeed', {
+      meetingTable: database.meetingTable,
+      chimeSdkRule: eventBridge.chimeSdkRule,
+      userPool: cognito.userPool,
+      userPoolClient: cognito.userPoolClient,
+      userPoolRegion: cognito.userPoolRegion,
+      commonLayer: commonLayer.layer,
+      logLevel: props.logLevel,
+      debugSampleRate: props.debugSampleRate,
+    });
+
     const infrastructure = new Infrastructure(this, 'Infrastructure', {
       meetingTable: database.meetingTable,
       userPool: cognito.userPool,
       distribution: distribution.distribution,
       fromNumber: pstnAudio.smaPhoneNumber,
       sipMediaApplicationId: pstnAudio.sipMediaApplicationId,
+      dialQueue: dialer.dialQueue,
       fromEmail: props.fromEmail,
+      commonLayer: commonLayer.layer,
+      mediaRegion: props.mediaRegion,
       logLevel: props.logLevel,
+      debugSampleRate: props.debugSampleRate,
     });
 
     const cloudwatchResources = new CloudWatchResources(
@@ -90,11 +133,14 @@ export class SMAMeetingDialer extends Stack {
         createMeetingHandler: infrastructure.createMeetingHandler,
         smaHandler: pstnAudio.smaHandler,
         eventBridge: eventBridge.eventBridgeLambda,
+        dialerHandler: dialer.dialerHandler,
+        rosterFeedHandler: rosterFeed.rosterFeedHandler,
       },
     );
 
     new Site(this, 'Site', {
       apiUrl: infrastructure.apiUrl,
+      rosterFeedUrl: rosterFeed.rosterFeedUrl,
       userPool: cognito.userPool,
       userPoolClient: cognito.userPoolClient,
       distribution: distribution.distribution,
@@ -111,6 +157,7 @@ export class SMAMeetingDialer extends Stack {
     });
 
     new CfnOutput(this, 'API_URL', { value: infrastructure.apiUrl });
+    new CfnOutput(this, 'rosterFeedUrl', { value: rosterFeed.rosterFeedUrl });
     new CfnOutput(this, 'USER_POOL_REGION', { value: cognito.userPoolRegion });
     new CfnOutput(this, 'USER_POOL_ID', { value: cognito.userPool.userPoolId });
     new CfnOutput(this, 'USER_POOL_CLIENT', {
@@ -154,6 +201,10 @@ const stackProps = {
   allowedDomain: process.env.ALLOWED_DOMAIN || '',
   fromEmail: process.env.FROM_EMAIL || '',
   logLevel: process.env.LOG_LEVEL || 'info',
+  debugSampleRate: process.env.DEBUG_SAMPLE_RATE || '1',
+  callsPerSecond: process.env.CALLS_PER_SECOND || '1',
+  maxActiveCalls: process.env.MAX_ACTIVE_CALLS || '20',
+  mediaRegion: process.env.MEDIA_REGION || 'us-east-1',
 };
 
 const app = new App();
@@ -1,12 +1,27 @@
-import { Stack } from 'aws-cdk-lib';
+import { Duration, Stack } from 'aws-cdk-lib';
 import {
   Dashboard,
+  GraphWidget,
   LogQueryVisualizationType,
   LogQueryWidget,
+  MathExpression,
+  Metric,
 } from 'aws-cdk-lib/aws-cloudwatch';
 import { Function } from 'aws-cdk-lib/aws-lambda';
 import { Construct } from 'constructs';
 
+const METRICS_NAMESPACE = 'SMADialer';
+
+function meetingMetric(metricName: string, statistic: string = 'Sum') {
+  return new Metric({
+    namespace: METRICS_NAMESPACE,
+    metricName: metricName,
+    dimensionsMap: { Service: 'SMADialer' },
+    statistic: statistic,
+    period: Duration.minutes(5),
+  });
+}
+
 interface CloudWatchResourcesProps {
   createMeetingHandler: Function;
   joinMeetingHandler: Function;
@@ -14,6 +29,8 @@ interface CloudWatchResourcesProps {
   endMeetingHandler: Function;
   smaHandler: Function;
   eventBridge: Function;
+  dialerHandler: Function;
+  rosterFeedHandler: Function;
 }
 
 export class CloudWatchResources extends Construct {
@@ -36,6 +53,8 @@ export class CloudWatchResources extends Construct {
           props.queryMeetingHandler.logGroup.logGroupName,
           props.smaHandler.logGroup.logGroupName,
           props.eventBridge.logGroup.logGroupName,
+          props.dialerHandler.logGroup.logGroupName,
+          props.rosterFeedHandler.logGroup.logGroupName,
         ],
         width: 24,
         region: Stack.of(this).region,
@@ -47,5 +66,86 @@ export class CloudWatchResources extends Construct {
         ],
       }),
     );
+
+    this.dashboard.addWidgets(
+      new GraphWidget({
+        title: 'Attendee Churn',
+        left: [
+          meetingMetric('AttendeesJoined'),
+          meetingMetric('AttendeesLeft'),
+          meetingMetric('AttendeesDropped'),
+        ],
+        width: 8,
+      }),
+      new GraphWidget({
+        title: 'Join Method',
+        left: [meetingMetric('PstnJoins'), meetingMetric('WebRtcJoins')],
+        width: 8,
+      }),
+      new GraphWidget({
+        title: 'Join Latency',
+        left: [
+          meetingMetric('JoinLatency', 'p50'),
+          meetingMetric('JoinLatency', 'p90'),
+        ],
+        width: 8,
+      }),
+    );
+
+    this.dashboard.addWidgets(
+      new GraphWidget({
+        title: 'Dial Answer Rate',
+        left: [
+          new MathExpression({
+            expression: 'IF(placed > 0, 100 * answered / placed, 0)',
+            usingMetrics: {
+              answered: meetingMetric('CallsAnswered'),
+              placed: meetingMetric('CallsPlaced'),
+            },
+            label: 'Answered (%)',
+            period: Duration.minutes(5),
+          }),
+          new MathExpression({
+            expression: 'IF(answered > 0, 100 * accepted / answered, 0)',
+            usingMetrics: {
+              accepted: meetingMetric('CallsAccepted'),
+              answered: meetingMetric('CallsAnswered'),
+            },
+            label: 'Accepted (%)',
+            period: Duration.minutes(5),
+          }),
+        ],
+        right: [
+          meetingMetric('CallsPlaced'),
+          meetingMetric('CallsAnswered'),
+          meetingMetric('CallsFailed'),
+        ],
+        width: 24,
+      }),
+    );
+
+    this.dashboard.addWidgets(
+      new GraphWidget({
+        title: 'SMA Turn Time p99',
+        left: [
+          meetingMetric('SmaTurnTime', 'p99'),
+          meetingMetric('GetItemTime', 'p99'),
+          meetingMetric('CreateMeetingWithAttendeesTime', 'p99'),
+          meetingMetric('UpdateTableTime', 'p99'),
+          meetingMetric('UpdateAttendeeCountTime', 'p99'),
+          meetingMetric('DeleteAttendeeTime', 'p99'),
+        ],
+        width: 12,
+      }),
+      new GraphWidget({
+        title: 'Call Setup Time',
+        left: [
+          meetingMetric('CallSetupTime', 'p50'),
+          meetingMetric('CallSetupTime', 'p99'),
+        ],
+        right: [meetingMetric('CallSetupHandlerTime', 'p99')],
+        width: 12,
+      }),
+    );
   }
 }
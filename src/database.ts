@@ -5,6 +5,7 @@ import {
   BillingMode,
   TableEncryption,
   ProjectionType,
+  StreamViewType,
 } from 'aws-cdk-lib/aws-dynamodb';
 import { Construct } from 'constructs';
 
@@ -27,15 +28,30 @@ export class Database extends Construct {
       encryption: TableEncryption.AWS_MANAGED,
       timeToLiveAttribute: 'TTL',
       billingMode: BillingMode.PAY_PER_REQUEST,
+      stream: StreamViewType.NEW_AND_OLD_IMAGES,
     });
 
     this.meetingTable.addGlobalSecondaryIndex({
-      projectionType: ProjectionType.ALL,
-      indexName: 'MeetingIdIndex',
+      projectionType: ProjectionType.INCLUDE,
+      nonKeyAttributes: ['Name', 'JoinMethod'],
+      indexName: 'MeetingAttendeeIndex',
       partitionKey: {
         name: 'MeetingId',
         type: AttributeType.STRING,
       },
+      sortKey: {
+        name: 'AttendeeId',
+        type: AttributeType.STRING,
+      },
+    });
+
+    this.meetingTable.addGlobalSecondaryIndex({
+      projectionType: ProjectionType.KEYS_ONLY,
+      indexName: 'ActiveMeetingIndex',
+      partitionKey: {
+        name: 'ActiveMeetingId',
+        type: AttributeType.STRING,
+      },
     });
   }
 }
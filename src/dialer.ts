@@ -0,0 +1,124 @@
+import { Duration } from 'aws-cdk-lib';
+import { Table } from 'aws-cdk-lib/aws-dynamodb';
+import {
+  ManagedPolicy,
+  Role,
+  PolicyStatement,
+  PolicyDocument,
+  ServicePrincipal,
+} from 'aws-cdk-lib/aws-iam';
+import {
+  Architecture,
+  Runtime,
+  Code,
+  Function,
+  ILayerVersion,
+} from 'aws-cdk-lib/aws-lambda';
+import { SqsEventSource } from 'aws-cdk-lib/aws-lambda-event-sources';
+import { Queue, QueueEncryption } from 'aws-cdk-lib/aws-sqs';
+import { Construct } from 'constructs';
+
+const DIALER_CONCURRENCY = 2;
+const MAX_RECEIVES = 5;
+
+export interface DialerResourcesProps {
+  meetingTable: Table;
+  fromNumber: string;
+  sipMediaApplicationId: string;
+  commonLayer: ILayerVersion;
+  callsPerSecond: string;
+  maxActiveCalls: string;
+  smaHandler: Function;
+  logLevel: string;
+  debugSampleRate: string;
+}
+
+export class DialerResources extends Construct {
+  public dialQueue: Queue;
+  public deadLetterQueue: Queue;
+  public dialerHandler: Function;
+
+  constructor(scope: Construct, id: string, props: DialerResourcesProps) {
+    super(scope, id);
+
+    const dialerLambdaRole = new Role(this, 'dialerLambdaRole', {
+      assumedBy: new ServicePrincipal('lambda.amazonaws.com'),
+      inlinePolicies: {
+        ['chimePolicy']: new PolicyDocument({
+          statements: [
+            new PolicyStatement({
+              resources: ['*'],
+              actions: ['chime:CreateSipMediaApplicationCall'],
+            }),
+          ],
+        }),
+      },
+      managedPolicies: [
+        ManagedPolicy.fromAwsManagedPolicyName(
+          'service-role/AWSLambdaBasicExecutionRole',
+        ),
+      ],
+    });
+
+    this.dialerHandler = new Function(this, 'dialerHandler', {
+      code: Code.fromAsset('src/resources/dialer', {
+        bundling: {
+          image: Runtime.PYTHON_3_12.bundlingImage,
+          command: [
+            'bash',
+            '-c',
+            'pip install -r requirements.txt -t /asset-output && cp -au . /asset-output',
+          ],
+        },
+      }),
+      handler: 'index.handler',
+      layers: [props.commonLayer],
+      runtime: Runtime.PYTHON_3_12,
+      architecture: Architecture.ARM_64,
+      environment: {
+        FROM_NUMBER: props.fromNumber,
+        SIP_MEDIA_APPLICATION_ID: props.sipMediaApplicationId,
+        MEETING_TABLE: props.meetingTable.tableName,
+        CALLS_PER_SECOND: props.callsPerSecond,
+        MAX_ACTIVE_CALLS: props.maxActiveCalls,
+        DIALER_CONCURRENCY: DIALER_CONCURRENCY.toString(),
+        MAX_RECEIVES: MAX_RECEIVES.toString(),
+        LOG_LEVEL: props.logLevel,
+        DEBUG_SAMPLE_RATE: props.debugSampleRate,
+      },
+      role: dialerLambdaRole,
+      timeout: Duration.seconds(60),
+    });
+
+    props.meetingTable.grantReadWriteData(this.dialerHandler);
+
+    this.deadLetterQueue = new Queue(this, 'dialDeadLetterQueue', {
+      encryption: QueueEncryption.SQS_MANAGED,
+      retentionPeriod: Duration.days(4),
+    });
+
+    this.dialQueue = new Queue(this, 'dialQueue', {
+      encryption: QueueEncryption.SQS_MANAGED,
+      visibilityTimeout: Duration.seconds(360),
+      retentionPeriod: Duration.hours(1),
+      deadLetterQueue: {
+        queue: this.deadLetterQueue,
+        maxReceiveCount: MAX_RECEIVES,
+      },
+    });
+
+    // Calls the pacer holds back are sent again by the dialer, and unanswered calls redialed by smaHandler
+    this.dialerHandler.addEnvironment('DIAL_QUEUE_URL', this.dialQueue.queueUrl);
+    this.dialQueue.grantSendMessages(this.dialerHandler);
+    props.smaHandler.addEnvironment('DIAL_QUEUE_URL', this.dialQueue.queueUrl);
+    this.dialQueue.grantSendMessages(props.smaHandler);
+
+    this.dialerHandler.addEventSource(
+      new SqsEventSource(this.dialQueue, {
+        batchSize: 10,
+        maxConcurrency: DIALER_CONCURRENCY,
+        reportBatchItemFailures: true,
+      }),
+    );
+  }
+}
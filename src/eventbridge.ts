@@ -1,15 +1,27 @@
 import { Duration } from 'aws-cdk-lib';
-import { Rule } from 'aws-cdk-lib/aws-events';
+import { Table } from 'aws-cdk-lib/aws-dynamodb';
+import { Rule, Schedule } from 'aws-cdk-lib/aws-events';
 import { LambdaFunction } from 'aws-cdk-lib/aws-events-targets';
-import { Architecture, Runtime, Code, Function } from 'aws-cdk-lib/aws-lambda';
+import { PolicyStatement } from 'aws-cdk-lib/aws-iam';
+import {
+  Architecture,
+  Runtime,
+  Code,
+  Function,
+  ILayerVersion,
+} from 'aws-cdk-lib/aws-lambda';
 import { Construct } from 'constructs';
 
 export interface EventBridgeResourcesProps {
+  meetingTable: Table;
+  commonLayer: ILayerVersion;
   logLevel: string;
+  debugSampleRate: string;
 }
 
 export class EventBridgeResources extends Construct {
   public eventBridgeLambda: Function;
+  public chimeSdkRule: Rule;
 
   constructor(scope: Construct, id: string, props: EventBridgeResourcesProps) {
     super(scope, id);
@@ -26,19 +38,41 @@ export class EventBridgeResources extends Construct {
         },
       }),
       handler: 'index.handler',
+      layers: [props.commonLayer],
       environment: {
+        MEETING_TABLE: props.meetingTable.tableName,
+        MEETING_IDLE_TIMEOUT: '1800',
         LOG_LEVEL: props.logLevel,
+        DEBUG_SAMPLE_RATE: props.debugSampleRate,
       },
       runtime: Runtime.PYTHON_3_12,
       architecture: Architecture.ARM_64,
       timeout: Duration.seconds(60),
     });
 
-    const chimeSdkRule = new Rule(this, 'chimeSdkRule', {
+    this.chimeSdkRule = new Rule(this, 'chimeSdkRule', {
       eventPattern: {
         source: ['aws.chime'],
       },
     });
-    chimeSdkRule.addTarget(new LambdaFunction(this.eventBridgeLambda));
+    this.chimeSdkRule.addTarget(new LambdaFunction(this.eventBridgeLambda));
+
+    props.meetingTable.grantReadWriteData(this.eventBridgeLambda);
+    this.eventBridgeLambda.addToRolePolicy(
+      new PolicyStatement({
+        resources: ['*'],
+        actions: [
+          'chime:ListAttendees',
+          'chime:BatchCreateAttendee',
+          'chime:DeleteAttendee',
+          'chime:DeleteMeeting',
+        ],
+      }),
+    );
+
+    const reconcileRule = new Rule(this, 'reconcileRule', {
+      schedule: Schedule.rate(Duration.minutes(5)),
+    });
+    reconcileRule.addTarget(new LambdaFunction(this.eventBridgeLambda));
   }
 }
@@ -6,3 +6,6 @@ export * from './infrastructure';
 export * from './site';
 export * from './cloudwatch';
 export * from './eventbridge';
+export * from './layer';
+export * from './dialer';
+export * from './rosterFeed';
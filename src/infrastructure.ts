@@ -12,12 +12,21 @@ import { IUserPool } from 'aws-cdk-lib/aws-cognito';
 import { Table } from 'aws-cdk-lib/aws-dynamodb';
 import {
   ManagedPolicy,
+  Policy,
   Role,
   PolicyStatement,
   PolicyDocument,
   ServicePrincipal,
 } from 'aws-cdk-lib/aws-iam';
-import { Architecture, Runtime, Code, Function } from 'aws-cdk-lib/aws-lambda';
+import {
+  Architecture,
+  Runtime,
+  Code,
+  Function,
+  ILayerVersion,
+} from 'aws-cdk-lib/aws-lambda';
+import { CfnTemplate } from 'aws-cdk-lib/aws-ses';
+import { Queue } from 'aws-cdk-lib/aws-sqs';
 import { Construct } from 'constructs';
 
 interface InfrastructureProps {
@@ -27,7 +36,11 @@ interface InfrastructureProps {
   fromEmail: string;
   sipMediaApplicationId: string;
   distribution: Distribution;
+  dialQueue: Queue;
+  commonLayer: ILayerVersion;
+  mediaRegion: string;
   logLevel: string;
+  debugSampleRate: string;
 }
 
 export class Infrastructure extends Construct {
@@ -69,7 +82,8 @@ export class Infrastructure extends Construct {
               actions: [
                 'chime:CreateSipMediaApplicationCall',
                 'chime:CreateMeetingWithAttendees',
-                'ses:SendEmail',
+                'chime:BatchCreateAttendee',
+                'ses:SendBulkTemplatedEmail',
               ],
             }),
           ],
@@ -82,6 +96,16 @@ export class Infrastructure extends Construct {
       ],
     });
 
+    const invitationTemplate = new CfnTemplate(this, 'invitationTemplate', {
+      template: {
+        subjectPart: 'Amazon Chime SDK Meeting Invitation - {{event_id}}',
+        textPart:
+          'A meeting has been started.\nTo join the meeting:\n+{{dial_in}}\n{{join_link}}',
+        htmlPart:
+          '<p>A meeting has been started.</p><p>To join the meeting:</p><p>{{dial_in}}<p><a href="{{join_link}}">Meeting Link</a></p>',
+      },
+    });
+
     this.createMeetingHandler = new Function(this, 'createMeetingHandler', {
       code: Code.fromAsset('src/resources/createMeeting', {
         bundling: {
@@ -94,6 +118,7 @@ export class Infrastructure extends Construct {
         },
       }),
       handler: 'index.handler',
+      layers: [props.commonLayer],
       runtime: Runtime.PYTHON_3_12,
       architecture: Architecture.ARM_64,
       environment: {
@@ -102,12 +127,32 @@ export class Infrastructure extends Construct {
         FROM_EMAIL: props.fromEmail,
         MEETING_TABLE: props.meetingTable.tableName,
         DISTRIBUTION: props.distribution.distributionDomainName,
+        MEDIA_REGION: props.mediaRegion,
         LOG_LEVEL: props.logLevel,
+        DEBUG_SAMPLE_RATE: props.debugSampleRate,
+        MAX_CONCURRENCY: '10',
+        MANIFEST_CONCURRENCY: '4',
+        DIAL_QUEUE_URL: props.dialQueue.queueUrl,
+        EMAIL_TEMPLATE: invitationTemplate.ref,
       },
       role: createMeetingLambdaRole,
       timeout: Duration.seconds(60),
     });
 
+    props.dialQueue.grantSendMessages(this.createMeetingHandler);
+
+    // Large manifests are split across asynchronous invocations of the same function.  The grant is its own
+    // policy rather than part of the role's default policy, which the function depends on.
+    new Policy(this, 'createMeetingInvokePolicy', {
+      roles: [createMeetingLambdaRole],
+      statements: [
+        new PolicyStatement({
+          resources: [this.createMeetingHandler.functionArn],
+          actions: ['lambda:InvokeFunction'],
+        }),
+      ],
+    });
+
     this.joinMeetingHandler = new Function(this, 'joinMeetingHandler', {
       code: Code.fromAsset('src/resources/joinMeeting', {
         bundling: {
@@ -120,9 +165,12 @@ export class Infrastructure extends Construct {
         },
       }),
       handler: 'index.handler',
+      layers: [props.commonLayer],
       environment: {
         MEETING_TABLE: props.meetingTable.tableName,
+        MEDIA_REGION: props.mediaRegion,
         LOG_LEVEL: props.logLevel,
+        DEBUG_SAMPLE_RATE: props.debugSampleRate,
       },
       runtime: Runtime.PYTHON_3_12,
       architecture: Architecture.ARM_64,
@@ -144,9 +192,11 @@ export class Infrastructure extends Construct {
         },
       }),
       handler: 'index.handler',
+      layers: [props.commonLayer],
       environment: {
         MEETING_TABLE: props.meetingTable.tableName,
         LOG_LEVEL: props.logLevel,
+        DEBUG_SAMPLE_RATE: props.debugSampleRate,
       },
       runtime: Runtime.PYTHON_3_12,
       architecture: Architecture.ARM_64,
@@ -168,9 +218,11 @@ export class Infrastructure extends Construct {
         },
       }),
       handler: 'index.handler',
+      layers: [props.commonLayer],
       environment: {
         MEETING_TABLE: props.meetingTable.tableName,
         LOG_LEVEL: props.logLevel,
+        DEBUG_SAMPLE_RATE: props.debugSampleRate,
       },
       runtime: Runtime.PYTHON_3_12,
       architecture: Architecture.ARM_64,
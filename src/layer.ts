@@ -0,0 +1,17 @@
+import { Architecture, Code, LayerVersion, Runtime } from 'aws-cdk-lib/aws-lambda';
+import { Construct } from 'constructs';
+
+export class CommonLayer extends Construct {
+  public layer: LayerVersion;
+
+  constructor(scope: Construct, id: string) {
+    super(scope, id);
+
+    this.layer = new LayerVersion(this, 'commonLayer', {
+      code: Code.fromAsset('src/resources/layer'),
+      compatibleRuntimes: [Runtime.PYTHON_3_12],
+      compatibleArchitectures: [Architecture.ARM_64],
+      description: 'Shared runtime for the SMA meeting dialer functions',
+    });
+  }
+}
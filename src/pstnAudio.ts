@@ -7,7 +7,13 @@ import {
   PolicyDocument,
   PolicyStatement,
 } from 'aws-cdk-lib/aws-iam';
-import { Architecture, Runtime, Function, Code } from 'aws-cdk-lib/aws-lambda';
+import {
+  Architecture,
+  Runtime,
+  Function,
+  Code,
+  ILayerVersion,
+} from 'aws-cdk-lib/aws-lambda';
 import {
   ChimeSipMediaApp,
   ChimeSipRule,
@@ -20,7 +26,10 @@ import { Construct } from 'constructs';
 
 export interface ChimeSipMediaAppProps {
   meetingTable: Table;
+  commonLayer: ILayerVersion;
+  mediaRegion: string;
   logLevel: string;
+  debugSampleRate: string;
 }
 
 export class PSTNAudio extends Construct {
@@ -67,9 +76,12 @@ export class PSTNAudio extends Construct {
         },
       }),
       handler: 'index.handler',
+      layers: [props.commonLayer],
       environment: {
         MEETING_TABLE: props.meetingTable.tableName,
+        MEDIA_REGION: props.mediaRegion,
         LOG_LEVEL: props.logLevel,
+        DEBUG_SAMPLE_RATE: props.debugSampleRate,
       },
       runtime: Runtime.PYTHON_3_12,
       architecture: Architecture.ARM_64,
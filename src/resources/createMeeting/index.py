@@ -1,42 +1,53 @@
 import os
-import decimal
+import csv
 import json
-import logging
 import time
 import urllib.parse
-from random import randint
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, deque
+from random import randint, uniform
 from botocore.exceptions import ClientError
+from sma_dialer.attendee_index import adjust_attendee_count
+from sma_dialer.attendee_pool import pool_attributes
+from sma_dialer.circuit import CircuitOpenError
+from sma_dialer.checkpoint import claim_run, complete_run, get_run_id, load_event_rows, release_run
+from sma_dialer.dial_queue import SqsDialQueue, record_dial_progress
+from sma_dialer.log import LazyJson, log_payload
+from sma_dialer.manifest import (EVENT_COMPLETE, EVENT_FAILED, EVENT_INVALID, EVENT_SKIPPED, MANIFEST_CONCURRENCY, MANIFEST_FAILED, MANIFEST_SPLIT,
+                                 is_manifest, is_report, manifest_status, report_key, split_manifest)
+from sma_dialer.regions import RegionalClients, event_regions
+from sma_dialer.runtime import LazyClient, Table, get_logger
 
-chime_sdk_meeting_client = boto3.client('chime-sdk-meetings')
-chime_sdk_voice_client = boto3.client('chime-sdk-voice')
-s3_client = boto3.client('s3')
-ses_client = boto3.client('ses')
-dynamo_client = boto3.resource('dynamodb')
+meeting_clients = RegionalClients('chime-sdk-meetings')
+chime_sdk_voice_client = LazyClient('chime-sdk-voice')
+s3_client = LazyClient('s3')
+lambda_client = LazyClient('lambda')
+ses_client = LazyClient('ses')
 
 FROM_NUMBER = os.environ['FROM_NUMBER']
 SIP_MEDIA_APPLICATION_ID = os.environ['SIP_MEDIA_APPLICATION_ID']
 FROM_EMAIL = os.environ['FROM_EMAIL']
 MEETING_TABLE = os.environ['MEETING_TABLE']
 DISTRIBUTION = os.environ['DISTRIBUTION']
+MAX_CONCURRENCY = int(os.environ.get('MAX_CONCURRENCY', '10'))
+CREATE_MEETING_ATTENDEE_LIMIT = 10
+BATCH_CREATE_ATTENDEE_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+PASSCODE_RETRIES = 5
+ROSTER_CHUNK_SIZE = int(os.environ.get('ROSTER_CHUNK_SIZE', '500'))
+ROSTER_READ_BYTES = int(os.environ.get('ROSTER_READ_BYTES', str(8 * 1024 * 1024)))
+RUN_LEASE_MARGIN = 5
+DIAL_QUEUE_URL = os.environ.get('DIAL_QUEUE_URL')
+EMAIL_TEMPLATE = os.environ['EMAIL_TEMPLATE']
+BULK_EMAIL_LIMIT = 50
+PROGRESS_ATTRIBUTES = ['EmailStatus', 'EmailMessageId', 'CallStatus']
+EMAIL_RETRIES = 3
 
-meeting_table = dynamo_client.Table(MEETING_TABLE)
+meeting_table = Table(MEETING_TABLE)
+# Without a queue the participants are called inline, as before the dialer existed
+dial_queue = SqsDialQueue(DIAL_QUEUE_URL) if DIAL_QUEUE_URL else None
 
-logger = logging.getLogger()
-try:
-    LOG_LEVEL = os.environ['LOG_LEVEL']
-    if LOG_LEVEL not in ['INFO', 'DEBUG', 'WARN', 'ERROR']:
-        LOG_LEVEL = 'INFO'
-except BaseException:
-    LOG_LEVEL = 'INFO'
-logger.setLevel(LOG_LEVEL)
-
-
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, decimal.Decimal):
-            return int(obj)
-        return super(DecimalEncoder, self).default(obj)
+logger = get_logger()
 
 
 response = {
@@ -54,14 +65,17 @@ response = {
 def handler(event, context):
     global LOG_PREFIX
     LOG_PREFIX = 'Create Meeting: '
+    log_payload(logger, '%s RECV Event: %s', LOG_PREFIX, event)
     if 'Records' in event:
-        logger.info('%s RECV Event: %s', LOG_PREFIX, json.dumps(event))
-        participants, event_id = get_records(event)
-        create_meeting(participants, event_id)
+        logger.info('%s RECV S3 Event with %s records', LOG_PREFIX, len(event['Records']))
+        for record in event['Records']:
+            process_record(record, context)
+    elif 'Manifest' in event:
+        logger.info('%s RECV part %s of manifest %s', LOG_PREFIX, event['Manifest']['Part'], event['Manifest']['Key'])
+        process_manifest_part(event['Manifest'], context)
     else:
-        logger.info('%s RECV Event: %s', LOG_PREFIX, json.dumps(event))
         participant_request = json.loads(event['body'])
-        logger.info('%s Participant Request: %s', LOG_PREFIX, json.dumps(participant_request, indent=4))
+        logger.info('%s Participant Request: %s', LOG_PREFIX, LazyJson(participant_request))
         participants = [{
             "Name": participant_request['attendeeName'],
             "PhoneNumber": participant_request['attendeePhoneNumber'],
@@ -79,8 +93,177 @@ def handler(event, context):
         return response
 
 
-def create_meeting(participants, event_id):
-    attendee_list = []
+def lease_time(context):
+    return (context.get_remaining_time_in_millis() / 1000 if context else 900) + RUN_LEASE_MARGIN
+
+
+def process_record(record, context):
+    bucket = record['s3']['bucket']['name']
+    key = urllib.parse.unquote_plus(record['s3']['object']['key'], encoding='utf-8')
+    if is_report(key):
+        logger.info('%s Skipping report object %s', LOG_PREFIX, key)
+        return
+    run_id = get_run_id(record)
+    lease_seconds = lease_time(context)
+    meeting_request = get_object(bucket, key)
+    roster_format = get_roster_format(key, meeting_request['ContentType'])
+    request_info = None
+    if roster_format == 'json':
+        request_info = json.loads(meeting_request['Body'].read().decode('utf-8'))
+        logger.debug('%s S3 GetObject Info: %s', LOG_PREFIX, LazyJson(request_info))
+        if is_manifest(request_info):
+            process_manifest(record['s3']['object'], bucket, key, request_info['Events'], run_id, context)
+            return
+    event_states = {}
+    try:
+        for participants, event_id in get_records(meeting_request, roster_format, request_info, bucket, key):
+            if str(event_id) not in event_states:
+                claimed = claim_run(meeting_table, event_id, run_id, lease_seconds)
+                if not claimed:
+                    logger.info('%s Run %s for event %s is complete or in progress, skipping', LOG_PREFIX, run_id, event_id)
+                event_states[str(event_id)] = {'RunId': run_id, 'Claimed': claimed}
+            if event_states[str(event_id)]['Claimed']:
+                create_meeting(participants, event_id, event_states[str(event_id)])
+    except Exception as error:
+        logger.error('%s Run %s failed: %s', LOG_PREFIX, run_id, error)
+        for event_id, event_state in event_states.items():
+            if event_state['Claimed']:
+                try:
+                    release_run(meeting_table, event_id, run_id)
+                except Exception as release_error:
+                    logger.error('%s Error releasing run %s for event %s: %s', LOG_PREFIX, run_id, event_id, release_error)
+        raise error
+    for event_id, event_state in event_states.items():
+        if event_state['Claimed']:
+            complete_run(meeting_table, event_id, run_id)
+
+
+def process_manifest(s3_object, bucket, key, events, run_id, context):
+    parts = split_manifest(events)
+    logger.info('%s Manifest %s has %s events in %s parts', LOG_PREFIX, key, len(events), len(parts))
+    if len(parts) <= 1 or context is None:
+        run_manifest(bucket, key, events, run_id, context)
+        return
+    # Each part is provisioned by its own asynchronous invocation, which reads the same object version back
+    manifest = {'Bucket': bucket, 'Key': key, 'RunId': run_id, 'VersionId': s3_object.get('versionId'), 'ETag': s3_object.get('eTag')}
+    part_reports = []
+    position = 0
+    for index, part in enumerate(parts):
+        positions = list(range(position, position + len(part)))
+        position += len(part)
+        lambda_client.invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType='Event',
+            Payload=json.dumps({'Manifest': dict(manifest, Part=index, Positions=positions)}))
+        part_reports.append({'Part': index, 'Report': report_key(key, index), 'EventIds': [str(event.get('EventId')) for event in part]})
+    write_report(bucket, report_key(key), {'Manifest': key, 'RunId': run_id, 'Status': MANIFEST_SPLIT, 'Parts': part_reports})
+
+
+def process_manifest_part(manifest, context):
+    if manifest.get('VersionId'):
+        meeting_request = get_object(manifest['Bucket'], manifest['Key'], VersionId=manifest['VersionId'])
+    elif manifest.get('ETag'):
+        meeting_request = get_object(manifest['Bucket'], manifest['Key'], IfMatch=manifest['ETag'])
+    else:
+        meeting_request = get_object(manifest['Bucket'], manifest['Key'])
+    events = json.loads(meeting_request['Body'].read().decode('utf-8'))['Events']
+    run_manifest(manifest['Bucket'], manifest['Key'], [events[position] for position in manifest['Positions']], manifest['RunId'], context, manifest['Part'])
+
+
+def run_manifest(bucket, key, events, run_id, context, part=None):
+    lease_seconds = lease_time(context)
+    with ThreadPoolExecutor(max_workers=max(1, min(MANIFEST_CONCURRENCY, len(events)))) as executor:
+        event_reports = list(executor.map(lambda manifest_event: provision_event(manifest_event, run_id, lease_seconds), events))
+    status = manifest_status(event_reports)
+    skipped = [event_report for event_report in event_reports if event_report['Status'] == EVENT_SKIPPED]
+    logger.info('%s Manifest %s %s with %s events, %s skipped', LOG_PREFIX, key, status, len(event_reports), len(skipped))
+    if events and len(skipped) == len(events):
+        # A repeated notification for a run that has finished leaves its report as it is
+        return
+    if skipped:
+        # Events finished by an earlier attempt keep the results that attempt reported
+        previous = previous_event_reports(bucket, report_key(key, part))
+        event_reports = [
+            previous.get(event_report['EventId'], event_report) if event_report['Status'] == EVENT_SKIPPED else event_report
+            for event_report in event_reports
+        ]
+    report = {'Manifest': key, 'RunId': run_id, 'Status': status, 'Events': event_reports}
+    if part is not None:
+        report['Part'] = part
+    write_report(bucket, report_key(key, part), report)
+    if status == MANIFEST_FAILED:
+        raise Exception('Unable to provision every event in manifest %s' % key)
+
+
+def provision_event(manifest_event, run_id, lease_seconds):
+    event_id = manifest_event.get('EventId')
+    if not event_id:
+        logger.error('%s Skipping manifest event with no EventId', LOG_PREFIX)
+        return {'EventId': None, 'Status': EVENT_INVALID, 'Error': 'Missing EventId'}
+    event_report = {'EventId': str(event_id)}
+    # Every event ends up in the report, so an error claiming or completing a run is recorded rather than
+    # raised out of the pool, which would leave the manifest without a report
+    try:
+        claimed = claim_run(meeting_table, event_id, run_id, lease_seconds)
+    except Exception as error:
+        logger.error('%s Error claiming run %s for event %s: %s', LOG_PREFIX, run_id, event_id, error)
+        event_report.update({'Status': EVENT_FAILED, 'Error': str(error)})
+        return event_report
+    if not claimed:
+        logger.info('%s Run %s for event %s is complete or in progress, skipping', LOG_PREFIX, run_id, event_id)
+        event_report['Status'] = EVENT_SKIPPED
+        return event_report
+    event_state = {'RunId': run_id, 'Claimed': True}
+    participants = manifest_event.get('Participants') or []
+    try:
+        for index in range(0, len(participants), ROSTER_CHUNK_SIZE):
+            create_meeting(participants[index:index + ROSTER_CHUNK_SIZE], event_id, event_state)
+    except Exception as error:
+        logger.error('%s Run %s failed for event %s: %s', LOG_PREFIX, run_id, event_id, error)
+        try:
+            release_run(meeting_table, event_id, run_id)
+        except Exception as release_error:
+            logger.error('%s Error releasing run %s for event %s: %s', LOG_PREFIX, run_id, event_id, release_error)
+        event_report.update({'Status': EVENT_FAILED, 'Error': str(error)})
+        return event_report
+    try:
+        complete_run(meeting_table, event_id, run_id)
+    except Exception as error:
+        # The event was provisioned, and its claim lapses with the lease
+        logger.error('%s Error completing run %s for event %s: %s', LOG_PREFIX, run_id, event_id, error)
+    event_report.update({
+        'Status': EVENT_COMPLETE,
+        'MeetingId': event_state.get('MeetingId'),
+        'MediaRegion': event_state.get('MediaRegion'),
+        'Participants': event_state.get('Participants', 0),
+        'Failed': len(event_state.get('Failures', [])),
+        'Failures': event_state.get('Failures', [])
+    })
+    return event_report
+
+
+def previous_event_reports(bucket, key):
+    try:
+        previous = json.loads(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8'))
+    except ClientError as error:
+        if error.response['Error']['Code'] not in ['NoSuchKey', 'AccessDenied']:
+            raise error
+        return {}
+    return {event_report['EventId']: event_report for event_report in previous.get('Events', []) if event_report['Status'] == EVENT_COMPLETE}
+
+
+def write_report(bucket, key, report):
+    logger.info('%s Writing report %s/%s', LOG_PREFIX, bucket, key)
+    try:
+        s3_client.put_object(Bucket=bucket, Key=key, Body=json.dumps(report).encode('utf-8'), ContentType='application/json')
+    except Exception as error:
+        logger.error('%s S3 PutObject Error: %s', LOG_PREFIX, error)
+        raise error
+
+
+def create_meeting(participants, event_id, event_state=None):
+    if event_state is None:
+        event_state = {}
     participant_list = []
     for participant in participants:
         logger.info('%s Adding attendee %s', LOG_PREFIX, participant['PhoneNumber'])
@@ -89,77 +272,385 @@ def create_meeting(participants, event_id):
             "PhoneNumber": participant['PhoneNumber'],
             'Email':  participant.get('Email', 'None'),
             'CallParticipant': participant.get('CallParticipant', 'None')})
-        attendee_list.append({
-            'ExternalUserId': participant['PhoneNumber'],
-        })
-    logger.info('%s Attendee List: %s', LOG_PREFIX, json.dumps(attendee_list))
-    logger.info('%s Participant List: %s', LOG_PREFIX, json.dumps(participant_list))
+    logger.debug('%s Participant List: %s', LOG_PREFIX, LazyJson(participant_list))
     logger.info('%s Event ID: %s', LOG_PREFIX, event_id)
+    if 'RunId' in event_state:
+        resume_participants(participant_list, event_id, event_state)
+
+    # Attendees are created again for resumed participants that still have to be called, since the join
+    # token is not read back with the checkpoint. Chime returns the existing attendee for the same ExternalUserId.
+    pending = [
+        participant for participant in participant_list
+        if 'Checkpoint' not in participant or (participant['CallParticipant'] is True and 'CallStatus' not in participant['Checkpoint'])
+    ]
+    if pending:
+        if 'MediaRegion' not in event_state:
+            event_state['MediaRegion'], event_state['ControlRegion'] = event_regions(
+                meeting_table, event_id, [participant['PhoneNumber'] for participant in participant_list])
+            logger.info('%s Using media region %s for event %s', LOG_PREFIX, event_state['MediaRegion'], event_id)
+        for participant in pending:
+            participant['MediaRegion'] = event_state['MediaRegion']
+            participant['ControlRegion'] = event_state['ControlRegion']
+        if 'MeetingId' in event_state:
+            meeting_id = event_state['MeetingId']
+            remaining = pending
+        else:
+            meeting_info = create_meeting_with_attendees(event_id, pending[:CREATE_MEETING_ATTENDEE_LIMIT], event_state['MediaRegion'], event_state['ControlRegion'])
+            meeting_id = meeting_info['Meeting']['MeetingId']
+            event_state['MeetingId'] = meeting_id
+            assign_attendees(pending[:CREATE_MEETING_ATTENDEE_LIMIT], meeting_id, meeting_info)
+            remaining = pending[CREATE_MEETING_ATTENDEE_LIMIT:]
+        chunks = [remaining[index:index + BATCH_CREATE_ATTENDEE_LIMIT] for index in range(0, len(remaining), BATCH_CREATE_ATTENDEE_LIMIT)]
+        if chunks:
+            with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, len(chunks)))) as executor:
+                list(executor.map(lambda chunk: batch_create_attendees(meeting_id, chunk, event_state['ControlRegion']), chunks))
+        # The attendees created here wait in the pool and are counted once claimed, but the row still has to
+        # mark the meeting active
+        update_attendee_count(event_id, meeting_id, 0)
 
+    persist_participants([participant for participant in participant_list if 'Checkpoint' not in participant], event_id, event_state)
+    results = provision_participants(participant_list, event_id)
+    failed = [result for result in results if result['Status'] == 'FAILED']
+    logger.info('%s Provisioned %s participants with %s failures', LOG_PREFIX, len(results), len(failed))
+    event_state['Participants'] = event_state.get('Participants', 0) + len(results)
+    event_state.setdefault('Failures', []).extend({'PhoneNumber': result['PhoneNumber'], 'Error': result.get('Error')} for result in failed)
+    if len(participants) == 1:
+        if failed:
+            return None
+        return results[0]['MeetingPasscode']
+    else:
+        return True
+
+
+def create_meeting_with_attendees(event_id, chunk, media_region, control_region):
     try:
-        meeting_info = chime_sdk_meeting_client.create_meeting_with_attendees(
+        meeting_info = meeting_clients.get(control_region).create_meeting_with_attendees(
             ClientRequestToken=str(event_id),
-            MediaRegion='us-east-1',
+            MediaRegion=media_region,
             ExternalMeetingId=str(event_id),
-            Attendees=attendee_list
+            Attendees=[{'ExternalUserId': participant['PhoneNumber']} for participant in chunk]
         )
     except Exception as error:
         logger.error('%s Error creating meeting: %s', LOG_PREFIX, error)
         raise error
-    for index, participant in enumerate(participant_list):
-        participant_list[index]['JoinToken'] = meeting_info['Attendees'][index]['JoinToken']
-        participant_list[index]['AttendeeId'] = meeting_info['Attendees'][index]['AttendeeId']
-        participant_list[index]['Attendee'] = meeting_info['Attendees'][index]
-        participant_list[index]['MeetingId'] = meeting_info['Meeting']['MeetingId']
+    logger.debug('%s Meeting Info: %s', LOG_PREFIX, LazyJson(meeting_info))
+    return meeting_info
 
-    logger.info('%s Meeting Info: %s', LOG_PREFIX, json.dumps(meeting_info))
 
-    for attendee in participant_list:
-        meeting_passcode = randint(100000, 999999)
-        meeting_object = {
-            'EventId': str(event_id),
-            'MeetingId': meeting_info['Meeting']['MeetingId'],
-            'MeetingPasscode': str(meeting_passcode),
-            'PhoneNumber':  attendee['PhoneNumber'],
-            'Name': attendee['Name'],
-            'TTL':  int(time.time() + 86400)
-        }
-        update_db(meeting_object)
-        if ((attendee['Email'] != '' or attendee['Email'] != 'None') and FROM_EMAIL != ''):
-            send_email(event_id, attendee['Email'], meeting_passcode)
-        if attendee['CallParticipant'] is True:
-            call_participant(attendee, event_id, meeting_passcode)
-    if len(participants) == 1:
-        return meeting_passcode
-    else:
-        return True
+def batch_create_attendees(meeting_id, chunk, control_region):
+    logger.info('%s Adding %s attendees to meeting %s', LOG_PREFIX, len(chunk), meeting_id)
+    try:
+        attendee_info = meeting_clients.get(control_region).batch_create_attendee(
+            MeetingId=meeting_id,
+            Attendees=[{'ExternalUserId': participant['PhoneNumber']} for participant in chunk]
+        )
+    except Exception as error:
+        logger.error('%s Error adding attendees: %s', LOG_PREFIX, error)
+        for participant in chunk:
+            participant['Error'] = str(error)
+        return
+    assign_attendees(chunk, meeting_id, attendee_info)
 
 
-def update_db(meeting_object):
+def assign_attendees(chunk, meeting_id, attendee_info):
+    attendees = defaultdict(deque)
+    for attendee in attendee_info.get('Attendees', []):
+        attendees[attendee['ExternalUserId']].append(attendee)
+    errors = defaultdict(deque)
+    for error in attendee_info.get('Errors', []):
+        errors[error['ExternalUserId']].append(error)
+    for participant in chunk:
+        external_user_id = participant['PhoneNumber']
+        if attendees[external_user_id]:
+            attendee = attendees[external_user_id].popleft()
+            participant['JoinToken'] = attendee['JoinToken']
+            participant['AttendeeId'] = attendee['AttendeeId']
+            participant['Attendee'] = attendee
+            participant['MeetingId'] = meeting_id
+        elif errors[external_user_id]:
+            error = errors[external_user_id].popleft()
+            participant['Error'] = '%s: %s' % (error.get('ErrorCode'), error.get('ErrorMessage'))
+            logger.error('%s Error creating attendee %s: %s', LOG_PREFIX, external_user_id, participant['Error'])
+        else:
+            participant['Error'] = 'Attendee not created'
+            logger.error('%s Attendee not created for %s', LOG_PREFIX, external_user_id)
+
+
+def resume_participants(participant_list, event_id, event_state):
+    if 'Checkpoints' not in event_state:
+        event_state['Passcodes'], event_state['Checkpoints'] = load_event_rows(meeting_table, event_id, event_state['RunId'])
+    for participant in participant_list:
+        # Roster position is stable for a given object version, so it identifies the participant across attempts
+        event_state['Position'] = event_state.get('Position', 0) + 1
+        participant['RunId'] = event_state['RunId']
+        participant['ParticipantKey'] = '%d:%s' % (event_state['Position'], participant['PhoneNumber'])
+        checkpoint = event_state['Checkpoints'].get(participant['ParticipantKey'])
+        if checkpoint:
+            participant['Checkpoint'] = checkpoint
+            participant['MeetingPasscode'] = int(checkpoint['MeetingPasscode'])
+            participant['MeetingId'] = checkpoint['MeetingId']
+            participant['AttendeeId'] = checkpoint['AttendeeId']
+    resumed = len([participant for participant in participant_list if 'Checkpoint' in participant])
+    if resumed:
+        logger.info('%s Resuming run %s with %s participants already written', LOG_PREFIX, event_state['RunId'], resumed)
+
+
+def update_attendee_count(event_id, meeting_id, delta):
     try:
-        logger.info('%s Updating Database: %s', LOG_PREFIX, json.dumps(meeting_object, cls=DecimalEncoder))
-        meeting_table.put_item(Item=meeting_object)
-        logger.info('%s Updated Database', LOG_PREFIX)
+        adjust_attendee_count(meeting_table, event_id, meeting_id, delta)
+    except Exception as error:
+        logger.error('%s Error updating attendee count: %s', LOG_PREFIX, error)
+
+
+def provision_participants(participant_list, event_id):
+    results = [participant_result(attendee) for attendee in participant_list]
+    if FROM_EMAIL != '':
+        invitations = [
+            (attendee, result) for attendee, result in zip(participant_list, results)
+            if result['Status'] == 'SUCCESS' and attendee['Email'] not in ['', 'None'] and result.get('EmailStatus') != 'Success'
+        ]
+        if invitations:
+            send_invitations(invitations, event_id)
+            record_progress(invitations, event_id)
+    calls = [
+        (attendee, result) for attendee, result in zip(participant_list, results)
+        if result['Status'] == 'SUCCESS' and attendee['CallParticipant'] is True and 'CallStatus' not in result
+    ]
+    if dial_queue is not None:
+        queue_calls(calls, event_id)
+        record_calls(calls, event_id)
+    elif calls:
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, len(calls)))) as executor:
+            for start in range(0, len(calls), BATCH_WRITE_LIMIT):
+                chunk = calls[start:start + BATCH_WRITE_LIMIT]
+                list(executor.map(lambda call: place_call(call[0], call[1], event_id), chunk))
+                record_calls(chunk, event_id)
+    return results
+
+
+def record_calls(calls, event_id):
+    # Only resumable runs need to know which calls were made
+    placed = [(attendee, result) for attendee, result in calls if 'RunId' in attendee and 'CallStatus' in result]
+    if placed:
+        record_progress(placed, event_id)
+
+
+def place_call(attendee, result, event_id):
+    try:
+        call_participant(attendee, event_id, result['MeetingPasscode'])
+        result['CallStatus'] = 'PLACED'
+    except Exception as error:
+        result['Status'] = 'FAILED'
+        result['Error'] = str(error)
+
+
+def queue_calls(calls, event_id):
+    if not calls:
         return
+    logger.info('%s Queueing %s calls for meeting %s', LOG_PREFIX, len(calls), event_id)
+    jobs = [dial_arguments(attendee, event_id, result['MeetingPasscode']) for attendee, result in calls]
+    try:
+        failed = dial_queue.send(jobs)
     except Exception as error:
-        logger.error('%s Error updating Database: %s', LOG_PREFIX, error)
-        raise error
+        logger.error('%s Error queueing calls: %s', LOG_PREFIX, error)
+        failed = range(len(jobs))
+    for attendee, result in calls:
+        result['CallStatus'] = 'QUEUED'
+    for position in failed:
+        calls[position][1]['Status'] = 'FAILED'
+        calls[position][1]['Error'] = 'Call could not be queued'
+        del calls[position][1]['CallStatus']
+    try:
+        record_dial_progress(meeting_table, event_id, queued=len(jobs) - len(failed))
+    except Exception as error:
+        logger.error('%s Error recording dial progress: %s', LOG_PREFIX, error)
+
+
+def participant_result(attendee):
+    if 'MeetingPasscode' not in attendee:
+        return {
+            'PhoneNumber': attendee['PhoneNumber'],
+            'MeetingPasscode': None,
+            'Status': 'FAILED',
+            'Error': attendee.get('Error')
+        }
+    result = {
+        'PhoneNumber': attendee['PhoneNumber'],
+        'MeetingPasscode': attendee['MeetingPasscode'],
+        'Status': 'SUCCESS'
+    }
+    for progress in PROGRESS_ATTRIBUTES:
+        if progress in attendee.get('Checkpoint', {}):
+            result[progress] = attendee['Checkpoint'][progress]
+    return result
+
+
+def meeting_object(attendee, event_id, meeting_passcode):
+    item = {
+        'EventId': str(event_id),
+        'MeetingId': attendee['MeetingId'],
+        'AttendeeId': attendee['AttendeeId'],
+        'MeetingPasscode': str(meeting_passcode),
+        'PhoneNumber':  attendee['PhoneNumber'],
+        'Name': attendee['Name'],
+        'TTL':  int(time.time() + 86400)
+    }
+    item.update(pool_attributes(attendee))
+    if attendee.get('MediaRegion'):
+        item['MediaRegion'] = attendee['MediaRegion']
+    if attendee.get('ControlRegion'):
+        item['ControlRegion'] = attendee['ControlRegion']
+    if 'RunId' in attendee:
+        item['RunId'] = attendee['RunId']
+        item['ParticipantKey'] = attendee['ParticipantKey']
+    return item
+
+
+def persist_participants(participant_list, event_id, event_state):
+    attendees = [attendee for attendee in participant_list if 'AttendeeId' in attendee]
+    if len(attendees) == 1:
+        try:
+            attendees[0]['MeetingPasscode'] = update_db(attendees[0], event_id)
+            event_state.get('Passcodes', set()).add(str(attendees[0]['MeetingPasscode']))
+        except Exception as error:
+            attendees[0]['Error'] = str(error)
+        return
+    if 'Passcodes' not in event_state:
+        event_state['Passcodes'], event_state['Checkpoints'] = load_event_rows(meeting_table, event_id, event_state.get('RunId'))
+    passcodes = allocate_passcodes(event_state['Passcodes'], len(attendees))
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, len(attendees)))) as executor:
+        written = list(executor.map(
+            lambda entry: write_passcode(entry[0], event_id, entry[1], event_state['Passcodes']), zip(attendees, passcodes)))
+    for attendee, meeting_passcode in zip(attendees, written):
+        if meeting_passcode is None:
+            attendee['Error'] = 'Unable to write passcode record'
+        else:
+            attendee['MeetingPasscode'] = meeting_passcode
+    logger.info('%s Wrote %s passcode records', LOG_PREFIX, len([passcode for passcode in written if passcode is not None]))
+
+
+def allocate_passcodes(used, count):
+    passcodes = []
+    while len(passcodes) < count:
+        meeting_passcode = randint(100000, 999999)
+        if str(meeting_passcode) not in used:
+            used.add(str(meeting_passcode))
+            passcodes.append(meeting_passcode)
+    return passcodes
+
+
+def write_passcode(attendee, event_id, meeting_passcode, used):
+    # The passcodes were allocated from a snapshot of the event's rows, so the write is conditional in case the
+    # web page or another run has taken the same passcode since.  A collision is retried with a fresh passcode.
+    for attempt in range(PASSCODE_RETRIES):
+        try:
+            meeting_table.put_item(Item=meeting_object(attendee, event_id, meeting_passcode), ConditionExpression='attribute_not_exists(MeetingPasscode)')
+            return meeting_passcode
+        except ClientError as error:
+            if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                logger.error('%s Error writing passcode record: %s', LOG_PREFIX, error)
+                return None
+            logger.info('%s Passcode %s already in use for event %s', LOG_PREFIX, meeting_passcode, event_id)
+        meeting_passcode = allocate_passcodes(used, 1)[0]
+    logger.error('%s Unable to allocate a unique passcode for event %s', LOG_PREFIX, event_id)
+    return None
+
+
+def update_db(attendee, event_id):
+    for attempt in range(PASSCODE_RETRIES):
+        meeting_passcode = randint(100000, 999999)
+        item = meeting_object(attendee, event_id, meeting_passcode)
+        try:
+            logger.debug('%s Updating Database: %s', LOG_PREFIX, LazyJson(item))
+            meeting_table.put_item(Item=item, ConditionExpression='attribute_not_exists(MeetingPasscode)')
+            logger.info('%s Updated Database', LOG_PREFIX)
+            return meeting_passcode
+        except ClientError as error:
+            if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                logger.error('%s Error updating Database: %s', LOG_PREFIX, error)
+                raise error
+            logger.info('%s Passcode %s already in use for event %s', LOG_PREFIX, meeting_passcode, event_id)
+    logger.error('%s Unable to allocate a unique passcode for event %s', LOG_PREFIX, event_id)
+    raise Exception('Unable to allocate a unique passcode')
 
 
-def get_records(event):
-    bucket = event['Records'][0]['s3']['bucket']['name']
-    key = urllib.parse.unquote_plus(event['Records'][0]['s3']['object']['key'], encoding='utf-8')
+def get_object(bucket, key, **kwargs):
     logger.info('%s Getting S3 Object: %s/%s', LOG_PREFIX, bucket, key)
     try:
-        meeting_request = s3_client.get_object(Bucket=bucket, Key=key)
+        meeting_request = s3_client.get_object(Bucket=bucket, Key=key, **kwargs)
         logger.info("%s CONTENT TYPE: %s", LOG_PREFIX, meeting_request['ContentType'])
     except Exception as error:
         logger.error('%s S3 GetObject Error: %s', LOG_PREFIX, error)
         raise error
+    return meeting_request
+
+
+def get_records(meeting_request, roster_format, request_info=None, bucket=None, key=None):
+    if roster_format == 'json':
+        participants = request_info['Participants']
+        for index in range(0, len(participants), ROSTER_CHUNK_SIZE):
+            yield participants[index:index + ROSTER_CHUNK_SIZE], request_info['EventId']
+        return
+
+    default_event_id = meeting_request.get('Metadata', {}).get('eventid')
+    lines = read_lines(meeting_request, bucket, key)
+    if roster_format == 'csv':
+        rows = (normalize_csv_row(row) for row in csv.DictReader(lines))
+    else:
+        rows = (json.loads(line) for line in lines)
 
-    request_info = json.loads(meeting_request['Body'].read().decode('utf-8'))
-    logger.info('%s S3 GetObject Info: %s', LOG_PREFIX, json.dumps(request_info))
-    return request_info['Participants'], request_info['EventId']
+    chunks = defaultdict(list)
+    for row in rows:
+        if 'PhoneNumber' not in row:
+            default_event_id = row.get('EventId', default_event_id)
+            continue
+        event_id = row.get('EventId') or default_event_id
+        if not event_id:
+            logger.error('%s Skipping participant %s with no EventId', LOG_PREFIX, row['PhoneNumber'])
+            continue
+        chunks[str(event_id)].append(row)
+        if len(chunks[str(event_id)]) >= ROSTER_CHUNK_SIZE:
+            yield chunks.pop(str(event_id)), event_id
+    for event_id, chunk in chunks.items():
+        yield chunk, event_id
+
+
+def read_lines(meeting_request, bucket, key):
+    # Rows are provisioned as they are read, which can take longer than S3 keeps an idle connection open.  So
+    # the roster is read a range at a time, each range in full and the connection closed before its rows are
+    # provisioned.  Every range must come from the same version of the object as the first.
+    size = meeting_request['ContentLength']
+    data = meeting_request['Body'].read(ROSTER_READ_BYTES)
+    meeting_request['Body'].close()
+    position = len(data)
+    remainder = b''
+    while True:
+        lines = (remainder + data).split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line.rstrip(b'\r').decode('utf-8')
+        if position >= size:
+            break
+        data = get_object(bucket, key, Range='bytes=%d-%d' % (position, position + ROSTER_READ_BYTES - 1), IfMatch=meeting_request['ETag'])['Body'].read()
+        position += len(data)
+    if remainder.strip():
+        yield remainder.rstrip(b'\r').decode('utf-8')
+
+
+def get_roster_format(key, content_type):
+    if key.endswith('.csv') or content_type.startswith('text/csv'):
+        return 'csv'
+    if key.endswith(('.ndjson', '.jsonl')) or content_type.startswith(('application/x-ndjson', 'application/jsonl')):
+        return 'ndjson'
+    return 'json'
+
+
+def normalize_csv_row(row):
+    row = {column: value for column, value in row.items() if value not in (None, '')}
+    if 'CallParticipant' in row:
+        row['CallParticipant'] = row['CallParticipant'].strip().lower() in ['true', 'yes', '1']
+    return row
 
 
 def call_participant(attendee, event_id, meeting_passcode):
@@ -169,57 +660,89 @@ def call_participant(attendee, event_id, meeting_passcode):
             FromPhoneNumber=FROM_NUMBER,
             ToPhoneNumber=attendee['PhoneNumber'],
             SipMediaApplicationId=SIP_MEDIA_APPLICATION_ID,
-            ArgumentsMap={
-                'meeting_id': attendee['MeetingId'],
-                'attendee_id': attendee['Attendee']['AttendeeId'],
-                'join_token': attendee['Attendee']['JoinToken'],
-                'event_id': str(event_id),
-                'meeting_passcode': str(meeting_passcode),
-                'phone_number': attendee['PhoneNumber'],
-            }
+            ArgumentsMap=dial_arguments(attendee, event_id, meeting_passcode)
         )
     except Exception as error:
         logger.error('%s Error calling attendee: %s', LOG_PREFIX, error)
         raise error
 
 
-def send_email(event_id, to_email, meeting_passcode):
-    logger.info('%s Sending email to %s for meeting %s', LOG_PREFIX, to_email, event_id)
+def dial_arguments(attendee, event_id, meeting_passcode):
+    arguments = {
+        'meeting_id': attendee['MeetingId'],
+        'attendee_id': attendee['Attendee']['AttendeeId'],
+        'join_token': attendee['Attendee']['JoinToken'],
+        'event_id': str(event_id),
+        'meeting_passcode': str(meeting_passcode),
+        'phone_number': attendee['PhoneNumber'],
+    }
+    if attendee.get('ControlRegion'):
+        arguments['control_region'] = attendee['ControlRegion']
+    return arguments
+
+
+def send_invitations(invitations, event_id):
+    for start in range(0, len(invitations), BULK_EMAIL_LIMIT):
+        chunk = invitations[start:start + BULK_EMAIL_LIMIT]
+        statuses = send_bulk_email(event_id, chunk)
+        for (attendee, result), status in zip(chunk, statuses):
+            result['EmailStatus'] = status['Status']
+            if status['Status'] == 'Success':
+                result['EmailMessageId'] = status['MessageId']
+            else:
+                logger.error('%s Email to %s failed: %s', LOG_PREFIX, attendee['Email'], status.get('Error'))
+                result['Status'] = 'FAILED'
+                result['Error'] = status.get('Error', status['Status'])
+
+
+def send_bulk_email(event_id, chunk):
+    logger.info('%s Sending %s emails for meeting %s', LOG_PREFIX, len(chunk), event_id)
+    destinations = [{
+        'Destination': {'ToAddresses': [attendee['Email']]},
+        'ReplacementTemplateData': json.dumps(invitation_data(event_id, result['MeetingPasscode']))
+    } for attendee, result in chunk]
+    for attempt in range(EMAIL_RETRIES):
+        try:
+            email_response = ses_client.send_bulk_templated_email(
+                Source=FROM_EMAIL,
+                Template=EMAIL_TEMPLATE,
+                DefaultTemplateData=json.dumps(invitation_data(event_id, '')),
+                Destinations=destinations
+            )
+            return email_response['Status']
+        except CircuitOpenError as error:
+            logger.error('%s SES SendBulkTemplatedEmail Error: %s', LOG_PREFIX, error)
+            return [{'Status': 'Failed', 'Error': str(error)}] * len(chunk)
+        except ClientError as error:
+            logger.error('%s SES SendBulkTemplatedEmail Error: %s', LOG_PREFIX, error)
+            if error.response['Error']['Code'] != 'Throttling' or attempt == EMAIL_RETRIES - 1:
+                return [{'Status': 'Failed', 'Error': str(error)}] * len(chunk)
+        time.sleep(uniform(0, 0.5 * 2 ** attempt))
+
+
+def invitation_data(event_id, meeting_passcode):
+    return {
+        'event_id': str(event_id),
+        'dial_in': str(FROM_NUMBER) + ',,' + str(event_id) + ',,' + str(meeting_passcode),
+        'join_link': 'http://' + DISTRIBUTION + '/meeting?eventId=' + str(event_id) + '&passcode=' + str(meeting_passcode)
+    }
+
+
+def record_progress(entries, event_id):
+    updates = [(result['MeetingPasscode'], {progress: result[progress] for progress in PROGRESS_ATTRIBUTES if progress in result}) for attendee, result in entries]
+    updates = [(meeting_passcode, progress) for meeting_passcode, progress in updates if progress]
+    if updates:
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, len(updates)))) as executor:
+            list(executor.map(lambda update: write_progress(event_id, *update), updates))
+
+
+def write_progress(event_id, meeting_passcode, progress):
+    # Only the progress attributes are set, so a join that claimed the row since it was written is kept
     try:
-        ses_client.send_email(
-            Source=FROM_EMAIL,
-            Destination={
-                'ToAddresses': [
-                    to_email,
-                ],
-            },
-            Message={
-                'Subject': {
-                    'Data': 'Amazon Chime SDK Meeting Invitation - ' + str(event_id),
-                    'Charset': 'UTF-8'
-                },
-                'Body': {
-                    'Text': {
-                        'Data':
-                        (
-                            'A meeting has been started. /nTo join the meeting:/n+' +
-                            str(FROM_NUMBER) + ',,' + str(event_id) + ',,' + str(meeting_passcode) +
-                            '/nhttp://' + DISTRIBUTION + '/meeting?eventId=' + str(event_id) + '&passcode=' + str(meeting_passcode)
-                        ),
-                        'Charset': 'UTF-8'
-                    },
-                    'Html': {
-                        'Data':
-                        (
-                            '<p>A meeting has been started.</p><p>To join the meeting:</p><p>' +
-                            str(FROM_NUMBER) + ',,' + str(event_id) + ',,' + str(meeting_passcode) +
-                            '<p><a href="http://' + DISTRIBUTION + '/meeting?eventId=' + str(event_id) + '&passcode=' + str(meeting_passcode) + '">Meeting Link</a></p>'
-                        ),
-                        'Charset': 'UTF-8'
-                        }
-                    }
-                },
-        )
-    except Exception as error:
-        logger.error('%s SES SendEmail Error: %s', LOG_PREFIX, error)
-        raise error
+        meeting_table.update_item(
+            Key={'EventId': str(event_id), 'MeetingPasscode': str(meeting_passcode)},
+            UpdateExpression='SET ' + ', '.join('%s = :%s' % (name, name) for name in progress),
+            ConditionExpression='attribute_exists(MeetingPasscode)',
+            ExpressionAttributeValues={':' + name: value for name, value in progress.items()})
+    except (ClientError, CircuitOpenError) as error:
+        logger.error('%s Error recording progress for passcode %s: %s', LOG_PREFIX, meeting_passcode, error)
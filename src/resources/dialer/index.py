@@ -0,0 +1,161 @@
+import os
+import json
+import time
+from collections import Counter, defaultdict
+from random import uniform
+from botocore.exceptions import ClientError
+from sma_dialer.circuit import CircuitOpenError
+from sma_dialer.dial_queue import SqsDialQueue, record_dial_progress
+from sma_dialer.log import log_payload
+from sma_dialer.pacing import Pacer, hold_delay, read_pacing, record_active_calls
+from sma_dialer.rate_limit import TokenBucket
+from sma_dialer.runtime import LazyClient, Table, get_logger
+
+chime_sdk_voice_client = LazyClient('chime-sdk-voice')
+
+FROM_NUMBER = os.environ['FROM_NUMBER']
+SIP_MEDIA_APPLICATION_ID = os.environ['SIP_MEDIA_APPLICATION_ID']
+MEETING_TABLE = os.environ['MEETING_TABLE']
+DIAL_QUEUE_URL = os.environ.get('DIAL_QUEUE_URL')
+CALLS_PER_SECOND = float(os.environ.get('CALLS_PER_SECOND', '1'))
+DIALER_CONCURRENCY = int(os.environ.get('DIALER_CONCURRENCY', '2'))
+MAX_RECEIVES = int(os.environ.get('MAX_RECEIVES', '5'))
+DIAL_RETRIES = 3
+DIAL_BACKOFF = 0.5
+DEADLINE_MARGIN = 5
+RETRYABLE_ERRORS = frozenset([
+    'ThrottledClientException',
+    'ThrottlingException',
+    'ServiceUnavailableException',
+    'ServiceFailureException',
+    'ResourceLimitExceededException',
+])
+
+meeting_table = Table(MEETING_TABLE)
+dial_queue = SqsDialQueue(DIAL_QUEUE_URL) if DIAL_QUEUE_URL else None
+
+# The event source mapping runs at most DIALER_CONCURRENCY containers, each taking an equal share of the call
+# rate and of the calls the pacer allows
+dial_bucket = TokenBucket(CALLS_PER_SECOND / DIALER_CONCURRENCY)
+pacer = Pacer(shares=DIALER_CONCURRENCY)
+
+logger = get_logger()
+
+
+def handler(event, context):
+    global LOG_PREFIX
+    LOG_PREFIX = 'Dialer: '
+    log_payload(logger, '%s RECV Event: %s', LOG_PREFIX, event)
+
+    deadline = None
+    if context is not None:
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN
+
+    batch_item_failures = []
+    progress = defaultdict(lambda: defaultdict(int))
+    jobs = [(record, json.loads(record['body'])) for record in event['Records']]
+    observe_pacing(Counter(job['event_id'] for record, job in jobs))
+    held = []
+    for record, job in jobs:
+        if not pacer.acquire(job['event_id']):
+            held.append((record, job))
+            continue
+        status = dial(job, deadline)
+        if status == 'PLACED':
+            progress[job['event_id']]['placed'] += 1
+            count_active_call()
+            continue
+        pacer.release(job['event_id'])
+        if status == 'FAILED':
+            progress[job['event_id']]['failed'] += 1
+            continue
+        # Returned to the queue, and moved to the dead-letter queue once it has been received MAX_RECEIVES times
+        batch_item_failures.append({'itemIdentifier': record['messageId']})
+        if status == 'RETRY' and int(record['attributes']['ApproximateReceiveCount']) >= MAX_RECEIVES:
+            progress[job['event_id']]['failed'] += 1
+    batch_item_failures.extend(hold(held))
+
+    for event_id, counts in progress.items():
+        try:
+            record_dial_progress(meeting_table, event_id, **counts)
+        except Exception as error:
+            logger.error('%s Error recording dial progress for event %s: %s', LOG_PREFIX, event_id, error)
+    logger.info('%s Processed %s dial jobs, %s held by the pacer and %s returned to the queue', LOG_PREFIX, len(jobs), len(held), len(batch_item_failures))
+    return {'batchItemFailures': batch_item_failures}
+
+
+def observe_pacing(waiting):
+    # The pacer keeps counting the calls placed since its last reading if the counters cannot be read, so a
+    # failure only makes it more cautious
+    event_ids = set(waiting)
+    try:
+        active_calls, events = read_pacing(meeting_table, event_ids)
+    except Exception as error:
+        logger.error('%s Error reading pacing counters: %s', LOG_PREFIX, error)
+        return
+    pacer.observe(active_calls, events, waiting)
+    for event_id in event_ids:
+        rates = pacer.outcomes(event_id).rates()
+        logger.info('%s Event %s: %s active calls, answer rate %.2f, accept rate %.2f, decline rate %.2f, limit %s', LOG_PREFIX, event_id,
+                    active_calls, rates['answer_rate'], rates['accept_rate'], rates['decline_rate'], pacer.event_limit(event_id))
+
+
+def count_active_call():
+    try:
+        record_active_calls(meeting_table, 1)
+    except Exception as error:
+        logger.error('%s Error counting active call: %s', LOG_PREFIX, error)
+
+
+def hold(held):
+    # Jobs the pacer holds back are sent again with a delay rather than left to the visibility timeout, which
+    # would also count towards MAX_RECEIVES.  The delay doubles each time a job is held, so jobs waiting on a
+    # full trunk are not resent every few seconds.  Returns the batch item failures for any that could not be.
+    if dial_queue is None:
+        return [{'itemIdentifier': record['messageId']} for record, job in held]
+    failed = []
+    by_delay = defaultdict(list)
+    for position, (record, job) in enumerate(held):
+        holds = int(job.get('holds', '0'))
+        by_delay[hold_delay(holds)].append((position, dict(job, holds=str(holds + 1))))
+    for delay, entries in by_delay.items():
+        try:
+            failed.extend(entries[index][0] for index in dial_queue.send([job for position, job in entries], delay_seconds=delay))
+        except Exception as error:
+            logger.error('%s Error holding dial jobs: %s', LOG_PREFIX, error)
+            failed.extend(position for position, job in entries)
+    return [{'itemIdentifier': held[position][0]['messageId']} for position in sorted(failed)]
+
+
+def dial(job, deadline=None):
+    for attempt in range(DIAL_RETRIES):
+        if not dial_bucket.acquire(deadline):
+            logger.info('%s Out of time before calling %s', LOG_PREFIX, job['phone_number'])
+            return 'DEFERRED'
+        try:
+            call_participant(job)
+            return 'PLACED'
+        except ClientError as error:
+            if error.response['Error']['Code'] not in RETRYABLE_ERRORS:
+                logger.error('%s Error calling %s: %s', LOG_PREFIX, job['phone_number'], error)
+                return 'FAILED'
+            logger.warning('%s Retrying call to %s after %s', LOG_PREFIX, job['phone_number'], error.response['Error']['Code'])
+        except CircuitOpenError as error:
+            # Left on the queue until the voice service recovers, rather than waiting here
+            logger.warning('%s Deferring call to %s: %s', LOG_PREFIX, job['phone_number'], error)
+            return 'DEFERRED'
+        except Exception as error:
+            # Raising would return the whole batch to the queue and redial the calls already placed
+            logger.warning('%s Retrying call to %s after %s', LOG_PREFIX, job['phone_number'], error)
+        time.sleep(uniform(0, DIAL_BACKOFF * 2 ** attempt))
+    return 'RETRY'
+
+
+def call_participant(job):
+    logger.info('%s Calling %s for meeting %s', LOG_PREFIX, job['phone_number'], job['event_id'])
+    chime_sdk_voice_client.create_sip_media_application_call(
+        FromPhoneNumber=FROM_NUMBER,
+        ToPhoneNumber=job['phone_number'],
+        SipMediaApplicationId=SIP_MEDIA_APPLICATION_ID,
+        ArgumentsMap={name: value for name, value in job.items() if name != 'holds'}
+    )
@@ -1,15 +1,20 @@
 import os
 import json
-import logging
-import boto3
 from botocore.exceptions import ClientError
+from sma_dialer.circuit import CircuitOpenError
+from sma_dialer.log import LazyJson, log_payload
+from sma_dialer.regions import RegionalClients, control_region_for
+from sma_dialer.runtime import Table, get_logger
+from sma_dialer.teardown import close_event, close_meetings
 
-chime_sdk_meeting_client = boto3.client('chime-sdk-meetings')
-dynamo_client = boto3.resource('dynamodb')
+meeting_clients = RegionalClients('chime-sdk-meetings')
 
 MEETING_TABLE = os.environ['MEETING_TABLE']
 
-meeting_table = dynamo_client.Table(MEETING_TABLE)
+meeting_table = Table(MEETING_TABLE)
+
+logger = get_logger()
+
 response = {
     'statusCode': 200,
     'headers': {
@@ -21,50 +26,68 @@ response = {
     }
 }
 
-# Set LOG_LEVEL using environment variable, fallback to INFO if not present
-logger = logging.getLogger()
-try:
-    LOG_LEVEL = os.environ['LOG_LEVEL']
-    if LOG_LEVEL not in ['INFO', 'DEBUG', 'WARN', 'ERROR']:
-        LOG_LEVEL = 'INFO'
-except BaseException:
-    LOG_LEVEL = 'INFO'
-logger.setLevel(LOG_LEVEL)
-
 
 def handler(event, context):
     global LOG_PREFIX
     LOG_PREFIX = 'End Meeting: '
-    logger.info('%s RECV Event: %s', LOG_PREFIX, json.dumps(event, indent=4))
+    log_payload(logger, '%s RECV Event: %s', LOG_PREFIX, event)
   
     body = json.loads(event['body'])
-    if body['meetingId']:
+    if body.get('eventId') or body.get('meetingIds'):
+        return teardown(body)
+    if body.get('meetingId'):
         logger.info('%s Deleting meeting: %s', LOG_PREFIX, body['meetingId'])
-        delete_meeting_response = delete_meeting(body['meetingId'])
+        delete_meeting_response = delete_meeting(body['meetingId'], control_region_for(body.get('mediaRegion')))
         if delete_meeting_response:
             response['body'] = json.dumps({'message': 'Meeting deleted successfully'})
             response['statusCode'] = 200
-            logger.info('%s Response: %s', LOG_PREFIX, json.dumps(response, indent=4))
+            logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
             return response
         else:
             response['body'] = json.dumps({'message': 'Unable to delete meeting'})
             response['statusCode'] = 503
-            logger.info('%s Response: %s', LOG_PREFIX, json.dumps(response, indent=4))
+            logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
             return response
     else:
         response['body'] = json.dumps({'message': 'Meeting ID not provided'})
         response['statusCode'] = 404
-        logger.info('%s Response: %s', LOG_PREFIX, json.dumps(response, indent=4))
+        logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
         return response
 
 
-def delete_meeting(meeting_id):
+def teardown(body):
+    # Bulk requests end the meetings and also remove their passcode rows, rather than leaving them to the TTL
+    try:
+        if body.get('eventId'):
+            logger.info('%s Closing event: %s', LOG_PREFIX, body['eventId'])
+            failed, deleted = close_event(meeting_table, meeting_clients, str(body['eventId']))
+        else:
+            logger.info('%s Deleting %s meetings', LOG_PREFIX, len(body['meetingIds']))
+            failed, deleted = close_meetings(meeting_table, meeting_clients, body['meetingIds'], control_region_for(body.get('mediaRegion')))
+    except Exception as error:
+        logger.error('%s Error tearing down meetings: %s', LOG_PREFIX, error)
+        response['body'] = json.dumps({'message': 'Unable to delete meetings'})
+        response['statusCode'] = 503
+        return response
+    if failed:
+        logger.error('%s Unable to delete meetings: %s', LOG_PREFIX, failed)
+        response['body'] = json.dumps({'message': 'Unable to delete some meetings', 'failed': failed, 'deletedRows': deleted})
+        response['statusCode'] = 503
+    else:
+        response['body'] = json.dumps({'message': 'Meetings deleted successfully', 'deletedRows': deleted})
+        response['statusCode'] = 200
+    logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
+    return response
+
+
+def delete_meeting(meeting_id, control_region):
     try:
-        delete_meeting_response = chime_sdk_meeting_client.delete_meeting(
+        delete_meeting_response = meeting_clients.get(control_region).delete_meeting(
             MeetingId=meeting_id
         )
-        logger.info('%s Delete meeting response: %s', LOG_PREFIX, json.dumps(delete_meeting_response, indent=4))
+        logger.debug('%s Delete meeting response: %s', LOG_PREFIX, LazyJson(delete_meeting_response))
         return True
-    except ClientError as error:
+    except (ClientError, CircuitOpenError) as error:
+        # The meeting's rows are left as they are, so teardown.sweep still ends it once it expires or goes idle
         logger.error('%s Error deleting meeting: %s', LOG_PREFIX, error)
         return False
@@ -1,36 +1,215 @@
-import logging
-import json
-import decimal
 import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from sma_dialer.attendee_index import active_meetings, adjust_attendee_count, clear_meeting, count_attendees, meeting_key, record_presence, set_attendee_count
+from sma_dialer.attendee_pool import drain_pool, ready_attendees, refill_pool, return_attendee
+from sma_dialer.log import LazyJson, log_payload
+from sma_dialer.metrics import MeetingMetrics
+from sma_dialer.regions import RegionalClients, region_attributes
+from sma_dialer.runtime import Table, get_logger
+from sma_dialer.teardown import SWEEP_EXPIRED, SWEEP_IDLE, close_event, delete_meeting, sweep_reason
 
-# Set LOG_LEVEL using environment variable, fallback to INFO if not present
-logger = logging.getLogger()
-try:
-    LOG_LEVEL = os.environ['LOG_LEVEL']
-    if LOG_LEVEL not in ['INFO', 'DEBUG', 'WARN', 'ERROR']:
-        LOG_LEVEL = 'INFO'
-except BaseException:
-    LOG_LEVEL = 'INFO'
-logger.setLevel(LOG_LEVEL)
+meeting_clients = RegionalClients('chime-sdk-meetings')
 
+MEETING_TABLE = os.environ.get('MEETING_TABLE')
+PENDING_JOIN_LIMIT = 10000
+METRIC_UNITS = {
+    'MeetingsStarted': 'Count',
+    'MeetingsEnded': 'Count',
+    'AttendeesAdded': 'Count',
+    'AttendeesJoined': 'Count',
+    'AttendeesLeft': 'Count',
+    'AttendeesDropped': 'Count',
+    'PstnJoins': 'Count',
+    'WebRtcJoins': 'Count',
+    'JoinLatency': 'Milliseconds',
+    'CallsPlaced': 'Count',
+    'CallsFailed': 'Count',
+}
+MEETING_EVENT_METRICS = {
+    'chime:MeetingStarted': 'MeetingsStarted',
+    'chime:MeetingEnded': 'MeetingsEnded',
+    'chime:AttendeeAdded': 'AttendeesAdded',
+    'chime:AttendeeJoined': 'AttendeesJoined',
+    'chime:AttendeeLeft': 'AttendeesLeft',
+    'chime:AttendeeDropped': 'AttendeesDropped',
+}
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, decimal.Decimal):
-            return int(obj)
-        return super(DecimalEncoder, self).default(obj)
+# An attendee that leaves is not deleted, so web joins hand their attendee back to the pool
+POOL_RETURN_EVENTS = frozenset(['chime:AttendeeLeft', 'chime:AttendeeDropped'])
+PRESENCE_EVENTS = {
+    'chime:MeetingStarted': 0,
+    'chime:AttendeeJoined': 1,
+    'chime:AttendeeLeft': -1,
+    'chime:AttendeeDropped': -1,
+}
+
+meeting_table = Table(MEETING_TABLE) if MEETING_TABLE else None
+
+meeting_metrics = MeetingMetrics(METRIC_UNITS)
+
+# AttendeeAdded times by attendee, so the matching AttendeeJoined in this container can report join latency
+attendees_added = OrderedDict()
+
+logger = get_logger()
 
 
 def handler(event, context):
     global LOG_PREFIX
     LOG_PREFIX = 'EventBridge Notification: '
     
-    if 'detail-type' in event:
-        if event['detail-type'] == 'AWS API Call via CloudTrail':
-            logger.info('%s Event Name: %s | Event Source: %s', LOG_PREFIX, event['detail']['eventName'], event['detail']['eventSource'])
-            logger.debug('%s userIdentity: %s', LOG_PREFIX, json.dumps(event['detail']['userIdentity'],  cls=DecimalEncoder, indent=4))
-            logger.debug('%s requestParameters: %s', LOG_PREFIX, json.dumps(event['detail']['requestParameters'],  cls=DecimalEncoder, indent=4))
-            logger.debug('%s responseElements: %s', LOG_PREFIX, json.dumps(event['detail']['responseElements'],  cls=DecimalEncoder, indent=4))
+    try:
+        if 'detail-type' not in event:
+            return
+        if event['detail-type'] == 'Scheduled Event':
+            reconcile_attendee_counts()
+        elif event['detail-type'] == 'AWS API Call via CloudTrail':
+            logger.debug('%s Event Name: %s | Event Source: %s', LOG_PREFIX, event['detail']['eventName'], event['detail']['eventSource'])
+            logger.debug('%s userIdentity: %s', LOG_PREFIX, LazyJson(event['detail']['userIdentity']))
+            logger.debug('%s requestParameters: %s', LOG_PREFIX, LazyJson(event['detail']['requestParameters']))
+            logger.debug('%s responseElements: %s', LOG_PREFIX, LazyJson(event['detail']['responseElements']))
+            record_api_call(event['detail'])
+        else:
+            logger.debug('%s Detail Type: %s | Event Type: %s', LOG_PREFIX, event['detail-type'], event['detail'].get('eventType'))
+            log_payload(logger, '%s  %s', LOG_PREFIX, event, event.get('id'))
+            record_meeting_event(event)
+            if event['detail'].get('eventType') in POOL_RETURN_EVENTS:
+                return_pooled_attendee(event['detail'])
+            if event['detail'].get('eventType') in PRESENCE_EVENTS:
+                update_presence(event['detail'])
+    finally:
+        # Written out by every invocation, as the container may be frozen or recycled before the next one
+        meeting_metrics.flush()
+
+
+def event_timestamp(event):
+    # Meeting events carry a millisecond timestamp, the envelope time is only accurate to the second
+    if 'timestamp' in event['detail']:
+        return int(event['detail']['timestamp'])
+    if 'time' in event:
+        return int(datetime.strptime(event['time'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return int(time.time() * 1000)
+
+
+def record_meeting_event(event):
+    detail = event['detail']
+    metric = MEETING_EVENT_METRICS.get(detail.get('eventType'))
+    if metric is None:
+        return
+    meeting_id = detail.get('meetingId')
+    attendee_id = detail.get('attendeeId')
+    meeting_metrics.count(meeting_id, metric)
+    if metric == 'AttendeesAdded' and attendee_id:
+        attendees_added[attendee_id] = event_timestamp(event)
+        while len(attendees_added) > PENDING_JOIN_LIMIT:
+            attendees_added.popitem(last=False)
+    elif metric == 'AttendeesJoined':
+        if detail.get('networkType', '').upper() == 'PSTN':
+            meeting_metrics.count(meeting_id, 'PstnJoins')
+        else:
+            meeting_metrics.count(meeting_id, 'WebRtcJoins')
+        added = attendees_added.pop(attendee_id, None)
+        if added is not None:
+            meeting_metrics.observe(meeting_id, 'JoinLatency', max(0, event_timestamp(event) - added))
+
+
+def record_api_call(detail):
+    if detail.get('eventName') != 'CreateSipMediaApplicationCall':
+        return
+    if detail.get('errorCode'):
+        meeting_metrics.count(None, 'CallsFailed')
+    else:
+        meeting_metrics.count(None, 'CallsPlaced')
+
+
+def return_pooled_attendee(detail):
+    if meeting_table is None or not detail.get('attendeeId'):
+        return
+    try:
+        query_response = meeting_table.query(
+            IndexName='MeetingAttendeeIndex',
+            KeyConditionExpression='MeetingId = :m AND AttendeeId = :a',
+            ExpressionAttributeValues={':m': detail['meetingId'], ':a': detail['attendeeId']}
+        )
+        for item in query_response['Items']:
+            if return_attendee(meeting_table, item['EventId'], item['MeetingPasscode'], detail['attendeeId']):
+                release_meeting(item['EventId'], detail['meetingId'])
+    except Exception as error:
+        logger.error('%s Error returning attendee %s to the pool: %s', LOG_PREFIX, detail['attendeeId'], error)
+
+
+def release_meeting(event_id, meeting_id):
+    # A web attendee back in the pool no longer counts, and as with a hangup the meeting ends with the last one
+    attendee_count = adjust_attendee_count(meeting_table, event_id, meeting_id, -1)
+    logger.info('%s Current attendee count: %s', LOG_PREFIX, attendee_count)
+    if attendee_count is not None and attendee_count <= 0:
+        logger.info('%s No more attendees, deleting meeting: %s', LOG_PREFIX, meeting_id)
+        event_record = meeting_table.get_item(Key=meeting_key(event_id)).get('Item', {})
+        sweep_meeting(event_id, meeting_id, event_record, SWEEP_IDLE)
+
+
+def update_presence(detail):
+    # The ExternalMeetingId of every meeting is the event id
+    if meeting_table is None or not detail.get('externalMeetingId'):
+        return
+    try:
+        record_presence(meeting_table, detail['externalMeetingId'], detail['meetingId'], PRESENCE_EVENTS[detail['eventType']])
+    except Exception as error:
+        logger.error('%s Error recording presence for meeting %s: %s', LOG_PREFIX, detail['meetingId'], error)
+
+
+def sweep_meeting(event_id, meeting_id, event_record, reason):
+    if reason == SWEEP_EXPIRED:
+        failed, deleted = close_event(meeting_table, meeting_clients, event_id)
+        if failed:
+            logger.error('%s Unable to delete meetings %s for expired event %s', LOG_PREFIX, failed, event_id)
         else:
-            logger.info('%s Detail Type: %s | Event Type: %s', LOG_PREFIX, event['detail-type'], event['detail']['eventType'])
-            logger.debug('%s  %s', LOG_PREFIX, json.dumps(event,  cls=DecimalEncoder, indent=4))
\ No newline at end of file
+            logger.info('%s Closed expired event %s and deleted %s rows', LOG_PREFIX, event_id, deleted)
+        return
+    if not delete_meeting(meeting_clients.get(region_attributes(event_record)[1]), meeting_id):
+        logger.error('%s Unable to delete idle meeting %s', LOG_PREFIX, meeting_id)
+        return
+    logger.info('%s Deleted idle meeting %s for event %s', LOG_PREFIX, meeting_id, event_id)
+    clear_meeting(meeting_table, event_id, meeting_id)
+    drain_pool(meeting_table, event_id, meeting_id)
+
+
+def reconcile_attendee_counts():
+    reconciled = 0
+    swept = 0
+    for event_id, meeting_id in active_meetings(meeting_table):
+        try:
+            event_record = meeting_table.get_item(Key=meeting_key(event_id)).get('Item', {})
+            reason = sweep_reason(event_record)
+            if reason:
+                sweep_meeting(event_id, meeting_id, event_record, reason)
+                swept += 1
+                continue
+        except Exception as error:
+            logger.error('%s Error sweeping meeting %s for event %s: %s', LOG_PREFIX, meeting_id, event_id, error)
+            continue
+        chime_sdk_meeting_client = meeting_clients.get(region_attributes(event_record)[1])
+        try:
+            attendee_count = count_attendees(chime_sdk_meeting_client, meeting_id, ready_attendees(meeting_table, event_id, meeting_id))
+        except chime_sdk_meeting_client.exceptions.NotFoundException:
+            logger.info('%s Meeting %s for event %s no longer exists', LOG_PREFIX, meeting_id, event_id)
+            clear_meeting(meeting_table, event_id, meeting_id)
+            try:
+                drain_pool(meeting_table, event_id, meeting_id)
+            except Exception as error:
+                logger.error('%s Error emptying attendee pool for meeting %s: %s', LOG_PREFIX, meeting_id, error)
+            continue
+        except Exception as error:
+            logger.error('%s Error listing attendees for meeting %s: %s', LOG_PREFIX, meeting_id, error)
+            continue
+        set_attendee_count(meeting_table, event_id, meeting_id, attendee_count)
+        reconciled += 1
+        try:
+            refilled = refill_pool(meeting_table, chime_sdk_meeting_client, event_id, meeting_id)
+        except Exception as error:
+            logger.error('%s Error refilling attendee pool for meeting %s: %s', LOG_PREFIX, meeting_id, error)
+            continue
+        if refilled:
+            logger.info('%s Added %s pooled attendees to meeting %s', LOG_PREFIX, refilled, meeting_id)
+    logger.info('%s Reconciled attendee counts for %s meetings and swept %s', LOG_PREFIX, reconciled, swept)
@@ -1,16 +1,25 @@
 import os
-import decimal
 import json
-import logging
-import boto3
-from botocore.exceptions import ClientError
+import time
+from sma_dialer.attendee_index import adjust_attendee_count
+from sma_dialer.attendee_pool import POOL_CLAIMED, claim_attendee
+from sma_dialer.cache import ItemCache
+from sma_dialer.log import LazyJson, log_payload
+from sma_dialer.regions import RegionalClients, region_attributes
+from sma_dialer.runtime import Table, get_logger
 
-chime_sdk_meeting_client = boto3.client('chime-sdk-meetings')
-dynamo_client = boto3.resource('dynamodb')
+meeting_clients = RegionalClients('chime-sdk-meetings')
 
 MEETING_TABLE = os.environ['MEETING_TABLE']
 
-meeting_table = dynamo_client.Table(MEETING_TABLE)
+meeting_table = Table(MEETING_TABLE)
+passcode_cache = ItemCache()
+# Meeting details by MeetingId, so pooled joins skip get_meeting for a meeting this container has just seen
+meeting_cache = {}
+MEETING_CACHE_SIZE = 256
+MEETING_CACHE_TTL = 60
+logger = get_logger()
+
 response = {
     'statusCode': 200,
     'headers': {
@@ -22,62 +31,66 @@ response = {
     }
 }
 
-# Set LOG_LEVEL using environment variable, fallback to INFO if not present
-logger = logging.getLogger()
-try:
-    LOG_LEVEL = os.environ['LOG_LEVEL']
-    if LOG_LEVEL not in ['INFO', 'DEBUG', 'WARN', 'ERROR']:
-        LOG_LEVEL = 'INFO'
-except BaseException:
-    LOG_LEVEL = 'INFO'
-logger.setLevel(LOG_LEVEL)
-
-
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, decimal.Decimal):
-            return int(obj)
-        return super(DecimalEncoder, self).default(obj)
-    
 
 def handler(event, context):
     global LOG_PREFIX
     LOG_PREFIX = 'Join Meeting: '
 
-    logger.info('%s RECV Event: %s', LOG_PREFIX, json.dumps(event, indent=4))
+    log_payload(logger, '%s RECV Event: %s', LOG_PREFIX, event)
   
     body = json.loads(event['body'])
     event_id = body['EventId']
     meeting_passcode = body['MeetingPasscode']
     phone_number = body['PhoneNumber']
 
+    if not meeting_passcode.isdigit():
+        response['statusCode'] = 404
+        return response
+
+    pooled_info = join_pooled_attendee(event_id, meeting_passcode)
+    if pooled_info:
+        response['body'] = json.dumps(pooled_info)
+        response['statusCode'] = 200
+        logger.info('%s Response: %s with pooled attendee', LOG_PREFIX, response['statusCode'])
+        return response
+
     try:
-        event_info = meeting_table.get_item(Key={"EventId": event_id, "MeetingPasscode": meeting_passcode})
+        event_info = passcode_cache.get_item(meeting_table, Key={"EventId": event_id, "MeetingPasscode": meeting_passcode})
     except Exception as error:
         logger.error('%s Error getting meeting info: %s', LOG_PREFIX, error)
         response['statusCode'] = 500
-        logger.info('%s Response: %s', LOG_PREFIX, json.dumps(response, indent=4))
+        logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
         return response
-    logger.info('%s Event info: %s', LOG_PREFIX, json.dumps(event_info, cls=DecimalEncoder, indent=4))
-    logger.info('%s MeetingPasscode: %s', LOG_PREFIX, meeting_passcode)
+    logger.debug('%s Event info: %s', LOG_PREFIX, LazyJson(event_info))
+    logger.debug('%s Passcode cache: %s hits, %s misses', LOG_PREFIX, passcode_cache.hits, passcode_cache.misses)
     logger.info('%s EventId: %s', LOG_PREFIX, event_id)
     logger.info('%s PhoneNumber: %s', LOG_PREFIX, phone_number)
 
     if 'Item' in event_info:
         if event_info['Item']['MeetingPasscode'] == meeting_passcode and event_info['Item']['EventId'] == event_id:
-            meeting_info = create_meeting(event_id, phone_number)
+            meeting_info = create_meeting(event_id, phone_number, *region_attributes(event_info['Item']))
             response_info = {
                 'Meeting': meeting_info['Meeting'],
                 'Attendee': meeting_info['Attendees'][0]
             }
             logger.info('%s Updating meeting info for event %s', LOG_PREFIX, event_id)
-            logger.info('%s Meeting info: %s', LOG_PREFIX, json.dumps(meeting_info, indent=4))
+            logger.debug('%s Meeting info: %s', LOG_PREFIX, LazyJson(meeting_info))
             update_response = meeting_table.update_item(
                 Key={"EventId": event_id, "MeetingPasscode": meeting_passcode},
-                UpdateExpression="set JoinMethod = :j, MeetingId = :m, AttendeeId = :a",
-                ExpressionAttributeValues={":j": 'Web',  ":m": meeting_info['Meeting']['MeetingId'], ":a": meeting_info['Attendees'][0]['AttendeeId']},
+                UpdateExpression="set JoinMethod = :j, MeetingId = :m, AttendeeId = :a, JoinToken = :t, PoolStatus = :p",
+                ExpressionAttributeValues={
+                    ":j": 'Web',
+                    ":m": meeting_info['Meeting']['MeetingId'],
+                    ":a": meeting_info['Attendees'][0]['AttendeeId'],
+                    ":t": meeting_info['Attendees'][0]['JoinToken'],
+                    ":p": POOL_CLAIMED
+                },
                 ReturnValues="UPDATED_NEW"),
-            logger.info('%s Update response: %s', LOG_PREFIX, json.dumps(update_response, indent=4))
+            logger.debug('%s Update response: %s', LOG_PREFIX, LazyJson(update_response))
+            try:
+                adjust_attendee_count(meeting_table, event_id, meeting_info['Meeting']['MeetingId'], 1)
+            except Exception as error:
+                logger.error('%s Error updating attendee count: %s', LOG_PREFIX, error)
             response['body'] = json.dumps(response_info)
             response['statusCode'] = 200
             return response
@@ -89,18 +102,61 @@ def handler(event, context):
         return response
 
 
-def create_meeting(event_id, phone_number):
-    logger.info('%s Creating meeting for event %s', LOG_PREFIX, event_id)
+def join_pooled_attendee(event_id, meeting_passcode):
+    try:
+        claimed = claim_attendee(meeting_table, event_id, meeting_passcode, 'Web')
+    except Exception as error:
+        logger.error('%s Error claiming pooled attendee: %s', LOG_PREFIX, error)
+        return None
+    if not claimed:
+        return None
+    meeting = get_meeting(claimed['MeetingId'], region_attributes(claimed)[1])
+    if meeting is None:
+        # The meeting has ended, so the request carries on to create a new one
+        return None
+    logger.info('%s Joining with pooled attendee %s', LOG_PREFIX, claimed['AttendeeId'])
+    try:
+        adjust_attendee_count(meeting_table, event_id, claimed['MeetingId'], 1)
+    except Exception as error:
+        logger.error('%s Error updating attendee count: %s', LOG_PREFIX, error)
+    return {
+        'Meeting': meeting,
+        'Attendee': {
+            'ExternalUserId': claimed['PhoneNumber'],
+            'AttendeeId': claimed['AttendeeId'],
+            'JoinToken': claimed['JoinToken']
+        }
+    }
+
+
+def get_meeting(meeting_id, control_region):
+    cached = meeting_cache.get(meeting_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    chime_sdk_meeting_client = meeting_clients.get(control_region)
+    try:
+        meeting = chime_sdk_meeting_client.get_meeting(MeetingId=meeting_id)['Meeting']
+    except chime_sdk_meeting_client.exceptions.NotFoundException:
+        logger.info('%s Meeting %s no longer exists', LOG_PREFIX, meeting_id)
+        return None
+    if len(meeting_cache) >= MEETING_CACHE_SIZE:
+        meeting_cache.pop(next(iter(meeting_cache)))
+    meeting_cache[meeting_id] = (time.monotonic() + MEETING_CACHE_TTL, meeting)
+    return meeting
+
+
+def create_meeting(event_id, phone_number, media_region, control_region):
+    logger.info('%s Creating meeting for event %s in %s', LOG_PREFIX, event_id, media_region)
     try:
-        meeting_info = chime_sdk_meeting_client.create_meeting_with_attendees(
+        meeting_info = meeting_clients.get(control_region).create_meeting_with_attendees(
             ClientRequestToken=event_id,
-            MediaRegion='us-east-1',
+            MediaRegion=media_region,
             ExternalMeetingId=event_id,
             Attendees=[{
                 'ExternalUserId': phone_number
             }]
         )
-        logger.info('%s Created Meeting: %s', LOG_PREFIX, json.dumps(meeting_info, indent=4))
+        logger.debug('%s Created Meeting: %s', LOG_PREFIX, LazyJson(meeting_info))
         return meeting_info
     except Exception as error:
         logger.error('%s Error creating meeting: %s', LOG_PREFIX, error)
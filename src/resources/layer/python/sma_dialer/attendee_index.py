@@ -0,0 +1,92 @@
+import time
+from botocore.exceptions import ClientError
+
+# Per-event row in the meeting table that counts the attendees in use in the Chime SDK meeting.  Pooled
+# attendees are only counted once they are claimed, so the count reaches zero when the last person leaves.
+# It uses ActiveMeetingId rather than MeetingId so it stays out of MeetingAttendeeIndex roster queries.
+MEETING_RECORD = 'MEETING'
+RECORD_TTL = 86400
+
+
+def meeting_key(event_id):
+    return {'EventId': str(event_id), 'MeetingPasscode': MEETING_RECORD}
+
+
+def adjust_attendee_count(table, event_id, meeting_id, delta):
+    try:
+        update = table.update_item(
+            Key=meeting_key(event_id),
+            UpdateExpression='SET ActiveMeetingId = :m, #ttl = :t ADD AttendeeCount :d',
+            ConditionExpression='attribute_not_exists(ActiveMeetingId) OR ActiveMeetingId = :m',
+            ExpressionAttributeNames={'#ttl': 'TTL'},
+            ExpressionAttributeValues={':m': meeting_id, ':d': delta, ':t': int(time.time() + RECORD_TTL)},
+            ReturnValues='UPDATED_NEW')
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise error
+        if delta < 0:
+            # A leave from a meeting the event has moved on from says nothing about the new meeting
+            return None
+        # The event has moved on to a new meeting, so the old count no longer applies
+        return set_attendee_count(table, event_id, meeting_id, delta)
+    return int(update['Attributes']['AttendeeCount'])
+
+
+def set_attendee_count(table, event_id, meeting_id, attendee_count):
+    table.update_item(
+        Key=meeting_key(event_id),
+        UpdateExpression='SET ActiveMeetingId = :m, AttendeeCount = :c, #ttl = if_not_exists(#ttl, :t)',
+        ExpressionAttributeNames={'#ttl': 'TTL'},
+        ExpressionAttributeValues={':m': meeting_id, ':c': attendee_count, ':t': int(time.time() + RECORD_TTL)})
+    return attendee_count
+
+
+def clear_meeting(table, event_id, meeting_id):
+    try:
+        table.update_item(
+            Key=meeting_key(event_id),
+            UpdateExpression='REMOVE ActiveMeetingId, AttendeeCount, PresentCount, LastActivity',
+            ConditionExpression='ActiveMeetingId = :m',
+            ExpressionAttributeValues={':m': meeting_id})
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise error
+
+
+def record_presence(table, event_id, meeting_id, delta):
+    # Counts the attendees actually in the meeting from the join and leave events, and when that last
+    # changed, so the sweeper can tell an idle meeting from one that still has pooled attendees
+    try:
+        table.update_item(
+            Key=meeting_key(event_id),
+            UpdateExpression='SET LastActivity = :n, #ttl = :t ADD PresentCount :d',
+            ConditionExpression='ActiveMeetingId = :m',
+            ExpressionAttributeNames={'#ttl': 'TTL'},
+            ExpressionAttributeValues={':m': meeting_id, ':d': delta, ':n': int(time.time()), ':t': int(time.time() + RECORD_TTL)})
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise error
+        return False
+    return True
+
+
+def active_meetings(table):
+    scan_args = {'IndexName': 'ActiveMeetingIndex'}
+    while True:
+        scan_response = table.scan(**scan_args)
+        for item in scan_response['Items']:
+            yield item['EventId'], item['ActiveMeetingId']
+        if 'LastEvaluatedKey' not in scan_response:
+            return
+        scan_args['ExclusiveStartKey'] = scan_response['LastEvaluatedKey']
+
+
+def count_attendees(chime_sdk_meeting_client, meeting_id, excluded=frozenset()):
+    attendee_count = 0
+    list_args = {'MeetingId': meeting_id}
+    while True:
+        attendee_info = chime_sdk_meeting_client.list_attendees(**list_args)
+        attendee_count += len([attendee for attendee in attendee_info['Attendees'] if attendee['AttendeeId'] not in excluded])
+        if not attendee_info.get('NextToken'):
+            return attendee_count
+        list_args['NextToken'] = attendee_info['NextToken']
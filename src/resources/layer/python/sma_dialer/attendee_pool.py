@@ -0,0 +1,130 @@
+import os
+from botocore.exceptions import ClientError
+
+# Passcode rows keep the join token of the attendee createMeeting made for them, so a join can take that
+# attendee with one conditional write instead of calling create_meeting_with_attendees while the caller waits.
+POOL_READY = 'READY'
+POOL_CLAIMED = 'CLAIMED'
+POOL_EMPTY = 'EMPTY'
+POOL_LOW_WATER_MARK = float(os.environ.get('POOL_LOW_WATER_MARK', '0.75'))
+BATCH_CREATE_ATTENDEE_LIMIT = 100
+
+
+def passcode_key(event_id, meeting_passcode):
+    return {'EventId': str(event_id), 'MeetingPasscode': str(meeting_passcode)}
+
+
+def pool_attributes(attendee):
+    return {'JoinToken': attendee['JoinToken'], 'PoolStatus': POOL_READY}
+
+
+def claim_attendee(table, event_id, meeting_passcode, join_method):
+    # The condition also checks the passcode, since only existing rows can have a READY attendee
+    try:
+        update = table.update_item(
+            Key=passcode_key(event_id, meeting_passcode),
+            UpdateExpression='SET PoolStatus = :c, JoinMethod = :j',
+            ConditionExpression='PoolStatus = :r',
+            ExpressionAttributeValues={':c': POOL_CLAIMED, ':j': join_method, ':r': POOL_READY},
+            ReturnValues='ALL_NEW')
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise error
+        return None
+    return update['Attributes']
+
+
+def return_attendee(table, event_id, meeting_passcode, attendee_id):
+    # A web attendee that left without being deleted can still join again with the same token.  PSTN
+    # attendees are deleted and released when the call hangs up.
+    return _conditional_update(
+        table, passcode_key(event_id, meeting_passcode),
+        UpdateExpression='SET PoolStatus = :r',
+        ConditionExpression='PoolStatus = :c AND AttendeeId = :a AND JoinMethod = :w',
+        ExpressionAttributeValues={':r': POOL_READY, ':c': POOL_CLAIMED, ':a': attendee_id, ':w': 'Web'})
+
+
+def release_attendee(table, event_id, meeting_passcode, attendee_id):
+    # Called once the attendee has been deleted, leaving the row for the refiller
+    _conditional_update(
+        table, passcode_key(event_id, meeting_passcode),
+        UpdateExpression='SET PoolStatus = :e REMOVE JoinToken',
+        ConditionExpression='AttendeeId = :a',
+        ExpressionAttributeValues={':e': POOL_EMPTY, ':a': attendee_id})
+
+
+def pooled_rows(table, event_id):
+    query_args = {
+        'KeyConditionExpression': 'EventId = :e',
+        'FilterExpression': 'attribute_exists(PoolStatus)',
+        'ExpressionAttributeValues': {':e': str(event_id)},
+        'ProjectionExpression': 'EventId, MeetingPasscode, PhoneNumber, MeetingId, AttendeeId, PoolStatus'
+    }
+    while True:
+        query_response = table.query(**query_args)
+        yield from query_response['Items']
+        if 'LastEvaluatedKey' not in query_response:
+            return
+        query_args['ExclusiveStartKey'] = query_response['LastEvaluatedKey']
+
+
+def ready_attendees(table, event_id, meeting_id):
+    # Attendees waiting in the pool exist in the meeting but have not joined it
+    return {row['AttendeeId'] for row in pooled_rows(table, event_id) if row['PoolStatus'] == POOL_READY and row.get('MeetingId') == meeting_id}
+
+
+def drain_pool(table, event_id, meeting_id):
+    # Tokens die with their meeting, so rows still holding one are emptied for the next meeting to refill
+    drained = 0
+    for row in pooled_rows(table, event_id):
+        if row['PoolStatus'] != POOL_EMPTY and row.get('MeetingId') == meeting_id:
+            release_attendee(table, event_id, row['MeetingPasscode'], row['AttendeeId'])
+            drained += 1
+    return drained
+
+
+def refill_pool(table, chime_sdk_meeting_client, event_id, meeting_id, low_water_mark=POOL_LOW_WATER_MARK):
+    # Returns the number of attendees created.  Nothing is created until the share of unclaimed rows
+    # holding a token falls below the low-water mark, so refills go out in a few large batches.
+    rows = list(pooled_rows(table, event_id))
+    ready = len([row for row in rows if row['PoolStatus'] == POOL_READY and row.get('MeetingId') == meeting_id])
+    empty = [row for row in rows if row['PoolStatus'] == POOL_EMPTY or (row['PoolStatus'] == POOL_READY and row.get('MeetingId') != meeting_id)]
+    if not empty or ready >= low_water_mark * (ready + len(empty)):
+        return 0
+    created = 0
+    for index in range(0, len(empty), BATCH_CREATE_ATTENDEE_LIMIT):
+        chunk = empty[index:index + BATCH_CREATE_ATTENDEE_LIMIT]
+        attendee_info = chime_sdk_meeting_client.batch_create_attendee(
+            MeetingId=meeting_id,
+            Attendees=[{'ExternalUserId': row['PhoneNumber']} for row in chunk]
+        )
+        attendees = {}
+        for attendee in attendee_info.get('Attendees', []):
+            attendees.setdefault(attendee['ExternalUserId'], []).append(attendee)
+        for row in chunk:
+            if not attendees.get(row['PhoneNumber']):
+                continue
+            attendee = attendees[row['PhoneNumber']].pop(0)
+            if _conditional_update(
+                    table, passcode_key(event_id, row['MeetingPasscode']),
+                    UpdateExpression='SET PoolStatus = :r, MeetingId = :m, AttendeeId = :a, JoinToken = :t',
+                    ConditionExpression='PoolStatus = :s AND AttendeeId = :o',
+                    ExpressionAttributeValues={
+                        ':r': POOL_READY, ':m': meeting_id, ':a': attendee['AttendeeId'], ':t': attendee['JoinToken'],
+                        ':s': row['PoolStatus'], ':o': row['AttendeeId']
+                    }):
+                created += 1
+            else:
+                # The row was joined while the batch was being created
+                chime_sdk_meeting_client.delete_attendee(MeetingId=meeting_id, AttendeeId=attendee['AttendeeId'])
+    return created
+
+
+def _conditional_update(table, key, **kwargs):
+    try:
+        table.update_item(Key=key, **kwargs)
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise error
+        return False
+    return True
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PASSCODE_CACHE_SIZE = int(os.environ.get('PASSCODE_CACHE_SIZE', '2048'))
+PASSCODE_CACHE_TTL = float(os.environ.get('PASSCODE_CACHE_TTL', '10'))
+PASSCODE_CACHE_NEGATIVE_TTL = float(os.environ.get('PASSCODE_CACHE_NEGATIVE_TTL', '5'))
+
+# The parts of a passcode row that are set when the roster is loaded and never change.  The join details
+# (MeetingId, AttendeeId, JoinToken, JoinMethod, PoolStatus) are rewritten by every join and teardown, in any
+# container, so they are not cached.
+PASSCODE_ATTRIBUTES = ('EventId', 'MeetingPasscode', 'PhoneNumber', 'MediaRegion', 'ControlRegion')
+
+# Marks a key that DynamoDB returned no item for
+MISSING = object()
+
+
+class ItemCache:
+    # Module level instances live for as long as the Lambda container stays warm.  Writes from other
+    # functions are not seen here, so only the attributes that do not change are kept, entries are only
+    # trusted for the TTL, and misses for the shorter negative TTL so that passcodes created by a new roster
+    # become valid within seconds.
+    def __init__(self, max_entries=PASSCODE_CACHE_SIZE, ttl=PASSCODE_CACHE_TTL, negative_ttl=PASSCODE_CACHE_NEGATIVE_TTL, attributes=PASSCODE_ATTRIBUTES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.attributes = attributes
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return tuple(sorted((name, str(value)) for name, value in key.items()))
+
+    def _lookup(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            expires, item = entry
+            if expires <= time.monotonic():
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            if item is MISSING:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def _store(self, cache_key, item):
+        if self.max_entries <= 0:
+            return
+        ttl = self.negative_ttl if item is MISSING else self.ttl
+        with self._lock:
+            self._entries[cache_key] = (time.monotonic() + ttl, item)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_item(self, table, Key):
+        cache_key = self._key(Key)
+        entry = self._lookup(cache_key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            item = table.get_item(Key=Key).get('Item', MISSING)
+            if item is not MISSING and self.attributes is not None:
+                item = {name: value for name, value in item.items() if name in self.attributes}
+            self._store(cache_key, item)
+        else:
+            item = entry[1]
+        if item is MISSING:
+            return {}
+        return {'Item': dict(item)}
+
+    def invalidate(self, Key):
+        with self._lock:
+            self._entries.pop(self._key(Key), None)
+
+    def invalidate_event(self, event_id):
+        event_key = ('EventId', str(event_id))
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self._entries if event_key in cache_key]:
+                del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+            }
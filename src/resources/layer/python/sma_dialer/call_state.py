@@ -0,0 +1,127 @@
+import enum
+
+# The SMA hands TransactionAttributes back on every invocation, and they are carried in every response.  The
+# call state is kept under a single key as one string, a header followed by the values in FIELDS order,
+# rather than one key per value.
+CALL_STATE_KEY = 'cs'
+CALL_STATE_VERSION = '1'
+SEPARATOR = '|'
+
+
+class CallPhase(enum.Enum):
+    NEW = 'N'
+    AWAITING_EVENT_ID = 'E'
+    AWAITING_PASSCODE = 'P'
+    DEFERRED = 'W'
+    DIALING = 'D'
+    AWAITING_CONSENT = 'C'
+    JOINING = 'J'
+    JOINED = 'M'
+    ENDED = 'X'
+
+
+PHASES = {phase.value: phase for phase in CallPhase}
+CALL_TYPES = {'inbound': 'i', 'outbound': 'o'}
+CALL_TYPE_NAMES = {code: name for name, code in CALL_TYPES.items()}
+
+# Fields are only ever appended, so a handler still running the previous layer ignores the ones it does not
+# know.  Anything else needs a new CALL_STATE_VERSION.
+FIELDS = (
+    'call_type', 'event_id', 'meeting_passcode', 'meeting_id', 'attendee_id', 'join_token', 'phone_number',
+    'media_region', 'control_region', 'stale_attendee_id', 'deferrals', 'deferred_digits',
+    'trace_id', 'trace_start', 'trace_answered', 'trace_handler_ms', 'redials',
+)
+# Set to '1' or absent, and packed into one hex digit of the header
+FLAGS = ('pooled', 'pending_update', 'pending_count', 'hangup_recorded')
+FIELD_INDEX = {name: index for index, name in enumerate(FIELDS)}
+KNOWN_KEYS = frozenset(FIELDS + FLAGS)
+
+
+class CallStateError(ValueError):
+    pass
+
+
+class CallState(dict):
+    # The decoded attributes of a call, read and written by the handler as before, and the phase the call
+    # is in, which decides the events it accepts next
+    def __init__(self, phase=CallPhase.NEW, *args, **kwargs):
+        super(CallState, self).__init__(*args, **kwargs)
+        self.phase = phase
+        # The phases the call could be in, latest first, of which there is more than one only for a call
+        # decoded from the previous handler's attributes
+        self.phases = (phase,)
+
+
+def encode(state):
+    flags = 0
+    values = [''] * len(FIELDS)
+    for name, value in state.items():
+        if name in FLAGS:
+            flags |= 1 << FLAGS.index(name)
+            continue
+        if name not in KNOWN_KEYS:
+            raise CallStateError('Unknown call state field: %s' % name)
+        if name == 'call_type':
+            value = CALL_TYPES.get(value, '')
+        elif SEPARATOR in value:
+            raise CallStateError('Call state field %s contains %r' % (name, SEPARATOR))
+        values[FIELD_INDEX[name]] = value
+    while values and not values[-1]:
+        values.pop()
+    return {CALL_STATE_KEY: '%s%s%x%s%s' % (CALL_STATE_VERSION, state.phase.value, flags, SEPARATOR if values else '', SEPARATOR.join(values))}
+
+
+def decode(transaction_attributes):
+    if not transaction_attributes:
+        return CallState()
+    encoded = transaction_attributes.get(CALL_STATE_KEY)
+    if encoded is None:
+        return from_attributes(transaction_attributes)
+    if encoded[:1] != CALL_STATE_VERSION or encoded[1:2] not in PHASES:
+        raise CallStateError('Unsupported call state: %s' % encoded[:3])
+    state = CallState(PHASES[encoded[1:2]])
+    for name, value in zip(FIELDS, encoded[4:].split(SEPARATOR)):
+        if value:
+            state[name] = value
+    if 'call_type' in state:
+        state['call_type'] = CALL_TYPE_NAMES.get(state['call_type'], state['call_type'])
+    flags = int(encoded[2:3], 16)
+    for index, name in enumerate(FLAGS):
+        if flags & 1 << index:
+            state[name] = '1'
+    return state
+
+
+def from_attributes(transaction_attributes):
+    # Calls that were already in progress when the handler was deployed still carry one key per value, so
+    # their phase is worked out from which keys are present
+    phases = attribute_phases(transaction_attributes)
+    state = CallState(phases[0])
+    state.phases = phases
+    state.update((name, value) for name, value in transaction_attributes.items() if name in KNOWN_KEYS)
+    return state
+
+
+def attribute_phases(transaction_attributes):
+    # A joined call carries the same keys as one still joining or waiting on the participant, so where the
+    # keys fit more than one phase they are all returned, latest first
+    call_type = transaction_attributes.get('call_type')
+    joining = any(name in transaction_attributes for name in ('pending_update', 'pending_count', 'pooled', 'deferrals'))
+    if 'deferred_digits' in transaction_attributes:
+        return (CallPhase.DEFERRED,)
+    if call_type == 'inbound':
+        if 'join_token' in transaction_attributes or 'meeting_passcode' in transaction_attributes:
+            return (CallPhase.JOINING,) if joining else (CallPhase.JOINED, CallPhase.JOINING)
+        return (CallPhase.AWAITING_PASSCODE,) if 'event_id' in transaction_attributes else (CallPhase.AWAITING_EVENT_ID,)
+    if call_type == 'outbound':
+        if joining:
+            return (CallPhase.JOINING,)
+        # The tracer marks a call on its first invocation and again when it is answered
+        if 'trace_answered' in transaction_attributes:
+            return (CallPhase.JOINED, CallPhase.AWAITING_CONSENT)
+        if 'trace_id' in transaction_attributes:
+            return (CallPhase.DIALING,)
+        return (CallPhase.JOINED, CallPhase.AWAITING_CONSENT, CallPhase.DIALING)
+    if 'join_token' in transaction_attributes:
+        return (CallPhase.JOINING,) if joining else (CallPhase.JOINED, CallPhase.JOINING)
+    return (CallPhase.NEW,)
@@ -0,0 +1,80 @@
+import time
+from botocore.exceptions import ClientError
+
+# Per-event row recording one createMeeting run over an S3 object, so retries and duplicate notifications
+# for the same object version resume or skip the work instead of starting again.
+RUN_RECORD_PREFIX = 'RUN#'
+RUN_RUNNING = 'RUNNING'
+RUN_COMPLETE = 'COMPLETE'
+RUN_TTL = 86400
+
+
+def get_run_id(record):
+    s3_object = record['s3']['object']
+    return '%s:%s' % (s3_object['key'], s3_object.get('versionId') or s3_object.get('eTag') or s3_object.get('sequencer'))
+
+
+def run_key(event_id, run_id):
+    return {'EventId': str(event_id), 'MeetingPasscode': RUN_RECORD_PREFIX + run_id}
+
+
+def claim_run(table, event_id, run_id, lease_seconds):
+    now = int(time.time())
+    try:
+        table.update_item(
+            Key=run_key(event_id, run_id),
+            UpdateExpression='SET RunStatus = :r, LeaseExpires = :l, #ttl = if_not_exists(#ttl, :t) ADD Attempts :one',
+            ConditionExpression='attribute_not_exists(RunStatus) OR (RunStatus = :r AND LeaseExpires < :n)',
+            ExpressionAttributeNames={'#ttl': 'TTL'},
+            ExpressionAttributeValues={
+                ':r': RUN_RUNNING,
+                ':l': now + int(lease_seconds),
+                ':n': now,
+                ':t': now + RUN_TTL,
+                ':one': 1
+            })
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise error
+        return False
+    return True
+
+
+def release_run(table, event_id, run_id):
+    try:
+        table.update_item(
+            Key=run_key(event_id, run_id),
+            UpdateExpression='SET LeaseExpires = :n',
+            ConditionExpression='RunStatus = :r',
+            ExpressionAttributeValues={':n': 0, ':r': RUN_RUNNING})
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise error
+
+
+def complete_run(table, event_id, run_id):
+    table.update_item(
+        Key=run_key(event_id, run_id),
+        UpdateExpression='SET RunStatus = :c REMOVE LeaseExpires',
+        ExpressionAttributeValues={':c': RUN_COMPLETE})
+
+
+def load_event_rows(table, event_id, run_id=None):
+    # Returns every passcode in use for the event and the rows already written by this run, by ParticipantKey
+    used = set()
+    checkpoints = {}
+    query_args = {
+        'KeyConditionExpression': 'EventId = :e',
+        'ExpressionAttributeValues': {':e': str(event_id)},
+        'ProjectionExpression': 'MeetingPasscode, RunId, ParticipantKey, MeetingId, AttendeeId, EmailStatus, EmailMessageId, CallStatus'
+    }
+    while True:
+        query_response = table.query(**query_args)
+        for item in query_response['Items']:
+            used.add(item['MeetingPasscode'])
+            if run_id is not None and item.get('RunId') == run_id and 'ParticipantKey' in item:
+                checkpoints[item['ParticipantKey']] = item
+        if 'LastEvaluatedKey' not in query_response:
+            break
+        query_args['ExclusiveStartKey'] = query_response['LastEvaluatedKey']
+    return used, checkpoints
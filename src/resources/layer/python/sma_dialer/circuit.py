@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', '30'))
+
+CLOSED = 'CLOSED'
+OPEN = 'OPEN'
+HALF_OPEN = 'HALF_OPEN'
+
+# Error codes that say the dependency is overloaded or unwell, rather than that the request was wrong
+THROTTLING_ERRORS = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'ThrottledClientException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'ProvisionedThroughputExceededException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'SlowDown',
+])
+UNAVAILABLE_ERRORS = frozenset([
+    'ServiceUnavailable',
+    'ServiceUnavailableException',
+    'ServiceFailureException',
+    'ResourceLimitExceededException',
+    'InternalFailure',
+    'InternalServerError',
+    'InternalServerException',
+])
+
+# Attributes of a client that are not API operations and are passed through unguarded
+UNGUARDED_ATTRIBUTES = frozenset(['exceptions', 'meta', 'can_paginate', 'get_paginator', 'get_waiter', 'close'])
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_after):
+        super(CircuitOpenError, self).__init__('%s is unavailable, retry after %.1f seconds' % (name, retry_after))
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_dependency_failure(error):
+    if isinstance(error, CircuitOpenError):
+        return True
+    # Imported here so that loading the layer does not import botocore before the first client is made
+    from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+    if isinstance(error, ClientError):
+        code = error.response.get('Error', {}).get('Code')
+        status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return code in THROTTLING_ERRORS or code in UNAVAILABLE_ERRORS or status >= 500
+    return isinstance(error, (ConnectionError, HTTPClientError))
+
+
+class CircuitBreaker:
+    # Opens after a run of consecutive dependency failures, the kind that are left once botocore has used
+    # up its own retries, and fails calls straight away until the reset timeout has passed.  Then a single
+    # trial call is let through and its result closes the circuit again or restarts the timeout.
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_after = self.opened + self.reset_timeout - self.clock()
+            if self.state == OPEN and retry_after <= 0:
+                self.state = HALF_OPEN
+                return
+            self.rejected += 1
+        raise CircuitOpenError(self.name, max(0.0, retry_after))
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened = self.clock()
+
+    def call(self, operation, *args, **kwargs):
+        self.before_call()
+        try:
+            result = operation(*args, **kwargs)
+        except Exception as error:
+            if is_dependency_failure(error):
+                self.record_failure()
+            else:
+                # The dependency answered, so a half-open trial has succeeded
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+
+def get_breaker(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breakers():
+    return list(_breakers.values())
+
+
+def guard(name, attribute, breaker):
+    if name.startswith('_') or name in UNGUARDED_ATTRIBUTES or not callable(attribute):
+        return attribute
+
+    def operation(*args, **kwargs):
+        return breaker.call(attribute, *args, **kwargs)
+    return operation
+
+
+class GuardedClient:
+    # Puts every API call on a client, or anything shaped like one, behind a circuit breaker
+    def __init__(self, client, breaker):
+        self.client = client
+        self.breaker = breaker
+
+    def __getattr__(self, name):
+        return guard(name, getattr(self.client, name), self.breaker)
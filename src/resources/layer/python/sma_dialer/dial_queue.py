@@ -0,0 +1,107 @@
+import json
+import time
+from collections import deque
+from itertools import count
+from sma_dialer.attendee_index import RECORD_TTL, meeting_key
+from sma_dialer.runtime import LazyClient
+
+SEND_BATCH_LIMIT = 10
+PROGRESS_ATTRIBUTES = {
+    'queued': 'DialsQueued',
+    'placed': 'DialsPlaced',
+    'failed': 'DialsFailed',
+    'redialed': 'DialsRedialed',
+    # Call outcomes reported by smaHandler, which sma_dialer.pacing reads back
+    'accepted': 'DialsAccepted',
+    'declined': 'DialsDeclined',
+    'abandoned': 'DialsAbandoned',
+    'unanswered': 'DialsUnanswered',
+    'ended': 'DialsEnded',
+}
+
+
+class SqsDialQueue:
+    def __init__(self, queue_url, client=None):
+        self.queue_url = queue_url
+        self.client = client or LazyClient('sqs')
+
+    def send(self, jobs, delay_seconds=0):
+        # Returns the positions of the jobs that could not be queued
+        failed = []
+        for start in range(0, len(jobs), SEND_BATCH_LIMIT):
+            entries = [{
+                'Id': str(start + offset),
+                'MessageBody': json.dumps(job, separators=(',', ':')),
+                'DelaySeconds': delay_seconds
+            } for offset, job in enumerate(jobs[start:start + SEND_BATCH_LIMIT])]
+            send_response = self.client.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            failed.extend(int(entry['Id']) for entry in send_response.get('Failed', []))
+        return failed
+
+
+class InMemoryDialQueue:
+    # Local stand-in for the SQS queue, its redrive policy and the Lambda event source mapping
+    def __init__(self, max_receives=5):
+        self.max_receives = max_receives
+        self.messages = deque()
+        self.delayed = []
+        self.dead_letters = []
+        self._message_ids = count()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def send(self, jobs, delay_seconds=0):
+        # Delayed jobs are held back until release_delayed, as there is no clock to wait on
+        for job in jobs:
+            (self.delayed if delay_seconds else self.messages).append({
+                'messageId': str(next(self._message_ids)),
+                'body': json.dumps(job, separators=(',', ':')),
+                'attributes': {'ApproximateReceiveCount': '0'}
+            })
+        return []
+
+    def release_delayed(self):
+        self.messages.extend(self.delayed)
+        released = len(self.delayed)
+        self.delayed = []
+        return released
+
+    def receive(self, batch_size=10):
+        records = []
+        while self.messages and len(records) < batch_size:
+            record = self.messages.popleft()
+            record['attributes']['ApproximateReceiveCount'] = str(int(record['attributes']['ApproximateReceiveCount']) + 1)
+            records.append(record)
+        return {'Records': records}
+
+    def complete(self, event, handler_response):
+        failed = {failure['itemIdentifier'] for failure in (handler_response or {}).get('batchItemFailures', [])}
+        for record in event['Records']:
+            if record['messageId'] not in failed:
+                continue
+            if int(record['attributes']['ApproximateReceiveCount']) >= self.max_receives:
+                self.dead_letters.append(record)
+            else:
+                self.messages.append(record)
+
+    def drain(self, handler, batch_size=10, context=None):
+        invocations = 0
+        while self.messages:
+            event = self.receive(batch_size)
+            self.complete(event, handler(event, context))
+            invocations += 1
+        return invocations
+
+
+def record_dial_progress(table, event_id, **counts):
+    counts = {PROGRESS_ATTRIBUTES[name]: value for name, value in counts.items() if value}
+    if not counts:
+        return
+    values = {':' + attribute: value for attribute, value in counts.items()}
+    values[':t'] = int(time.time() + RECORD_TTL)
+    table.update_item(
+        Key=meeting_key(event_id),
+        UpdateExpression='SET #ttl = if_not_exists(#ttl, :t) ADD ' + ', '.join('%s :%s' % (attribute, attribute) for attribute in counts),
+        ExpressionAttributeNames={'#ttl': 'TTL'},
+        ExpressionAttributeValues=values)
@@ -0,0 +1,48 @@
+import os
+import json
+import logging
+import random
+import zlib
+from sma_dialer.runtime import DecimalEncoder
+
+REDACTED = '***'
+REDACTED_KEYS = frozenset([
+    'join_token', 'JoinToken', 'meeting_passcode', 'MeetingPasscode', 'passcode', 'ReceivedDigits', 'deferred_digits',
+    # The roster feed's $connect carries a Cognito access token in its query string
+    'token', 'Authorization', 'authorization'
+])
+DEBUG_SAMPLE_RATE = float(os.environ.get('DEBUG_SAMPLE_RATE', '1'))
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {key: REDACTED if key in REDACTED_KEYS else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class LazyJson:
+    # Only serialized when a handler formats the record, so disabled levels never pay for json.dumps
+    __slots__ = ('payload',)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        return json.dumps(redact(self.payload), cls=DecimalEncoder, separators=(',', ':'), default=str)
+
+
+def sampled(key=None):
+    if DEBUG_SAMPLE_RATE >= 1:
+        return True
+    if DEBUG_SAMPLE_RATE <= 0:
+        return False
+    if key is None:
+        return random.random() < DEBUG_SAMPLE_RATE
+    return zlib.crc32(key.encode('utf-8')) % 10000 < DEBUG_SAMPLE_RATE * 10000
+
+
+def log_payload(logger, message, prefix, payload, key=None):
+    if logger.isEnabledFor(logging.DEBUG) and sampled(key):
+        logger.debug(message, prefix, LazyJson(payload))
@@ -0,0 +1,57 @@
+import os
+
+# A manifest is a JSON object with an Events list, each entry an EventId and its Participants, so a whole
+# schedule can be uploaded at once.  Reports are written back to the same bucket under REPORT_PREFIX, and
+# createMeeting ignores the notifications for them.
+REPORT_PREFIX = 'reports/'
+MANIFEST_CONCURRENCY = int(os.environ.get('MANIFEST_CONCURRENCY', '4'))
+MANIFEST_EVENTS_PER_INVOCATION = int(os.environ.get('MANIFEST_EVENTS_PER_INVOCATION', '10'))
+MANIFEST_PARTICIPANTS_PER_INVOCATION = int(os.environ.get('MANIFEST_PARTICIPANTS_PER_INVOCATION', '1000'))
+
+EVENT_COMPLETE = 'COMPLETE'
+EVENT_SKIPPED = 'SKIPPED'
+EVENT_FAILED = 'FAILED'
+# Not retried, since the manifest itself has to be fixed
+EVENT_INVALID = 'INVALID'
+MANIFEST_COMPLETE = 'COMPLETE'
+MANIFEST_FAILED = 'FAILED'
+MANIFEST_SPLIT = 'SPLIT'
+
+
+def is_manifest(request_info):
+    return isinstance(request_info, dict) and isinstance(request_info.get('Events'), list)
+
+
+def is_report(key):
+    return key.startswith(REPORT_PREFIX)
+
+
+def report_key(key, part=None):
+    if part is None:
+        return '%s%s.report.json' % (REPORT_PREFIX, key)
+    return '%s%s.part-%d.report.json' % (REPORT_PREFIX, key, part)
+
+
+def split_manifest(events, max_events=MANIFEST_EVENTS_PER_INVOCATION, max_participants=MANIFEST_PARTICIPANTS_PER_INVOCATION):
+    # Packs events into parts in manifest order.  An event larger than the participant limit gets a part of
+    # its own, since one event is never split across invocations.
+    parts = []
+    part = []
+    participants = 0
+    for event in events:
+        size = len(event.get('Participants') or [])
+        if part and (len(part) >= max_events or participants + size > max_participants):
+            parts.append(part)
+            part = []
+            participants = 0
+        part.append(event)
+        participants += size
+    if part:
+        parts.append(part)
+    return parts
+
+
+def manifest_status(event_reports):
+    if any(event_report['Status'] == EVENT_FAILED for event_report in event_reports):
+        return MANIFEST_FAILED
+    return MANIFEST_COMPLETE
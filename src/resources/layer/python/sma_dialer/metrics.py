@@ -0,0 +1,71 @@
+import os
+import json
+import threading
+import time
+from collections import defaultdict
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'SMADialer')
+SERVICE_NAME = 'SMADialer'
+
+# Embedded Metric Format accepts at most 100 values for one metric in a document
+MAX_VALUES = 100
+
+
+class MeetingMetrics:
+    # Events are rolled up per meeting in memory and each meeting is written as one Embedded Metric Format
+    # document per flush.  CloudWatch extracts the metrics from those few log lines, and MeetingId is kept
+    # as a property rather than a dimension so busy days do not create a metric per meeting.  Handlers flush
+    # at the end of every invocation, as a frozen or recycled container would lose anything still held.
+    def __init__(self, units, namespace=METRICS_NAMESPACE, emit=print, clock=time.time):
+        self.units = units
+        self.namespace = namespace
+        self.emit = emit
+        self.clock = clock
+        self._counts = defaultdict(lambda: defaultdict(float))
+        self._values = defaultdict(lambda: defaultdict(list))
+        self._lock = threading.Lock()
+
+    def count(self, meeting_id, name, value=1):
+        with self._lock:
+            self._counts[meeting_id][name] += value
+
+    def observe(self, meeting_id, name, value):
+        with self._lock:
+            values = self._values[meeting_id][name]
+            values.append(value)
+            full = len(values) >= MAX_VALUES
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(lambda: defaultdict(float))
+            values, self._values = self._values, defaultdict(lambda: defaultdict(list))
+        timestamp = int(self.clock() * 1000)
+        documents = 0
+        for meeting_id in set(counts) | set(values):
+            metrics = dict(counts.get(meeting_id, {}))
+            metrics.update(values.get(meeting_id, {}))
+            if not metrics:
+                continue
+            self.emit(json.dumps(self.document(timestamp, meeting_id, metrics), separators=(',', ':')))
+            documents += 1
+        return documents
+
+    def document(self, timestamp, meeting_id, metrics):
+        document = {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [['Service']],
+                    'Metrics': [{'Name': name, 'Unit': self.units.get(name, 'None')} for name in sorted(metrics)]
+                }]
+            },
+            'Service': SERVICE_NAME
+        }
+        if meeting_id is not None:
+            document['MeetingId'] = meeting_id
+        for name, value in metrics.items():
+            document[name] = int(value) if isinstance(value, float) and value.is_integer() else value
+        return document
@@ -0,0 +1,159 @@
+import math
+import os
+import time
+from collections import defaultdict, deque
+from sma_dialer.attendee_index import RECORD_TTL, meeting_key
+from sma_dialer.dial_queue import PROGRESS_ATTRIBUTES
+
+# Calls the SIP media application may have up at once across every event, ringing or connected
+MAX_ACTIVE_CALLS = int(os.environ.get('MAX_ACTIVE_CALLS', '20'))
+PACING_WINDOW = float(os.environ.get('PACING_WINDOW', '300'))
+# A held job is sent back after PACING_DELAY seconds, doubling each time it is held again up to PACING_MAX_DELAY
+PACING_DELAY = int(os.environ.get('PACING_DELAY', '15'))
+PACING_MAX_DELAY = int(os.environ.get('PACING_MAX_DELAY', '60'))
+MIN_ANSWER_RATE = 0.1
+# Until an event has outcomes of its own, its answer rate is taken as though PRIOR_ATTEMPTS calls had been
+# answered at PRIOR_ANSWER_RATE, so the first few no-answers do not open the floodgates
+PRIOR_ANSWER_RATE = 0.5
+PRIOR_ATTEMPTS = 4
+
+REDIAL_LIMIT = int(os.environ.get('REDIAL_LIMIT', '2'))
+REDIAL_BACKOFF = int(os.environ.get('REDIAL_BACKOFF', '120'))
+# The longest an SQS message can be delayed
+MAX_DELAY_SECONDS = 900
+
+# Counts the calls that are up across every event.  The dialer adds each call it places and smaHandler takes
+# it off at the first HANGUP.  The TTL is refreshed on every change, so a count that has drifted because a
+# HANGUP was lost is dropped once the dialer has been idle for a day.
+ACTIVE_CALLS_KEY = {'EventId': 'DIALER', 'MeetingPasscode': 'ACTIVE_CALLS'}
+
+ANSWERED_OUTCOMES = ('accepted', 'declined', 'abandoned')
+OUTCOMES = ANSWERED_OUTCOMES + ('unanswered',)
+COUNTS = OUTCOMES + ('placed', 'ended', 'queued', 'redialed', 'failed')
+
+
+def outcome_counts(item):
+    return {name: int(item.get(PROGRESS_ATTRIBUTES[name], 0)) for name in COUNTS}
+
+
+def read_pacing(table, event_ids):
+    active_calls = table.get_item(Key=ACTIVE_CALLS_KEY).get('Item', {}).get('ActiveCalls', 0)
+    events = {event_id: outcome_counts(table.get_item(Key=meeting_key(event_id)).get('Item') or {}) for event_id in event_ids}
+    return int(active_calls), events
+
+
+def record_active_calls(table, delta):
+    update = table.update_item(
+        Key=ACTIVE_CALLS_KEY,
+        UpdateExpression='SET #ttl = :t ADD ActiveCalls :d',
+        ExpressionAttributeNames={'#ttl': 'TTL'},
+        ExpressionAttributeValues={':d': delta, ':t': int(time.time() + RECORD_TTL)},
+        ReturnValues='UPDATED_NEW')
+    return int(update['Attributes']['ActiveCalls'])
+
+
+def redial_delay(redials):
+    return min(MAX_DELAY_SECONDS, REDIAL_BACKOFF * 2 ** redials)
+
+
+def hold_delay(holds):
+    return min(PACING_MAX_DELAY, MAX_DELAY_SECONDS, PACING_DELAY * 2 ** holds)
+
+
+class OutcomeWindow:
+    # Rolling rates for one event, worked out from snapshots of the cumulative counters on its MEETING row
+    # so the counters never need resetting.  The newest snapshot older than the window is the baseline.
+    def __init__(self, window=PACING_WINDOW, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.snapshots = deque()
+
+    @property
+    def updated(self):
+        return self.snapshots[-1][0] if self.snapshots else 0
+
+    @property
+    def latest(self):
+        return self.snapshots[-1][1] if self.snapshots else dict.fromkeys(COUNTS, 0)
+
+    def observe(self, counts):
+        now = self.clock()
+        self.snapshots.append((now, counts))
+        while len(self.snapshots) > 2 and self.snapshots[1][0] <= now - self.window:
+            self.snapshots.popleft()
+
+    def rates(self):
+        latest = self.latest
+        # Until a snapshot has aged past the window, every outcome so far falls inside it
+        base = self.snapshots[0][1] if self.snapshots and self.snapshots[0][0] <= self.clock() - self.window else {}
+        delta = {name: latest[name] - base.get(name, 0) for name in OUTCOMES}
+        answered = sum(delta[name] for name in ANSWERED_OUTCOMES)
+        attempts = answered + delta['unanswered']
+        return {
+            'attempts': attempts,
+            'answer_rate': (answered + PRIOR_ANSWER_RATE * PRIOR_ATTEMPTS) / (attempts + PRIOR_ATTEMPTS),
+            'accept_rate': delta['accepted'] / answered if answered else 0.0,
+            'decline_rate': delta['declined'] / answered if answered else 0.0,
+        }
+
+
+class Pacer:
+    # Decides whether a call may be placed now.  Every event together is held to the free trunks, and each
+    # event to as many calls as its remaining jobs could need at its answer rate.  The dialers running at once
+    # each take an equal share, as they do of the call rate: the share of the trunks is rounded down so the
+    # limit holds, the share of an event's calls rounded up so no event stalls.
+    def __init__(self, max_active_calls=MAX_ACTIVE_CALLS, shares=1, window=PACING_WINDOW, clock=time.monotonic):
+        self.max_active_calls = max_active_calls
+        self.shares = shares
+        self.window = window
+        self.clock = clock
+        self.windows = {}
+        self.active_calls = 0
+        # Calls placed since the counters were last read
+        self.reserved = defaultdict(int)
+        # Jobs in the batch being dialed, which the counters may not show yet
+        self.waiting = {}
+
+    def observe(self, active_calls, events, waiting=None):
+        self.active_calls = max(0, active_calls)
+        self.reserved.clear()
+        self.waiting = dict(waiting or {})
+        for event_id, counts in events.items():
+            if event_id not in self.windows:
+                self.windows[event_id] = OutcomeWindow(self.window, self.clock)
+            self.windows[event_id].observe(counts)
+        cutoff = self.clock() - self.window
+        for event_id in [event_id for event_id, window in self.windows.items() if window.updated < cutoff]:
+            del self.windows[event_id]
+
+    def outcomes(self, event_id):
+        return self.windows.get(event_id) or OutcomeWindow(self.window, self.clock)
+
+    def remaining(self, event_id):
+        # Jobs queued for the event, redials included, that have not been placed or given up on yet.  The
+        # counters can lag the queue, so the jobs in hand are a lower bound.
+        counts = self.outcomes(event_id).latest
+        return max(counts['queued'] + counts['redialed'] - counts['placed'] - counts['failed'], self.waiting.get(event_id, 0))
+
+    def event_limit(self, event_id):
+        # Until the event's queued jobs are on its counters there is nothing to size the limit from, so the
+        # event may use every trunk
+        remaining = self.remaining(event_id)
+        if remaining <= 0:
+            return self.max_active_calls
+        answer_rate = max(self.outcomes(event_id).rates()['answer_rate'], MIN_ANSWER_RATE)
+        return max(1, min(self.max_active_calls, math.ceil(remaining / answer_rate)))
+
+    def allowance(self, event_id):
+        trunks = (self.max_active_calls - self.active_calls) // self.shares - sum(self.reserved.values())
+        calls = math.ceil(self.event_limit(event_id) / self.shares) - self.reserved[event_id]
+        return max(0, min(trunks, calls))
+
+    def acquire(self, event_id):
+        if self.allowance(event_id) <= 0:
+            return False
+        self.reserved[event_id] += 1
+        return True
+
+    def release(self, event_id):
+        self.reserved[event_id] -= 1
@@ -0,0 +1,153 @@
+import os
+import time
+from collections import Counter
+from sma_dialer.attendee_index import RECORD_TTL, meeting_key
+from sma_dialer.runtime import LazyClient
+
+DEFAULT_MEDIA_REGION = os.environ.get('MEDIA_REGION', 'us-east-1')
+
+# Meetings can be hosted in any media region, but are created and managed through the nearest of the few
+# control regions.  Every later call for a meeting has to use the control region it was created in.
+CONTROL_REGIONS = {
+    'us-east-1': 'us-east-1',
+    'us-east-2': 'us-east-1',
+    'ca-central-1': 'us-east-1',
+    'sa-east-1': 'us-east-1',
+    'us-west-1': 'us-west-2',
+    'us-west-2': 'us-west-2',
+    'eu-central-1': 'eu-central-1',
+    'eu-north-1': 'eu-central-1',
+    'eu-south-1': 'eu-central-1',
+    'eu-west-1': 'eu-central-1',
+    'eu-west-2': 'eu-central-1',
+    'eu-west-3': 'eu-central-1',
+    'af-south-1': 'eu-central-1',
+    'il-central-1': 'eu-central-1',
+    'ap-northeast-1': 'ap-southeast-1',
+    'ap-northeast-2': 'ap-southeast-1',
+    'ap-south-1': 'ap-southeast-1',
+    'ap-southeast-1': 'ap-southeast-1',
+    'ap-southeast-2': 'ap-southeast-1',
+}
+
+# E.164 country calling codes, matched on the longest prefix.  Numbers that match nothing do not count
+# towards the choice, so one unlisted country cannot move a meeting away from everyone else.
+CALLING_CODE_REGIONS = {
+    '1': 'us-east-1',
+    '52': 'us-west-1',
+    '51': 'sa-east-1',
+    '54': 'sa-east-1',
+    '55': 'sa-east-1',
+    '56': 'sa-east-1',
+    '57': 'sa-east-1',
+    '58': 'sa-east-1',
+    '593': 'sa-east-1',
+    '598': 'sa-east-1',
+    '44': 'eu-west-2',
+    '353': 'eu-west-1',
+    '33': 'eu-west-3',
+    '32': 'eu-west-3',
+    '352': 'eu-west-3',
+    '49': 'eu-central-1',
+    '31': 'eu-central-1',
+    '41': 'eu-central-1',
+    '43': 'eu-central-1',
+    '48': 'eu-central-1',
+    '420': 'eu-central-1',
+    '36': 'eu-central-1',
+    '45': 'eu-north-1',
+    '46': 'eu-north-1',
+    '47': 'eu-north-1',
+    '358': 'eu-north-1',
+    '372': 'eu-north-1',
+    '371': 'eu-north-1',
+    '370': 'eu-north-1',
+    '39': 'eu-south-1',
+    '34': 'eu-south-1',
+    '351': 'eu-south-1',
+    '30': 'eu-south-1',
+    '356': 'eu-south-1',
+    '27': 'af-south-1',
+    '234': 'af-south-1',
+    '254': 'af-south-1',
+    '972': 'il-central-1',
+    '91': 'ap-south-1',
+    '92': 'ap-south-1',
+    '94': 'ap-south-1',
+    '880': 'ap-south-1',
+    '971': 'ap-south-1',
+    '966': 'ap-south-1',
+    '81': 'ap-northeast-1',
+    '82': 'ap-northeast-2',
+    '65': 'ap-southeast-1',
+    '60': 'ap-southeast-1',
+    '62': 'ap-southeast-1',
+    '63': 'ap-southeast-1',
+    '66': 'ap-southeast-1',
+    '84': 'ap-southeast-1',
+    '852': 'ap-southeast-1',
+    '886': 'ap-southeast-1',
+    '61': 'ap-southeast-2',
+    '64': 'ap-southeast-2',
+}
+CALLING_CODE_LENGTH = max(len(calling_code) for calling_code in CALLING_CODE_REGIONS)
+
+
+class RegionalClients:
+    # One client per region, created on first use and kept for as long as the container stays warm.
+    # A region of None is the function's own region, which is where meetings were created before regions were stored.
+    def __init__(self, service_name):
+        self.service_name = service_name
+        self._clients = {}
+
+    def get(self, region_name=None):
+        client = self._clients.get(region_name)
+        if client is None:
+            client = self._clients.setdefault(region_name, LazyClient(self.service_name, region_name=region_name))
+        return client
+
+
+def media_region_for_number(phone_number):
+    digits = str(phone_number).lstrip('+')
+    for length in range(min(CALLING_CODE_LENGTH, len(digits)), 0, -1):
+        media_region = CALLING_CODE_REGIONS.get(digits[:length])
+        if media_region:
+            return media_region
+    return None
+
+
+def select_media_region(phone_numbers):
+    # The region most of the participants are dialling from, ties going to the first one seen
+    media_regions = Counter(media_region_for_number(phone_number) for phone_number in phone_numbers)
+    media_regions.pop(None, None)
+    if not media_regions:
+        return DEFAULT_MEDIA_REGION
+    return media_regions.most_common(1)[0][0]
+
+
+def control_region_for(media_region):
+    return CONTROL_REGIONS.get(media_region)
+
+
+def region_attributes(item):
+    # Rows written before regions were stored keep using the default media region and the function's own region
+    return item.get('MediaRegion') or DEFAULT_MEDIA_REGION, item.get('ControlRegion') or None
+
+
+def event_regions(table, event_id, phone_numbers):
+    # The first roster for an event picks its regions, and every later roster or participant for the event
+    # gets the same ones back, since the meeting is shared and its ClientRequestToken is the event id
+    media_region = select_media_region(phone_numbers)
+    update = table.update_item(
+        Key=meeting_key(event_id),
+        UpdateExpression='SET MediaRegion = if_not_exists(MediaRegion, :m), ControlRegion = if_not_exists(ControlRegion, :c), '
+                         '#ttl = if_not_exists(#ttl, :t)',
+        ExpressionAttributeNames={'#ttl': 'TTL'},
+        ExpressionAttributeValues={
+            ':m': media_region,
+            ':c': control_region_for(media_region) or '',
+            ':t': int(time.time() + RECORD_TTL)
+        },
+        ReturnValues='ALL_NEW')
+    return update['Attributes']['MediaRegion'], update['Attributes']['ControlRegion'] or None
+
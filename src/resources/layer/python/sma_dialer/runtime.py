@@ -0,0 +1,191 @@
+import os
+import decimal
+import json
+import logging
+import threading
+from sma_dialer.circuit import get_breaker, guard
+
+LOG_LEVELS = ['INFO', 'DEBUG', 'WARN', 'ERROR']
+MAX_POOL_CONNECTIONS = int(os.environ.get('MAX_POOL_CONNECTIONS', '25'))
+
+# Retries and timeouts by service.  Calls on the SMA path give up in seconds so a struggling dependency
+# trips its circuit breaker instead of holding the call and the Lambda for the whole timeout.
+CLIENT_SETTINGS = {
+    'chime-sdk-meetings': {'max_attempts': 3, 'connect_timeout': 2, 'read_timeout': 5},
+    'chime-sdk-voice': {'max_attempts': 3, 'connect_timeout': 2, 'read_timeout': 5},
+    'dynamodb': {'max_attempts': 4, 'connect_timeout': 1, 'read_timeout': 3},
+    'ses': {'max_attempts': 3, 'connect_timeout': 2, 'read_timeout': 10},
+    'sqs': {'max_attempts': 3, 'connect_timeout': 2, 'read_timeout': 10},
+}
+DEFAULT_CLIENT_SETTINGS = {'max_attempts': 3, 'connect_timeout': 5, 'read_timeout': 30}
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_logger():
+    logger = logging.getLogger()
+    log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    if log_level not in LOG_LEVELS:
+        log_level = 'INFO'
+    logger.setLevel(log_level)
+    return logger
+
+
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return int(obj)
+        return super(DecimalEncoder, self).default(obj)
+
+
+def get_client(service_name, region_name=None, endpoint_url=None):
+    key = (service_name, region_name, endpoint_url)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _get_session().create_client(
+                    service_name, region_name=region_name, endpoint_url=endpoint_url, config=client_config(service_name))
+                _clients[key] = client
+    return client
+
+
+def client_config(service_name):
+    # Adaptive retries add client-side rate limiting that backs off when the service throttles, and is
+    # shared by every caller in the container since clients are cached.  Keep-alive and a pool sized for
+    # the handlers' thread pools let concurrent calls reuse warm connections.
+    from botocore.config import Config
+    settings = CLIENT_SETTINGS.get(service_name, DEFAULT_CLIENT_SETTINGS)
+    return Config(
+        retries={'mode': 'adaptive', 'total_max_attempts': settings['max_attempts']},
+        connect_timeout=settings['connect_timeout'],
+        read_timeout=settings['read_timeout'],
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True)
+
+
+def _get_session():
+    # botocore is only imported once the first client is needed, and boto3 is never imported
+    global _session
+    if _session is None:
+        import botocore.session
+        _session = botocore.session.get_session()
+    return _session
+
+
+class LazyClient:
+    # API calls go through a circuit breaker per service and region, shared by the container
+    def __init__(self, service_name, region_name=None, endpoint_url=None):
+        self.service_name = service_name
+        self.region_name = region_name
+        self.endpoint_url = endpoint_url
+        self.breaker = get_breaker('%s:%s' % (service_name, region_name or 'default'))
+
+    def __getattr__(self, name):
+        return guard(name, getattr(get_client(self.service_name, self.region_name, self.endpoint_url), name), self.breaker)
+
+
+def serialize(value):
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, dict):
+        return {'M': {key: serialize(item) for key, item in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [serialize(item) for item in value]}
+    if isinstance(value, (set, frozenset)) and all(isinstance(item, str) for item in value):
+        return {'SS': list(value)}
+    raise TypeError('Unsupported DynamoDB type: %s' % type(value))
+
+
+def deserialize(attribute):
+    (attribute_type, value), = attribute.items()
+    if attribute_type == 'S':
+        return value
+    if attribute_type == 'N':
+        return decimal.Decimal(value)
+    if attribute_type == 'BOOL':
+        return value
+    if attribute_type == 'NULL':
+        return None
+    if attribute_type == 'M':
+        return {key: deserialize(item) for key, item in value.items()}
+    if attribute_type == 'L':
+        return [deserialize(item) for item in value]
+    if attribute_type == 'SS':
+        return set(value)
+    if attribute_type == 'NS':
+        return set(decimal.Decimal(item) for item in value)
+    return value
+
+
+def serialize_item(item):
+    return {key: serialize(value) for key, value in item.items()}
+
+
+def deserialize_item(item):
+    return {key: deserialize(value) for key, value in item.items()}
+
+
+class Table:
+    # Mirrors the parts of the boto3 Table resource used by the handlers on top of the low-level client
+    def __init__(self, table_name, client=None):
+        self.table_name = table_name
+        self.client = client or LazyClient('dynamodb')
+
+    def _request(self, kwargs):
+        request = dict(kwargs, TableName=self.table_name)
+        for name in ['Key', 'Item', 'ExpressionAttributeValues', 'ExclusiveStartKey']:
+            if name in request:
+                request[name] = serialize_item(request[name])
+        return request
+
+    def _response(self, response):
+        for name in ['Item', 'Attributes', 'LastEvaluatedKey']:
+            if name in response:
+                response[name] = deserialize_item(response[name])
+        if 'Items' in response:
+            response['Items'] = [deserialize_item(item) for item in response['Items']]
+        return response
+
+    def get_item(self, **kwargs):
+        return self._response(self.client.get_item(**self._request(kwargs)))
+
+    def put_item(self, **kwargs):
+        return self._response(self.client.put_item(**self._request(kwargs)))
+
+    def update_item(self, **kwargs):
+        return self._response(self.client.update_item(**self._request(kwargs)))
+
+    def delete_item(self, **kwargs):
+        return self._response(self.client.delete_item(**self._request(kwargs)))
+
+    def query(self, **kwargs):
+        return self._response(self.client.query(**self._request(kwargs)))
+
+    def scan(self, **kwargs):
+        return self._response(self.client.scan(**self._request(kwargs)))
+
+    def batch_write(self, requests):
+        request_items = []
+        for request in requests:
+            if 'PutRequest' in request:
+                request_items.append({'PutRequest': {'Item': serialize_item(request['PutRequest']['Item'])}})
+            else:
+                request_items.append({'DeleteRequest': {'Key': serialize_item(request['DeleteRequest']['Key'])}})
+        response = self.client.batch_write_item(RequestItems={self.table_name: request_items})
+        unprocessed = []
+        for request in response.get('UnprocessedItems', {}).get(self.table_name, []):
+            if 'PutRequest' in request:
+                unprocessed.append({'PutRequest': {'Item': deserialize_item(request['PutRequest']['Item'])}})
+            else:
+                unprocessed.append({'DeleteRequest': {'Key': deserialize_item(request['DeleteRequest']['Key'])}})
+        return unprocessed
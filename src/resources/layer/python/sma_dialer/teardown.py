@@ -0,0 +1,130 @@
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from sma_dialer.attendee_index import MEETING_RECORD, clear_meeting
+from sma_dialer.checkpoint import RUN_RECORD_PREFIX
+from sma_dialer.regions import region_attributes
+
+MAX_CONCURRENCY = int(os.environ.get('MAX_CONCURRENCY', '10'))
+MEETING_IDLE_TIMEOUT = int(os.environ.get('MEETING_IDLE_TIMEOUT', '1800'))
+BATCH_WRITE_LIMIT = 25
+BATCH_WRITE_RETRIES = 5
+
+SWEEP_EXPIRED = 'EXPIRED'
+SWEEP_IDLE = 'IDLE'
+
+
+def delete_meetings(meeting_clients, meetings, max_workers=MAX_CONCURRENCY):
+    # Takes (MeetingId, ControlRegion) pairs and returns the ids that could not be deleted.  A meeting that
+    # has already ended counts as deleted.
+    meetings = list(dict.fromkeys(meetings))
+    if not meetings:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(meetings)))) as executor:
+        deleted = list(executor.map(lambda meeting: delete_meeting(meeting_clients.get(meeting[1]), meeting[0]), meetings))
+    return [meeting_id for (meeting_id, control_region), ok in zip(meetings, deleted) if not ok]
+
+
+def delete_meeting(chime_sdk_meeting_client, meeting_id):
+    try:
+        chime_sdk_meeting_client.delete_meeting(MeetingId=meeting_id)
+    except ClientError as error:
+        if error.response['Error']['Code'] != 'NotFoundException':
+            return False
+    except Exception:
+        return False
+    return True
+
+
+def meeting_rows(table, meeting_id):
+    query_args = {
+        'IndexName': 'MeetingAttendeeIndex',
+        'KeyConditionExpression': 'MeetingId = :m',
+        'ExpressionAttributeValues': {':m': meeting_id},
+        'ProjectionExpression': 'EventId, MeetingPasscode'
+    }
+    yield from _query(table, query_args)
+
+
+def event_rows(table, event_id):
+    query_args = {
+        'KeyConditionExpression': 'EventId = :e',
+        'ExpressionAttributeValues': {':e': str(event_id)},
+        'ProjectionExpression': 'EventId, MeetingPasscode, MeetingId, ActiveMeetingId, MediaRegion, ControlRegion'
+    }
+    yield from _query(table, query_args)
+
+
+def delete_rows(table, rows):
+    # Returns the number of rows deleted
+    keys = list({(row['EventId'], row['MeetingPasscode']): None for row in rows})
+    deleted = 0
+    for index in range(0, len(keys), BATCH_WRITE_LIMIT):
+        request_items = [
+            {'DeleteRequest': {'Key': {'EventId': event_id, 'MeetingPasscode': meeting_passcode}}}
+            for event_id, meeting_passcode in keys[index:index + BATCH_WRITE_LIMIT]
+        ]
+        for attempt in range(BATCH_WRITE_RETRIES):
+            request_items = table.batch_write(request_items)
+            if not request_items:
+                break
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+        deleted += min(BATCH_WRITE_LIMIT, len(keys) - index) - len(request_items)
+    return deleted
+
+
+def close_meetings(table, meeting_clients, meeting_ids, control_region):
+    # Returns the meeting ids that could not be deleted and the number of passcode rows removed.  Rows
+    # are only removed for meetings that are gone, so a failed delete can be retried with the same ids.
+    failed = delete_meetings(meeting_clients, [(meeting_id, control_region) for meeting_id in meeting_ids])
+    rows = []
+    for meeting_id in dict.fromkeys(meeting_ids):
+        if meeting_id in failed:
+            continue
+        passcode_rows = list(meeting_rows(table, meeting_id))
+        for event_id in {row['EventId'] for row in passcode_rows}:
+            clear_meeting(table, event_id, meeting_id)
+        rows.extend(passcode_rows)
+    return failed, delete_rows(table, rows)
+
+
+def close_event(table, meeting_clients, event_id):
+    # Every meeting the event's rows point at is deleted, each in the control region its row records, then
+    # every row for the event including the MEETING record.  The createMeeting run records are kept until
+    # their TTL, so a replayed notification for a roster already provisioned is still skipped.
+    rows = [row for row in event_rows(table, event_id) if not row['MeetingPasscode'].startswith(RUN_RECORD_PREFIX)]
+    event_record = next((row for row in rows if row['MeetingPasscode'] == MEETING_RECORD), {})
+    control_region = region_attributes(event_record)[1]
+    meetings = [
+        (row.get('MeetingId') or row.get('ActiveMeetingId'), region_attributes(row)[1] or control_region)
+        for row in rows
+    ]
+    failed = delete_meetings(meeting_clients, [(meeting_id, region) for meeting_id, region in meetings if meeting_id])
+    if failed:
+        return failed, 0
+    return failed, delete_rows(table, rows)
+
+
+def sweep_reason(event_record, now=None, idle_timeout=MEETING_IDLE_TIMEOUT):
+    # An event is past its window once its MEETING record's TTL has passed, which DynamoDB may take a day
+    # or two to act on.  Joins and leaves push the TTL back, so a meeting still in use does not expire.  A
+    # meeting is idle when the attendee events say nobody is in it and nobody has joined or left for the
+    # idle timeout.
+    now = time.time() if now is None else now
+    if 'TTL' in event_record and int(event_record['TTL']) <= now:
+        return SWEEP_EXPIRED
+    if 'LastActivity' in event_record and int(event_record.get('PresentCount', 0)) <= 0 \
+            and int(event_record['LastActivity']) + idle_timeout <= now:
+        return SWEEP_IDLE
+    return None
+
+
+def _query(table, query_args):
+    while True:
+        query_response = table.query(**query_args)
+        yield from query_response['Items']
+        if 'LastEvaluatedKey' not in query_response:
+            return
+        query_args['ExclusiveStartKey'] = query_response['LastEvaluatedKey']
@@ -0,0 +1,95 @@
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from sma_dialer.metrics import METRICS_NAMESPACE, SERVICE_NAME
+
+# Carried in TransactionAttributes, which only hold strings, so a call can be followed across invocations
+TRACE_ID = 'trace_id'
+TRACE_START = 'trace_start'
+TRACE_ANSWERED = 'trace_answered'
+TRACE_HANDLER_TIME = 'trace_handler_ms'
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+class Tracer:
+    # The SMA invokes a container with one call event at a time, so the handler keeps a single module level
+    # tracer that is reset by begin() and written out by end() on every invocation.
+    def __init__(self, emit=print, clock=time.time, timer=time.perf_counter):
+        self.emit = emit
+        self.clock = clock
+        self.timer = timer
+        self.attributes = {}
+        self.spans = []
+        self.counts = {}
+        self.properties = {}
+        self.started = None
+        self.received = None
+
+    def begin(self, transaction_attributes, event_type, action_type=None, transaction_id=None):
+        self.started = self.timer()
+        self.received = int(self.clock() * 1000)
+        self.attributes = transaction_attributes
+        self.spans = []
+        self.counts = {}
+        self.properties = {
+            'InvocationEventType': event_type,
+            'ActionType': action_type,
+            'TransactionId': transaction_id,
+        }
+        if TRACE_ID not in transaction_attributes:
+            transaction_attributes[TRACE_ID] = uuid.uuid4().hex
+            transaction_attributes[TRACE_START] = str(self.received)
+        if event_type == 'CALL_ANSWERED':
+            transaction_attributes[TRACE_ANSWERED] = str(self.received)
+
+    def count(self, name, value=1):
+        # Written with the invocation's timings, so counts reach CloudWatch without a separate flush
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    @contextmanager
+    def span(self, name):
+        start = self.timer()
+        try:
+            yield
+        finally:
+            self.spans.append((name, start - self.started, self.timer() - start))
+
+    def end(self, outcome=None):
+        if self.started is None:
+            return
+        turn_time = self.timer() - self.started
+        handler_time = float(self.attributes.get(TRACE_HANDLER_TIME, 0)) + milliseconds(turn_time)
+        self.attributes[TRACE_HANDLER_TIME] = str(round(handler_time, 3))
+
+        metrics = {'SmaTurnTime': milliseconds(turn_time)}
+        for name, offset, duration in self.spans:
+            metrics[name + 'Time'] = round(metrics.get(name + 'Time', 0) + milliseconds(duration), 3)
+        if outcome == 'JOINED':
+            # The caller waits from the answer (outbound) or the first ring (inbound) until the join succeeds
+            setup_start = int(self.attributes.get(TRACE_ANSWERED) or self.attributes.get(TRACE_START, self.received))
+            metrics['CallSetupTime'] = self.received - setup_start
+            metrics['CallSetupHandlerTime'] = round(handler_time, 3)
+
+        document = {
+            '_aws': {
+                'Timestamp': self.received,
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Service']],
+                    'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in metrics] + [{'Name': name, 'Unit': 'Count'} for name in self.counts]
+                }]
+            },
+            'Service': SERVICE_NAME,
+            'TraceId': self.attributes.get(TRACE_ID),
+            'Outcome': outcome,
+            'Spans': [{'Name': name, 'Start': milliseconds(offset), 'Duration': milliseconds(duration)} for name, offset, duration in self.spans],
+        }
+        document.update(self.properties)
+        document.update(metrics)
+        document.update(self.counts)
+        self.emit(json.dumps(document, separators=(',', ':')))
+        self.started = None
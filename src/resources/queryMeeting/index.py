@@ -1,17 +1,19 @@
 import os
 import json
-import logging
-import decimal
-import boto3
-from boto3.dynamodb.conditions import Key
-from botocore.exceptions import ClientError
-
-chime_sdk_meeting_client = boto3.client('chime-sdk-meetings')
-dynamo_client = boto3.resource('dynamodb')
+import base64
+import binascii
+from sma_dialer.log import LazyJson, log_payload
+from sma_dialer.runtime import DecimalEncoder, Table, get_logger
 
 MEETING_TABLE = os.environ['MEETING_TABLE']
+ROSTER_INDEX = 'MeetingAttendeeIndex'
+ROSTER_PROJECTION = 'MeetingId, AttendeeId, #n, JoinMethod'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+meeting_table = Table(MEETING_TABLE)
+logger = get_logger()
 
-meeting_table = dynamo_client.Table(MEETING_TABLE)
 response = {
     'statusCode': 200,
     'headers': {
@@ -24,67 +26,90 @@ response = {
 }
 
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, decimal.Decimal):
-            return int(obj)
-        return super(DecimalEncoder, self).default(obj)
-
-
-# Set LOG_LEVEL using environment variable, fallback to INFO if not present
-logger = logging.getLogger()
-try:
-    LOG_LEVEL = os.environ['LOG_LEVEL']
-    if LOG_LEVEL not in ['INFO', 'DEBUG', 'WARN', 'ERROR']:
-        LOG_LEVEL = 'INFO'
-except BaseException:
-    LOG_LEVEL = 'INFO'
-logger.setLevel(LOG_LEVEL)
-
-
 def handler(event, context):
     global LOG_PREFIX
     LOG_PREFIX = 'Query Meeting: '
-    logger.info('%s RECV Event: %s', LOG_PREFIX, json.dumps(event, indent=4))
-  
+    log_payload(logger, '%s RECV Event: %s', LOG_PREFIX, event)
+
     body = json.loads(event['body'])
 
-    if body.get('meetingId'):
-        logger.info('%s Querying for meetingId: %s', LOG_PREFIX, body['meetingId'])
+    if body.get('meetingId') and body.get('attendeeId'):
+        logger.info('%s Querying for meetingId: %s and attendeeId: %s', LOG_PREFIX, body['meetingId'], body['attendeeId'])
         query_response = meeting_table.query(
-          IndexName='MeetingIdIndex',
-          KeyConditionExpression=Key('MeetingId').eq(body['meetingId'])
-          )
-        logger.info('%s Query Response: %s', LOG_PREFIX, json.dumps(query_response, cls=DecimalEncoder, indent=4))
+            IndexName=ROSTER_INDEX,
+            KeyConditionExpression='MeetingId = :m AND AttendeeId = :a',
+            ProjectionExpression=ROSTER_PROJECTION,
+            ExpressionAttributeNames={'#n': 'Name'},
+            ExpressionAttributeValues={':m': body['meetingId'], ':a': body['attendeeId']}
+        )
+        logger.debug('%s Query Response: %s', LOG_PREFIX, LazyJson(query_response))
         if query_response['Count'] > 0:
-            response['body'] = json.dumps(query_response['Items'], cls=DecimalEncoder)
+            response['body'] = json.dumps(query_response['Items'][0], cls=DecimalEncoder)
             response['statusCode'] = 200
-            logger.info('%s Response: %s', LOG_PREFIX, json.dumps(response, indent=4))
+            logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
             return response
         else:
+            response['body'] = json.dumps({'message': 'Attendee not found'})
             response['statusCode'] = 404
-            logger.info('%s Response: %s', LOG_PREFIX, json.dumps(response, indent=4))
+            logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
             return response
-    elif body.get('attendeeId') and body.get('meeting_id'):
-        logger.info('%s Querying for meetingId: %s and attendeeId: %s', LOG_PREFIX, body['meeting_id'], body['attendeeId'])
-        query_response = meeting_table.query(
-            IndexName='MeetingIdIndex',
-            KeyConditionExpression=(
-                Key('MeetingId').eq(body['meetingId']) &
-                Key('AttendeeId').eq(body['attendeeId'])
-            )
-        )
-        logger.info('%s Query Response: %s', LOG_PREFIX, json.dumps(query_response, cls=DecimalEncoder, indent=4))
-        if query_response['Count'] > 0:
-            response['body'] = json.dumps(query_response['Item'])
+    elif body.get('meetingId'):
+        logger.info('%s Querying for meetingId: %s', LOG_PREFIX, body['meetingId'])
+        query_args = {
+            'IndexName': ROSTER_INDEX,
+            'KeyConditionExpression': 'MeetingId = :m',
+            'ProjectionExpression': ROSTER_PROJECTION,
+            'ExpressionAttributeNames': {'#n': 'Name'},
+            'ExpressionAttributeValues': {':m': body['meetingId']},
+            'Limit': page_size(body.get('limit'))
+        }
+        if body.get('nextToken'):
+            try:
+                query_args['ExclusiveStartKey'] = decode_token(body['nextToken'])
+            except ValueError as error:
+                logger.error('%s Invalid nextToken: %s', LOG_PREFIX, error)
+                response['body'] = json.dumps({'message': 'Invalid nextToken'})
+                response['statusCode'] = 400
+                logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
+                return response
+        query_response = meeting_table.query(**query_args)
+        logger.debug('%s Query Response: %s', LOG_PREFIX, LazyJson(query_response))
+        if query_response['Count'] > 0 or body.get('nextToken'):
+            page = {'Attendees': query_response['Items']}
+            if 'LastEvaluatedKey' in query_response:
+                page['NextToken'] = encode_token(query_response['LastEvaluatedKey'])
+            response['body'] = json.dumps(page, cls=DecimalEncoder)
             response['statusCode'] = 200
-            logger.info('%s Response: %s', LOG_PREFIX, json.dumps(response, indent=4))
+            logger.info('%s Response: %s with %s attendees', LOG_PREFIX, response['statusCode'], query_response['Count'])
             return response
         else:
+            response['body'] = json.dumps({'message': 'Meeting not found'})
             response['statusCode'] = 404
-            logger.info('%s Response: %s', LOG_PREFIX, json.dumps(response, indent=4))
+            logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
             return response
     else:
         response['body'] = json.dumps({'message': 'MeetingID is required'})
-        logger.info('%s Response: %s', LOG_PREFIX, json.dumps(response, indent=4))
         response['statusCode'] = 404
+        logger.info('%s Response: %s', LOG_PREFIX, response['statusCode'])
+        return response
+
+
+def page_size(limit):
+    try:
+        return max(1, min(int(limit), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def encode_token(last_evaluated_key):
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_token(next_token):
+    try:
+        start_key = json.loads(base64.urlsafe_b64decode(next_token.encode('ascii')))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as error:
+        raise ValueError(str(error))
+    if not isinstance(start_key, dict) or not all(isinstance(value, str) for value in start_key.values()):
+        raise ValueError('nextToken is not a key')
+    return start_key
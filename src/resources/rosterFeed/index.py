@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import base64
+import binascii
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from sma_dialer.log import log_payload
+from sma_dialer.runtime import DecimalEncoder, LazyClient, Table, deserialize_item, get_logger
+
+CONNECTIONS_TABLE = os.environ['CONNECTIONS_TABLE']
+CALLBACK_URL = os.environ['CALLBACK_URL']
+USER_POOL_ID = os.environ.get('USER_POOL_ID', '')
+USER_POOL_CLIENT_ID = os.environ.get('USER_POOL_CLIENT_ID', '')
+USER_POOL_REGION = os.environ.get('USER_POOL_REGION') or None
+MAX_CONCURRENCY = int(os.environ.get('MAX_CONCURRENCY', '10'))
+CONNECTION_TTL = 7200
+ROSTER_FIELDS = ['AttendeeId', 'Name', 'JoinMethod']
+ATTENDEE_PRESENCE = {
+    'chime:AttendeeJoined': True,
+    'chime:AttendeeLeft': False,
+    'chime:AttendeeDropped': False,
+}
+
+cognito_client = LazyClient('cognito-idp', region_name=USER_POOL_REGION)
+management_client = LazyClient('apigatewaymanagementapi', endpoint_url=CALLBACK_URL)
+
+connections_table = Table(CONNECTIONS_TABLE)
+
+logger = get_logger()
+
+
+def handler(event, context):
+    global LOG_PREFIX
+    LOG_PREFIX = 'Roster Feed: '
+    log_payload(logger, '%s RECV Event: %s', LOG_PREFIX, event)
+
+    if 'requestContext' in event:
+        return websocket_route(event)
+    if 'Records' in event:
+        publish(stream_deltas(event['Records']))
+    elif event.get('detail-type') == 'Chime Meeting State Change':
+        publish(attendee_event_deltas(event['detail']))
+
+
+def websocket_route(event):
+    route_key = event['requestContext']['routeKey']
+    connection_id = event['requestContext']['connectionId']
+    if route_key == '$connect':
+        parameters = event.get('queryStringParameters') or {}
+        if not parameters.get('meetingId') or not authorized(parameters.get('token')):
+            logger.info('%s Rejecting connection %s', LOG_PREFIX, connection_id)
+            return {'statusCode': 401}
+        connections_table.put_item(Item={
+            'MeetingId': parameters['meetingId'],
+            'ConnectionId': connection_id,
+            'TTL': int(time.time() + CONNECTION_TTL)
+        })
+        logger.info('%s Connection %s subscribed to meeting %s', LOG_PREFIX, connection_id, parameters['meetingId'])
+    elif route_key == '$disconnect':
+        remove_connection(connection_id)
+    return {'statusCode': 200}
+
+
+def authorized(token):
+    # The claims are checked first so a malformed token, or one issued to another client, never reaches
+    # Cognito.  get_user then only succeeds for a current access token, so Cognito does the signature and
+    # expiry checks.  As with the queryMeeting API, any user of the pool may read any meeting's roster.
+    if not token:
+        return False
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (IndexError, ValueError, binascii.Error) as error:
+        logger.info('%s Access token could not be decoded: %s', LOG_PREFIX, error)
+        return False
+    if not isinstance(claims, dict) or claims.get('token_use') != 'access':
+        logger.info('%s Token is not an access token', LOG_PREFIX)
+        return False
+    if USER_POOL_ID and not str(claims.get('iss', '')).endswith('/' + USER_POOL_ID):
+        logger.info('%s Access token is from another user pool', LOG_PREFIX)
+        return False
+    if USER_POOL_CLIENT_ID and (claims.get('client_id') or claims.get('aud')) != USER_POOL_CLIENT_ID:
+        logger.info('%s Access token is for another client', LOG_PREFIX)
+        return False
+    try:
+        cognito_client.get_user(AccessToken=token)
+    except ClientError as error:
+        logger.info('%s Access token rejected: %s', LOG_PREFIX, error.response['Error']['Code'])
+        return False
+    return True
+
+
+def remove_connection(connection_id):
+    query_response = connections_table.query(
+        IndexName='ConnectionIdIndex',
+        KeyConditionExpression='ConnectionId = :c',
+        ExpressionAttributeValues={':c': connection_id}
+    )
+    for item in query_response['Items']:
+        connections_table.delete_item(Key={'MeetingId': item['MeetingId'], 'ConnectionId': connection_id})
+    logger.info('%s Connection %s closed', LOG_PREFIX, connection_id)
+
+
+def roster_entry(item):
+    if 'MeetingId' not in item or 'AttendeeId' not in item:
+        return None
+    entry = {field: item[field] for field in ROSTER_FIELDS if field in item}
+    entry['MeetingId'] = item['MeetingId']
+    return entry
+
+
+def stream_deltas(records):
+    deltas = defaultdict(list)
+    for record in records:
+        if record.get('eventSource') != 'aws:dynamodb':
+            continue
+        old_entry = roster_entry(deserialize_item(record['dynamodb'].get('OldImage', {})))
+        new_entry = roster_entry(deserialize_item(record['dynamodb'].get('NewImage', {})))
+        # Status and TTL rewrites leave the roster fields alone and are not sent
+        if old_entry == new_entry:
+            continue
+        if old_entry and (new_entry is None or (old_entry['MeetingId'], old_entry['AttendeeId']) != (new_entry['MeetingId'], new_entry['AttendeeId'])):
+            deltas[old_entry['MeetingId']].append({'Type': 'Remove', 'AttendeeId': old_entry['AttendeeId']})
+        if new_entry:
+            meeting_id = new_entry.pop('MeetingId')
+            deltas[meeting_id].append({'Type': 'Upsert', 'Attendee': new_entry})
+    return deltas
+
+
+def attendee_event_deltas(detail):
+    if detail.get('eventType') not in ATTENDEE_PRESENCE or not detail.get('attendeeId'):
+        return {}
+    return {detail['meetingId']: [{
+        'Type': 'Presence',
+        'AttendeeId': detail['attendeeId'],
+        'Present': ATTENDEE_PRESENCE[detail['eventType']]
+    }]}
+
+
+def meeting_connections(meeting_id):
+    query_args = {
+        'KeyConditionExpression': 'MeetingId = :m',
+        'ExpressionAttributeValues': {':m': meeting_id},
+        'ProjectionExpression': 'ConnectionId'
+    }
+    while True:
+        query_response = connections_table.query(**query_args)
+        for item in query_response['Items']:
+            yield item['ConnectionId']
+        if 'LastEvaluatedKey' not in query_response:
+            return
+        query_args['ExclusiveStartKey'] = query_response['LastEvaluatedKey']
+
+
+def publish(deltas):
+    messages = []
+    for meeting_id, meeting_deltas in deltas.items():
+        data = json.dumps({'MeetingId': meeting_id, 'Deltas': meeting_deltas}, cls=DecimalEncoder).encode('utf-8')
+        try:
+            messages.extend((meeting_id, connection_id, data) for connection_id in meeting_connections(meeting_id))
+        except Exception as error:
+            logger.error('%s Error reading connections for meeting %s: %s', LOG_PREFIX, meeting_id, error)
+    if not messages:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, len(messages)))) as executor:
+        sent = sum(executor.map(lambda message: post(*message), messages))
+    logger.info('%s Sent %s roster updates to %s of %s connections', LOG_PREFIX, len(deltas), sent, len(messages))
+
+
+def post(meeting_id, connection_id, data):
+    try:
+        management_client.post_to_connection(ConnectionId=connection_id, Data=data)
+        return True
+    except ClientError as error:
+        if error.response['Error']['Code'] == 'GoneException':
+            connections_table.delete_item(Key={'MeetingId': meeting_id, 'ConnectionId': connection_id})
+        else:
+            logger.error('%s Error posting to connection %s: %s', LOG_PREFIX, connection_id, error)
+    except Exception as error:
+        logger.error('%s Error posting to connection %s: %s', LOG_PREFIX, connection_id, error)
+    return False
@@ -1,143 +1,372 @@
 import os
-import decimal
-import json
-import logging
-import boto3
-import botocore.exceptions
-
-chime_sdk_meeting_client = boto3.client('chime-sdk-meetings')
-dynamo_client = boto3.resource('dynamodb')
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from sma_dialer.attendee_index import adjust_attendee_count, clear_meeting
+from sma_dialer.attendee_pool import POOL_CLAIMED, claim_attendee, drain_pool, release_attendee
+from sma_dialer.cache import ItemCache
+from sma_dialer.call_state import CallPhase, CallStateError, decode, encode
+from sma_dialer.circuit import CircuitOpenError, is_dependency_failure
+from sma_dialer.dial_queue import SqsDialQueue, record_dial_progress
+from sma_dialer.log import LazyJson, log_payload
+from sma_dialer.pacing import REDIAL_LIMIT, record_active_calls, redial_delay
+from sma_dialer.regions import DEFAULT_MEDIA_REGION, RegionalClients, region_attributes
+from sma_dialer.runtime import Table, get_logger
+from sma_dialer.tracing import Tracer
+
+meeting_clients = RegionalClients('chime-sdk-meetings')
 
 MEETING_TABLE = os.environ['MEETING_TABLE']
+DIAL_QUEUE_URL = os.environ.get('DIAL_QUEUE_URL')
+
+meeting_table = Table(MEETING_TABLE)
+dial_queue = SqsDialQueue(DIAL_QUEUE_URL) if DIAL_QUEUE_URL else None
+passcode_cache = ItemCache()
+tracer = Tracer()
+
+# The arguments a dial job carries, which a redial is rebuilt from
+DIAL_ARGUMENTS = ('meeting_id', 'attendee_id', 'join_token', 'event_id', 'meeting_passcode', 'phone_number', 'control_region')
+
+# Runs the join bookkeeping that is deferred until the SMA reports the caller has joined
+join_executor = ThreadPoolExecutor(max_workers=2)
+
+# A caller is put on hold while a throttled or unavailable dependency recovers, rather than the invocation
+# waiting on it, and is asked to call back once the limit is reached
+DEFER_LIMIT = 2
+DEFER_MILLISECONDS = '2000'
+
+logger = get_logger()
+
+
+SPEECH_PARAMETERS = {
+    "Engine": "neural",
+    "LanguageCode": "en-US",
+    "VoiceId": "Joanna"
+}
+
+INBOUND_DIGITS_PARAMETERS = {
+    "MinNumberOfDigits": 6,
+    "MaxNumberOfDigits": 6,
+    "Repeat": 3,
+    "RepeatDurationInMilliseconds": 7500,
+    "InputDigitsRegex": "[0-9]",
+    "InBetweenDigitsDurationInMilliseconds": 1000,
+    "TerminatorDigits": ["#"],
+    "FailureSpeechParameters": {
+        **SPEECH_PARAMETERS,
+        "Text": "Sorry, I didn't get that.  Please try again.",
+        "TextType": "text"},
+}
+
+OUTBOUND_DIGITS_PARAMETERS = {
+    "MinNumberOfDigits": 1,
+    "MaxNumberOfDigits": 1,
+    "Repeat": 3,
+    "RepeatDurationInMilliseconds": 3000,
+    "InputDigitsRegex": "[1-2]",
+    "InBetweenDigitsDurationInMilliseconds": 1000,
+    "TerminatorDigits": ["#"],
+    "FailureSpeechParameters": {
+        **SPEECH_PARAMETERS,
+        "Text": "Sorry, I didn't get that.  Please press 1 to join, 2 to decline.",
+        "TextType": "text"},
+}
+
+SSML_SPEECH_PARAMETERS = {**SPEECH_PARAMETERS, "TextType": "ssml"}
+TEXT_SPEECH_PARAMETERS = {**SPEECH_PARAMETERS, "TextType": "text"}
 
-meeting_table = dynamo_client.Table(MEETING_TABLE)
 
-# Set LOG_LEVEL using environment variable, fallback to INFO if not present
-logger = logging.getLogger()
-try:
-    LOG_LEVEL = os.environ['LOG_LEVEL']
-    if LOG_LEVEL not in ['INFO', 'DEBUG', 'WARN', 'ERROR']:
-        LOG_LEVEL = 'INFO'
-except BaseException:
-    LOG_LEVEL = 'INFO'
-logger.setLevel(LOG_LEVEL)
+def inbound_call_speak_and_get_digits_action(text):
+    return {
+        "Type": "SpeakAndGetDigits",
+        "Parameters": {**INBOUND_DIGITS_PARAMETERS, "SpeechParameters": {**SSML_SPEECH_PARAMETERS, "Text": text}}
+    }
 
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, decimal.Decimal):
-            return int(obj)
-        return super(DecimalEncoder, self).default(obj)
+# Prompts that never change are built once and shared by every response
+EVENT_ID_PROMPT = inbound_call_speak_and_get_digits_action("<speak>Please enter your 6 digit event i d</speak>")
+PASSCODE_PROMPT = inbound_call_speak_and_get_digits_action("<speak>Please enter your 6 digit passcode to join the meeting.</speak>")
 
 
 def handler(event, context):
     event_type = event['InvocationEventType']
-    transaction_id = event['CallDetails']['TransactionId']
-    transaction_attributes = event['CallDetails'].get('TransactionAttributes')
-    if transaction_attributes is None:
-        transaction_attributes = {}
     participants = event['CallDetails']['Participants']
     call_id = participants[0]['CallId']
 
     global LOG_PREFIX
     LOG_PREFIX = f'SMA Handler: '
-    logger.info('%s RECV Event: %s', LOG_PREFIX, json.dumps(event, indent=4))
-
-    if event_type == 'NEW_INBOUND_CALL':
-        transaction_attributes['call_type'] = 'inbound'
-        return response(inbound_call_speak_and_get_digits_action("<speak>Please enter your 6 digit event i d</speak>"), transaction_attributes=transaction_attributes)
-    elif event_type == 'HANGUP':
-        if participants[0]['To'] == '+17035550122':
-            return response(hangup_action(participants[1]['CallId']), transaction_attributes=transaction_attributes)
-        elif len(participants) == 2:
-            logger.info('%s Deleting attendee %s in meeting %s', LOG_PREFIX, transaction_attributes['attendee_id'],  transaction_attributes['meeting_id'])
-            chime_sdk_meeting_client.delete_attendee(MeetingId=transaction_attributes['meeting_id'], AttendeeId=transaction_attributes['attendee_id'])
-            current_attendee_list = chime_sdk_meeting_client.list_attendees(MeetingId=transaction_attributes['meeting_id'])
-            logger.info('Current Attendee List: %s', json.dumps(current_attendee_list['Attendees']))
-            if len(current_attendee_list['Attendees']) == 0:
-                logger.info('%s No more attendees, deleting meeting: %s', LOG_PREFIX, transaction_attributes['meeting_id'])
-                chime_sdk_meeting_client.delete_meeting(MeetingId=transaction_attributes['meeting_id'])
-            return response(transaction_attributes=transaction_attributes)
+    action_data = event.get('ActionData')
+    action_type = action_data['Type'] if action_data else None
+    logger.info('%s RECV %s %s', LOG_PREFIX, event_type, action_type or '')
+    try:
+        transaction_attributes = decode(event['CallDetails'].get('TransactionAttributes'))
+    except CallStateError as error:
+        logger.error('%s Unable to decode call state: %s', LOG_PREFIX, error)
+        return {'SchemaVersion': '1.0', 'Actions': [], 'TransactionAttributes': event['CallDetails']['TransactionAttributes']}
+    # Logged decoded, so the redacted fields stay redacted
+    event['CallDetails']['TransactionAttributes'] = transaction_attributes
+    log_payload(logger, '%s RECV Event: %s', LOG_PREFIX, event, event['CallDetails']['TransactionId'])
+    # A call still carrying the previous handler's attributes can fit more than one phase, and is taken to
+    # be in the latest of them that has a route for the event
+    for phase in transaction_attributes.phases:
+        route = find_route(event_type, action_type, phase)
+        if route is not None:
+            transaction_attributes.phase = phase
+            break
+    tracer.begin(transaction_attributes, event_type, action_type, event['CallDetails']['TransactionId'])
+    try:
+        if route is None:
+            # Also how an event that arrives out of order, or twice, is turned away
+            logger.info('%s No route for %s %s in phase %s', LOG_PREFIX, event_type, action_type or '', transaction_attributes.phase.name)
+            res = response(transaction_attributes=transaction_attributes)
         else:
-            return response(hangup_action(call_id), transaction_attributes=transaction_attributes)
-    elif event_type == 'NEW_OUTBOUND_CALL':
-        logger.info('%s Adding transaction attributes', LOG_PREFIX)
-        transaction_attributes['meeting_id'] = event['ActionData']['Parameters']['Arguments']['meeting_id']
-        transaction_attributes['attendee_id'] = event['ActionData']['Parameters']['Arguments']['attendee_id']
-        transaction_attributes['join_token'] = event['ActionData']['Parameters']['Arguments']['join_token']
-        transaction_attributes['event_id'] = event['ActionData']['Parameters']['Arguments']['event_id']
-        transaction_attributes['meeting_passcode'] = event['ActionData']['Parameters']['Arguments']['meeting_passcode']
-        transaction_attributes['phone_number'] = event['ActionData']['Parameters']['Arguments']['phone_number']
-        transaction_attributes['call_type'] = 'outbound'
+            res = route(event, call_id, participants, transaction_attributes)
+    finally:
+        tracer.end(TRACE_OUTCOMES.get((event_type, action_type)) if route else None)
+    # Encoded last, once the tracer has added this invocation's handler time
+    res['TransactionAttributes'] = encode(transaction_attributes)
+    return res
+
+
+def find_route(event_type, action_type, phase):
+    return (ROUTES.get((event_type, action_type, phase))
+            or ROUTES.get((event_type, action_type, None))
+            or ROUTES.get((event_type, None, phase))
+            or ROUTES.get((event_type, None, None)))
+
+
+def new_inbound_call(event, call_id, participants, transaction_attributes):
+    transaction_attributes['call_type'] = 'inbound'
+    transaction_attributes.phase = CallPhase.AWAITING_EVENT_ID
+    return response(EVENT_ID_PROMPT, transaction_attributes=transaction_attributes)
+
+
+def hangup(event, call_id, participants, transaction_attributes):
+    if transaction_attributes.get('call_type') == 'outbound' and not transaction_attributes.get('hangup_recorded'):
+        with tracer.span('RecordHangup'):
+            record_hangup(transaction_attributes)
+    transaction_attributes.phase = CallPhase.ENDED
+    if participants[0]['To'] == '+17035550122':
+        return response(hangup_action(participants[1]['CallId']), transaction_attributes=transaction_attributes)
+    elif len(participants) == 2 and transaction_attributes.get('attendee_id'):
+        # A caller who hangs up while held for a deferred join has no attendee to clean up
+        meeting_id = transaction_attributes['meeting_id']
+        with tracer.span('DeleteAttendee'):
+            deleted = delete_attendee(transaction_attributes, meeting_id, transaction_attributes['attendee_id'])
+        # An attendee whose join was never reported was never counted
+        if deleted and transaction_attributes.get('meeting_passcode'):
+            with tracer.span('ReleaseAttendee'):
+                release_pooled_attendee(transaction_attributes)
+        if deleted and not transaction_attributes.get('pending_count'):
+            with tracer.span('UpdateAttendeeCount'):
+                attendee_count = update_attendee_count(transaction_attributes['event_id'], meeting_id, -1)
+            logger.info('%s Current attendee count: %s', LOG_PREFIX, attendee_count)
+            if attendee_count is not None and attendee_count <= 0:
+                logger.info('%s No more attendees, deleting meeting: %s', LOG_PREFIX, meeting_id)
+                with tracer.span('DeleteMeeting'):
+                    delete_meeting(transaction_attributes, meeting_id)
+                with tracer.span('ClearMeeting'):
+                    clear_meeting_record(transaction_attributes['event_id'], meeting_id)
+                with tracer.span('DrainPool'):
+                    drain_pooled_attendees(transaction_attributes['event_id'], meeting_id)
         return response(transaction_attributes=transaction_attributes)
-    elif event_type == 'CALL_ANSWERED':
-        return response(outbound_call_speak_and_get_digits_action(transaction_attributes), transaction_attributes=transaction_attributes)
-    elif event_type == 'ACTION_SUCCESSFUL':
-        logger.info('%s Action Successful', LOG_PREFIX)
-        if event['ActionData']['Type'] == 'SpeakAndGetDigits':
-            logger.info('%s SpeakAndGetDigits Action Successful', LOG_PREFIX)
-            if transaction_attributes['call_type'] == 'outbound':
-                logger.info('%s CallType is outbound', LOG_PREFIX)
-                received_digits = event['ActionData']['ReceivedDigits']
-                if received_digits == '1':
-                    logger.info('%s Received digits is 1', LOG_PREFIX)
-                    update_table(transaction_attributes, transaction_attributes['meeting_id'], transaction_attributes['attendee_id'])
-                    return response(join_chime_meeting_action(call_id, transaction_attributes), transaction_attributes=transaction_attributes)
-                else:
-                    logger.info('%s Received digits is not 1', LOG_PREFIX)
-                    return response(speak_action(call_id, "Disconnecting you."), hangup_action(call_id), transaction_attributes=transaction_attributes)
-            elif transaction_attributes['call_type'] == 'inbound':
-                logger.info('%s CallType is inbound', LOG_PREFIX)
-                received_digits = event['ActionData']['ReceivedDigits']
-                if 'event_id' not in transaction_attributes:
-                    logger.info('%s Event Id not in transaction attributes', LOG_PREFIX)
-                    transaction_attributes['event_id'] = received_digits
-                    return response(
-                        inbound_call_speak_and_get_digits_action("<speak>Please enter your 6 digit passcode to join the meeting.</speak>"),
+    else:
+        return response(hangup_action(call_id), transaction_attributes=transaction_attributes)
+
+
+def new_outbound_call(event, call_id, participants, transaction_attributes):
+    logger.info('%s Adding transaction attributes', LOG_PREFIX)
+    arguments = event['ActionData']['Parameters']['Arguments']
+    transaction_attributes['meeting_id'] = arguments['meeting_id']
+    transaction_attributes['attendee_id'] = arguments['attendee_id']
+    transaction_attributes['join_token'] = arguments['join_token']
+    transaction_attributes['event_id'] = arguments['event_id']
+    transaction_attributes['meeting_passcode'] = arguments['meeting_passcode']
+    transaction_attributes['phone_number'] = arguments['phone_number']
+    if arguments.get('control_region'):
+        transaction_attributes['control_region'] = arguments['control_region']
+    if arguments.get('redials'):
+        transaction_attributes['redials'] = arguments['redials']
+    transaction_attributes['call_type'] = 'outbound'
+    transaction_attributes.phase = CallPhase.DIALING
+    return response(transaction_attributes=transaction_attributes)
+
+
+def call_answered(event, call_id, participants, transaction_attributes):
+    tracer.count('CallsAnswered')
+    transaction_attributes.phase = CallPhase.AWAITING_CONSENT
+    return response(outbound_call_speak_and_get_digits_action(transaction_attributes), transaction_attributes=transaction_attributes)
+
+
+def outbound_digits_received(event, call_id, participants, transaction_attributes):
+    logger.info('%s SpeakAndGetDigits Action Successful for outbound call', LOG_PREFIX)
+    received_digits = event['ActionData']['ReceivedDigits']
+    if received_digits == '1':
+        logger.info('%s Received digits is 1', LOG_PREFIX)
+        tracer.count('CallsAccepted')
+        transaction_attributes['pending_update'] = '1'
+        # The attendee createMeeting made for the participant is only counted once it has joined
+        transaction_attributes['pending_count'] = '1'
+        transaction_attributes.phase = CallPhase.JOINING
+        return response(join_chime_meeting_action(call_id, transaction_attributes), transaction_attributes=transaction_attributes)
+    else:
+        logger.info('%s Received digits is not 1', LOG_PREFIX)
+        record_outcome(transaction_attributes, declined=1)
+        transaction_attributes.phase = CallPhase.ENDED
+        return response(speak_action(call_id, "Disconnecting you."), hangup_action(call_id), transaction_attributes=transaction_attributes)
+
+
+def event_id_received(event, call_id, participants, transaction_attributes):
+    logger.info('%s SpeakAndGetDigits Action Successful for inbound call event ID', LOG_PREFIX)
+    transaction_attributes['event_id'] = event['ActionData']['ReceivedDigits']
+    transaction_attributes.phase = CallPhase.AWAITING_PASSCODE
+    return response(PASSCODE_PROMPT, transaction_attributes=transaction_attributes)
+
+
+def passcode_received(event, call_id, participants, transaction_attributes):
+    logger.info('%s SpeakAndGetDigits Action Successful for inbound call passcode', LOG_PREFIX)
+    return join_with_passcode(call_id, transaction_attributes, event['ActionData']['ReceivedDigits'])
+
+
+def deferred_join(event, call_id, participants, transaction_attributes):
+    logger.info('%s Retrying deferred join, attempt %s', LOG_PREFIX, transaction_attributes['deferrals'])
+    return join_with_passcode(call_id, transaction_attributes, transaction_attributes.pop('deferred_digits'))
+
+
+def defer_join(call_id, transaction_attributes, received_digits):
+    deferrals = int(transaction_attributes.get('deferrals', '0'))
+    if deferrals >= DEFER_LIMIT:
+        logger.error('%s Unable to join caller after %s attempts', LOG_PREFIX, deferrals + 1)
+        transaction_attributes.phase = CallPhase.ENDED
+        return response(speak_action(call_id, "Sorry, we are unable to connect you right now.  Please try again later."), hangup_action(call_id),
                         transaction_attributes=transaction_attributes)
-                else:
-                    logger.info('%s Event ID is in transaction attributes', LOG_PREFIX)
-                    try:
-                        logger.info('%s Getting Item from DynamoDB for Event ID: %s and Passcode: %s', LOG_PREFIX, transaction_attributes['event_id'], received_digits)
-                        event_info = meeting_table.get_item(Key={"EventId": transaction_attributes['event_id'], 'MeetingPasscode': received_digits})
-                        logger.info('%s Event Info: %s', LOG_PREFIX, json.dumps(event_info,  cls=DecimalEncoder, indent=4))
-                    except Exception as error:
-                        logger.error('%s DynamoDB Exception: %s', LOG_PREFIX, error)
-                        raise error
-                    if event_info.get('Item'):
-                        logger.info('%s Passcode and Event ID combination is valid', LOG_PREFIX)
-                        transaction_attributes['phone_number'] = event_info['Item']['PhoneNumber']
-                        transaction_attributes['event_id'] = str(event_info['Item']['EventId'])
-                        transaction_attributes['meeting_passcode'] = received_digits
-                        transaction_attributes['meeting_id'] = event_info['Item']['MeetingId']
-                        meeting_info = create_meeting(transaction_attributes)
-                        # transaction_attributes['meeting_id'] = meeting_info['Meeting']['MeetingId']
-                        transaction_attributes['attendee_id'] = meeting_info['Attendees'][0]['AttendeeId']
-                        transaction_attributes['join_token'] = meeting_info['Attendees'][0]['JoinToken']
-                        return response(join_chime_meeting_action(call_id, transaction_attributes), transaction_attributes=transaction_attributes)
-                    else:
-                        logger.info('%s Passcode and Event ID combination is not valid', LOG_PREFIX)
-                        return response(speak_action(call_id, "Invalid meeting passcode."), hangup_action(call_id), transaction_attributes=transaction_attributes)
-        if event['ActionData']['Type'] == 'JoinChimeMeeting':
-            logger.info('%s JoinChimeMeetingAction Successful', LOG_PREFIX)
-            return response(speak_action(call_id, "You have been joined to the meeting."), transaction_attributes=transaction_attributes)
-        else:
-            logger.info('%s Action Type is not SpeakAndGetDigits or JoinChimeMeeting', LOG_PREFIX)
-            return response(transaction_attributes=transaction_attributes)
-    elif event_type == 'ACTION_FAILED':
-        logger.info('%s Action Failed', LOG_PREFIX)
-        if event['ActionData']['Type'] == 'JoinChimeMeeting':
-            logger.info('%s JoinChimeMeetingAction Failed', LOG_PREFIX)
+    transaction_attributes['deferrals'] = str(deferrals + 1)
+    transaction_attributes['deferred_digits'] = received_digits
+    transaction_attributes.phase = CallPhase.DEFERRED
+    return response(speak_action(call_id, "Please hold while we connect you."), pause_action(call_id), transaction_attributes=transaction_attributes)
+
+
+def join_with_passcode(call_id, transaction_attributes, received_digits):
+    try:
+        with tracer.span('ClaimAttendee'):
+            claimed = claim_attendee(meeting_table, transaction_attributes['event_id'], received_digits, 'Phone')
+    except Exception as error:
+        logger.error('%s Error claiming pooled attendee: %s', LOG_PREFIX, error)
+        claimed = None
+    if claimed:
+        logger.info('%s Joining with pooled attendee %s', LOG_PREFIX, claimed['AttendeeId'])
+        transaction_attributes['phone_number'] = claimed['PhoneNumber']
+        transaction_attributes['meeting_passcode'] = received_digits
+        transaction_attributes['meeting_id'] = claimed['MeetingId']
+        transaction_attributes['attendee_id'] = claimed['AttendeeId']
+        transaction_attributes['join_token'] = claimed['JoinToken']
+        set_regions(transaction_attributes, claimed)
+        transaction_attributes['pooled'] = '1'
+        transaction_attributes.phase = CallPhase.JOINING
+        return response(join_chime_meeting_action(call_id, transaction_attributes), transaction_attributes=transaction_attributes)
+
+    try:
+        logger.info('%s Getting Item from DynamoDB for Event ID: %s', LOG_PREFIX, transaction_attributes['event_id'])
+        with tracer.span('GetItem'):
+            event_info = passcode_cache.get_item(meeting_table, Key={"EventId": transaction_attributes['event_id'], 'MeetingPasscode': received_digits})
+        logger.debug('%s Event Info: %s', LOG_PREFIX, LazyJson(event_info))
+        logger.debug('%s Passcode cache: %s hits, %s misses', LOG_PREFIX, passcode_cache.hits, passcode_cache.misses)
+    except Exception as error:
+        logger.error('%s DynamoDB Exception: %s', LOG_PREFIX, error)
+        if is_dependency_failure(error):
+            return defer_join(call_id, transaction_attributes, received_digits)
+        raise error
+    if event_info.get('Item'):
+        logger.info('%s Passcode and Event ID combination is valid', LOG_PREFIX)
+        transaction_attributes['phone_number'] = event_info['Item']['PhoneNumber']
+        transaction_attributes['event_id'] = str(event_info['Item']['EventId'])
+        transaction_attributes['meeting_passcode'] = received_digits
+        set_regions(transaction_attributes, event_info['Item'])
+        # The cache only says the passcode is valid, so the row's join details are read while the meeting is created
+        join_details = join_executor.submit(read_join_details, transaction_attributes)
+        try:
+            meeting_info = create_meeting(transaction_attributes)
+        except Exception as error:
+            if is_dependency_failure(error):
+                return defer_join(call_id, transaction_attributes, received_digits)
+            transaction_attributes.phase = CallPhase.ENDED
             return response(speak_action(call_id, "Sorry, I could not connect you to the meeting"), hangup_action(call_id), transaction_attributes=transaction_attributes)
-        if event['ActionData']['Type'] == 'SpeakAndGetDigits':
-            logger.info('%s SpeakAndGetDigits Failed', LOG_PREFIX)
-            if event['ActionData']['ErrorType'] == 'InvalidDigitsReceived':
-                logger.info('%s InvalidDigitsReceived', LOG_PREFIX)
-                return response(hangup_action(call_id), transaction_attributes=transaction_attributes)
-        else:
-            return response(transaction_attributes=transaction_attributes)
+        transaction_attributes['meeting_id'] = meeting_info['Meeting']['MeetingId']
+        transaction_attributes['attendee_id'] = meeting_info['Attendees'][0]['AttendeeId']
+        transaction_attributes['join_token'] = meeting_info['Attendees'][0]['JoinToken']
+        defer_join_work(transaction_attributes, joined_item(join_details))
+        transaction_attributes.phase = CallPhase.JOINING
+        return response(join_chime_meeting_action(call_id, transaction_attributes), transaction_attributes=transaction_attributes)
     else:
-        return response(transaction_attributes=transaction_attributes)
+        logger.info('%s Passcode and Event ID combination is not valid', LOG_PREFIX)
+        transaction_attributes.phase = CallPhase.ENDED
+        return response(speak_action(call_id, "Invalid meeting passcode."), hangup_action(call_id), transaction_attributes=transaction_attributes)
+
+
+def joined_meeting(event, call_id, participants, transaction_attributes):
+    logger.info('%s JoinChimeMeetingAction Successful', LOG_PREFIX)
+    if transaction_attributes.pop('pooled', None):
+        # A pooled attendee is only counted once it has joined
+        transaction_attributes['pending_count'] = '1'
+    transaction_attributes.pop('deferrals', None)
+    transaction_attributes.phase = CallPhase.JOINED
+    complete_join(transaction_attributes)
+    return response(speak_action(call_id, "You have been joined to the meeting."), transaction_attributes=transaction_attributes)
+
+
+def join_failed(event, call_id, participants, transaction_attributes):
+    logger.info('%s JoinChimeMeetingAction Failed', LOG_PREFIX)
+    if transaction_attributes.pop('pooled', None):
+        # A pooled token fails once its meeting has ended, so fall back to creating the attendee
+        logger.info('%s Pooled attendee %s could not join, creating a new attendee', LOG_PREFIX, transaction_attributes['attendee_id'])
+        item = {'JoinMethod': 'Phone', 'MeetingId': transaction_attributes['meeting_id'], 'AttendeeId': transaction_attributes['attendee_id'], 'PoolStatus': POOL_CLAIMED}
+        try:
+            meeting_info = create_meeting(transaction_attributes)
+        except Exception:
+            meeting_info = None
+        if meeting_info is not None:
+            transaction_attributes['meeting_id'] = meeting_info['Meeting']['MeetingId']
+            transaction_attributes['attendee_id'] = meeting_info['Attendees'][0]['AttendeeId']
+            transaction_attributes['join_token'] = meeting_info['Attendees'][0]['JoinToken']
+            defer_join_work(transaction_attributes, item)
+            return response(join_chime_meeting_action(call_id, transaction_attributes), transaction_attributes=transaction_attributes)
+    transaction_attributes.phase = CallPhase.ENDED
+    return response(speak_action(call_id, "Sorry, I could not connect you to the meeting"), hangup_action(call_id), transaction_attributes=transaction_attributes)
+
+
+def digits_failed(event, call_id, participants, transaction_attributes):
+    logger.info('%s SpeakAndGetDigits Failed', LOG_PREFIX)
+    if event['ActionData'].get('ErrorType') == 'InvalidDigitsReceived':
+        logger.info('%s InvalidDigitsReceived', LOG_PREFIX)
+        if transaction_attributes.phase == CallPhase.AWAITING_CONSENT:
+            record_outcome(transaction_attributes, abandoned=1)
+        transaction_attributes.phase = CallPhase.ENDED
+        return response(hangup_action(call_id), transaction_attributes=transaction_attributes)
+    return response(transaction_attributes=transaction_attributes)
+
+
+# Keyed by (InvocationEventType, ActionData.Type, CallPhase); None matches any value.  An event with no route
+# for the phase the call is in gets an empty response and leaves the state as it was.
+ROUTES = {
+    ('NEW_INBOUND_CALL', None, CallPhase.NEW): new_inbound_call,
+    ('HANGUP', None, None): hangup,
+    ('NEW_OUTBOUND_CALL', None, CallPhase.NEW): new_outbound_call,
+    ('CALL_ANSWERED', None, CallPhase.DIALING): call_answered,
+    ('ACTION_SUCCESSFUL', 'SpeakAndGetDigits', CallPhase.AWAITING_CONSENT): outbound_digits_received,
+    ('ACTION_SUCCESSFUL', 'SpeakAndGetDigits', CallPhase.AWAITING_EVENT_ID): event_id_received,
+    ('ACTION_SUCCESSFUL', 'SpeakAndGetDigits', CallPhase.AWAITING_PASSCODE): passcode_received,
+    ('ACTION_SUCCESSFUL', 'Pause', CallPhase.DEFERRED): deferred_join,
+    ('ACTION_SUCCESSFUL', 'JoinChimeMeeting', CallPhase.JOINING): joined_meeting,
+    ('ACTION_FAILED', 'JoinChimeMeeting', CallPhase.JOINING): join_failed,
+    ('ACTION_FAILED', 'SpeakAndGetDigits', None): digits_failed,
+}
+
+
+# Call setup ends when the SMA reports the result of the JoinChimeMeeting action
+TRACE_OUTCOMES = {
+    ('ACTION_SUCCESSFUL', 'JoinChimeMeeting'): 'JOINED',
+    ('ACTION_FAILED', 'JoinChimeMeeting'): 'JOIN_FAILED',
+    ('HANGUP', None): 'HANGUP',
+}
 
 
 def response(*actions, transaction_attributes):
@@ -147,7 +376,8 @@ def response(*actions, transaction_attributes):
         'TransactionAttributes': transaction_attributes
     }
 
-    logger.info('%s RESPONSE %s', LOG_PREFIX, json.dumps(res, indent=4))
+    logger.info('%s RESPONSE %s %s', LOG_PREFIX, [action['Type'] for action in actions], transaction_attributes.phase.name)
+    log_payload(logger, '%s RESPONSE %s', LOG_PREFIX, res)
     return res
 
 
@@ -155,68 +385,29 @@ def outbound_call_speak_and_get_digits_action(transaction_attributes):
     return {
         "Type": "SpeakAndGetDigits",
         "Parameters": {
-            "MinNumberOfDigits": 1,
-            "MaxNumberOfDigits": 1,
-            "Repeat": 3,
-            "RepeatDurationInMilliseconds": 3000,
-            "InputDigitsRegex": "[1-2]",
-            "InBetweenDigitsDurationInMilliseconds": 1000,
-            "TerminatorDigits": ["#"],
+            **OUTBOUND_DIGITS_PARAMETERS,
             "SpeechParameters": {
+                **SSML_SPEECH_PARAMETERS,
                 "Text": "<speak>You are needed on a call for event <say-as interpret-as='digits'>" +
                 transaction_attributes['event_id'] +
-                "</say-as>. Press 1 to join, 2 to decline.</speak>",
-                "Engine": "neural",
-                "LanguageCode": "en-US",
-                "TextType": "ssml",
-                "VoiceId": "Joanna"},
-            "FailureSpeechParameters": {
-                "Text": "Sorry, I didn't get that.  Please press 1 to join, 2 to decline.",
-                "Engine": "neural",
-                "LanguageCode": "en-US",
-                "TextType": "text",
-                "VoiceId": "Joanna"},
-        },
+                "</say-as>. Press 1 to join, 2 to decline.</speak>"}
+        }
     }
 
 
-def inbound_call_speak_and_get_digits_action(text):
+def speak_action(call_id, message):
     return {
-        "Type": "SpeakAndGetDigits",
-        "Parameters": {
-            "MinNumberOfDigits": 6,
-            "MaxNumberOfDigits": 6,
-            "Repeat": 3,
-            "RepeatDurationInMilliseconds": 7500,
-            "InputDigitsRegex": "[0-9]",
-            "InBetweenDigitsDurationInMilliseconds": 1000,
-            "TerminatorDigits": ["#"],
-            "SpeechParameters": {
-                "Text": text,
-                "Engine": "neural",
-                "LanguageCode": "en-US",
-                "TextType": "ssml",
-                "VoiceId": "Joanna"},
-            "FailureSpeechParameters": {
-                "Text": "Sorry, I didn't get that.  Please try again.",
-                "Engine": "neural",
-                "LanguageCode": "en-US",
-                "TextType": "text",
-                "VoiceId": "Joanna"},
-        },
+        "Type": "Speak",
+        "Parameters": {**TEXT_SPEECH_PARAMETERS, "Text": message, "CallId": call_id}
     }
 
 
-def speak_action(call_id, message):
+def pause_action(call_id):
     return {
-        "Type": "Speak",
-        "Parameters": {
-                "Text": message,
+        'Type': 'Pause',
+        'Parameters': {
                 "CallId": call_id,
-                "Engine": "neural",
-                "LanguageCode": "en-US",
-                "TextType": "text",
-                "VoiceId": "Joanna"
+                'DurationInMilliseconds': DEFER_MILLISECONDS
         }
     }
 
@@ -242,50 +433,156 @@ def join_chime_meeting_action(call_id, transaction_attributes):
     }
 
 
-def create_meeting(transaction_attributes):
-    logger.info('%s Creating meeting for event %s', LOG_PREFIX, transaction_attributes['event_id'])
+def set_regions(transaction_attributes, item):
+    # The passcode row carries the regions createMeeting chose for the event, and every later call for the
+    # meeting has to go to the same control region
+    media_region, control_region = region_attributes(item)
+    transaction_attributes['media_region'] = media_region
+    if control_region:
+        transaction_attributes['control_region'] = control_region
 
-    check_attendee(transaction_attributes)
 
+def create_meeting(transaction_attributes):
+    logger.info('%s Creating meeting for event %s', LOG_PREFIX, transaction_attributes['event_id'])
     try:
-        meeting_info = chime_sdk_meeting_client.create_meeting_with_attendees(
-            ClientRequestToken=transaction_attributes['event_id'],
-            MediaRegion='us-east-1',
-            ExternalMeetingId=transaction_attributes['event_id'],
-            Attendees=[{
-                'ExternalUserId': transaction_attributes['phone_number']
-            }]
-        )
-        update_table(transaction_attributes,  meeting_info['Meeting']['MeetingId'], meeting_info['Attendees'][0]['AttendeeId'])
-        logger.info('%s Meeting created: %s', LOG_PREFIX, meeting_info)
+        with tracer.span('CreateMeetingWithAttendees'):
+            meeting_info = meeting_clients.get(transaction_attributes.get('control_region')).create_meeting_with_attendees(
+                ClientRequestToken=transaction_attributes['event_id'],
+                MediaRegion=transaction_attributes.get('media_region', DEFAULT_MEDIA_REGION),
+                ExternalMeetingId=transaction_attributes['event_id'],
+                Attendees=[{
+                    'ExternalUserId': transaction_attributes['phone_number']
+                }]
+            )
+        logger.info('%s Meeting created: %s', LOG_PREFIX, meeting_info['Meeting']['MeetingId'])
         return meeting_info
     except Exception as error:
         logger.error('%s Error creating meeting: %s', LOG_PREFIX, error)
-        return error
+        raise error
+
+
+def read_join_details(transaction_attributes):
+    with tracer.span('GetJoinDetails'):
+        return meeting_table.get_item(Key={"EventId": transaction_attributes['event_id'], "MeetingPasscode": transaction_attributes['meeting_passcode']}).get('Item', {})
 
 
-def check_attendee(transaction_attributes):
-    logger.info('%s Getting attendee list for meeting %s', LOG_PREFIX, transaction_attributes['meeting_id'])
+def joined_item(join_details):
+    # Without the row's join details the attendee is taken to be new, so it is counted once it joins and the
+    # row is rewritten
     try:
-        attendee_info = chime_sdk_meeting_client.list_attendees(
-            MeetingId=transaction_attributes['meeting_id'],
-        )
-        for attendee in attendee_info['Attendees']:
-            if attendee['ExternalUserId'] == transaction_attributes['phone_number']:
-                logger.info('%s Attendee already exists', LOG_PREFIX)
-                delete_attendee(transaction_attributes['meeting_id'],  attendee['AttendeeId'])
-            else:
-                continue
-        return True
+        return join_details.result()
+    except Exception as error:
+        logger.error('%s Error reading join details: %s', LOG_PREFIX, error)
+        return {}
+
+
+def defer_join_work(transaction_attributes, item):
+    # Only create_meeting_with_attendees has to finish before the caller can join.  The passcode row already
+    # says which of the follow-up writes are needed, and those run once the SMA reports the join.
+    meeting_id = transaction_attributes['meeting_id']
+    attendee_id = transaction_attributes['attendee_id']
+    if item.get('AttendeeId') == attendee_id and item.get('MeetingId') == meeting_id:
+        logger.info('%s Reusing attendee %s for meeting %s', LOG_PREFIX, attendee_id, meeting_id)
+    else:
+        transaction_attributes['pending_count'] = '1'
+        if item.get('AttendeeId') and item.get('MeetingId') == meeting_id:
+            transaction_attributes['stale_attendee_id'] = item['AttendeeId']
+    if (item.get('JoinMethod'), item.get('MeetingId'), item.get('AttendeeId'), item.get('PoolStatus')) != ('Phone', meeting_id, attendee_id, POOL_CLAIMED):
+        transaction_attributes['pending_update'] = '1'
+
+
+def complete_join(transaction_attributes):
+    pending_update = transaction_attributes.pop('pending_update', None)
+    pending_count = transaction_attributes.pop('pending_count', None)
+    stale_attendee_id = transaction_attributes.pop('stale_attendee_id', None)
+    futures = []
+    if pending_update:
+        futures.append(join_executor.submit(traced_update_table, transaction_attributes))
+    if pending_count:
+        futures.append(join_executor.submit(replace_attendee, transaction_attributes, stale_attendee_id))
+    if transaction_attributes.get('call_type') == 'outbound':
+        futures.append(join_executor.submit(record_outcome, transaction_attributes, accepted=1))
+    # The caller has already joined, so a failed write is logged rather than failing the invocation
+    for future in futures:
+        try:
+            future.result()
+        except Exception as error:
+            logger.error('%s Error completing join for attendee %s: %s', LOG_PREFIX, transaction_attributes['attendee_id'], error)
+
+
+def traced_update_table(transaction_attributes):
+    with tracer.span('UpdateTable'):
+        return update_table(transaction_attributes, transaction_attributes['meeting_id'], transaction_attributes['attendee_id'])
+
+
+def replace_attendee(transaction_attributes, stale_attendee_id):
+    # The attendee left behind by the caller's previous join is swapped for the new one, so the count only
+    # goes up when there was nothing to remove
+    removed = False
+    if stale_attendee_id:
+        with tracer.span('DeleteAttendee'):
+            removed = delete_attendee(transaction_attributes, transaction_attributes['meeting_id'], stale_attendee_id)
+    if not removed:
+        with tracer.span('UpdateAttendeeCount'):
+            update_attendee_count(transaction_attributes['event_id'], transaction_attributes['meeting_id'], 1)
+
+
+def record_outcome(transaction_attributes, **counts):
+    try:
+        record_dial_progress(meeting_table, transaction_attributes['event_id'], **counts)
+    except Exception as error:
+        logger.error('%s Error recording call outcome %s: %s', LOG_PREFIX, counts, error)
+
+
+def record_hangup(transaction_attributes):
+    # Only the first HANGUP of a dialed call frees its place in the active call count.  A call that hangs up
+    # before it was answered is dialed again after a back-off, up to REDIAL_LIMIT times.
+    transaction_attributes['hangup_recorded'] = '1'
+    counts = {'ended': 1}
+    if transaction_attributes.phase == CallPhase.DIALING:
+        counts['unanswered'] = 1
+        if redial(transaction_attributes):
+            counts['redialed'] = 1
+    elif transaction_attributes.phase == CallPhase.AWAITING_CONSENT:
+        counts['abandoned'] = 1
+    record_outcome(transaction_attributes, **counts)
+    try:
+        record_active_calls(meeting_table, -1)
+    except Exception as error:
+        logger.error('%s Error releasing active call: %s', LOG_PREFIX, error)
+
+
+def redial(transaction_attributes):
+    redials = int(transaction_attributes.get('redials', '0'))
+    if dial_queue is None or redials >= REDIAL_LIMIT:
+        return False
+    job = {name: transaction_attributes[name] for name in DIAL_ARGUMENTS if transaction_attributes.get(name)}
+    job['redials'] = str(redials + 1)
+    delay = redial_delay(redials)
+    try:
+        failed = dial_queue.send([job], delay_seconds=delay)
     except Exception as error:
-        logger.error('%s Error getting attendee: %s', LOG_PREFIX, error)
-        return error
+        logger.error('%s Error redialing %s: %s', LOG_PREFIX, transaction_attributes['phone_number'], error)
+        return False
+    if failed:
+        logger.error('%s Redial of %s was not queued', LOG_PREFIX, transaction_attributes['phone_number'])
+        return False
+    logger.info('%s No answer from %s, redialing in %s seconds', LOG_PREFIX, transaction_attributes['phone_number'], delay)
+    return True
+
 
+def delete_meeting(transaction_attributes, meeting_id):
+    # A meeting that cannot be deleted now is left to the sweeper, and the rest of the cleanup still runs
+    try:
+        meeting_clients.get(transaction_attributes.get('control_region')).delete_meeting(MeetingId=meeting_id)
+    except (ClientError, CircuitOpenError) as error:
+        logger.error('%s Error deleting meeting %s: %s', LOG_PREFIX, meeting_id, error)
 
-def delete_attendee(meeting_id, attendee_id):
+
+def delete_attendee(transaction_attributes, meeting_id, attendee_id):
     logger.info('%s Deleting attendee %s for meeting %s', LOG_PREFIX, attendee_id, meeting_id)
     try:
-        chime_sdk_meeting_client.delete_attendee(
+        meeting_clients.get(transaction_attributes.get('control_region')).delete_attendee(
             MeetingId=meeting_id,
             AttendeeId=attendee_id
         )
@@ -293,7 +590,37 @@ def delete_attendee(meeting_id, attendee_id):
         return True
     except Exception as error:
         logger.error('%s Error deleting attendee: %s', LOG_PREFIX, error)
-        return error
+        return False
+
+
+def update_attendee_count(event_id, meeting_id, delta):
+    try:
+        return adjust_attendee_count(meeting_table, event_id, meeting_id, delta)
+    except Exception as error:
+        logger.error('%s Error updating attendee count: %s', LOG_PREFIX, error)
+        return None
+
+
+def release_pooled_attendee(transaction_attributes):
+    try:
+        release_attendee(meeting_table, transaction_attributes['event_id'], transaction_attributes['meeting_passcode'], transaction_attributes['attendee_id'])
+    except Exception as error:
+        logger.error('%s Error releasing pooled attendee: %s', LOG_PREFIX, error)
+
+
+def clear_meeting_record(event_id, meeting_id):
+    try:
+        clear_meeting(meeting_table, event_id, meeting_id)
+    except Exception as error:
+        logger.error('%s Error clearing meeting %s: %s', LOG_PREFIX, meeting_id, error)
+
+
+def drain_pooled_attendees(event_id, meeting_id):
+    try:
+        drained = drain_pool(meeting_table, event_id, meeting_id)
+        logger.info('%s Emptied %s pooled attendees for meeting %s', LOG_PREFIX, drained, meeting_id)
+    except Exception as error:
+        logger.error('%s Error emptying attendee pool: %s', LOG_PREFIX, error)
 
 
 def update_table(transaction_attributes, meeting_id, attendee_id):
@@ -301,11 +628,11 @@ def update_table(transaction_attributes, meeting_id, attendee_id):
     try:
         table_update = meeting_table.update_item(
                     Key={"EventId": transaction_attributes['event_id'], "MeetingPasscode": transaction_attributes['meeting_passcode']},
-                    UpdateExpression="set JoinMethod = :j, MeetingId = :m, AttendeeId = :a",
-                    ExpressionAttributeValues={":j": 'Phone',  ":m": meeting_id, ":a": attendee_id},
+                    UpdateExpression="set JoinMethod = :j, MeetingId = :m, AttendeeId = :a, JoinToken = :t, PoolStatus = :p",
+                    ExpressionAttributeValues={":j": 'Phone',  ":m": meeting_id, ":a": attendee_id, ":t": transaction_attributes['join_token'], ":p": POOL_CLAIMED},
                     ReturnValues="UPDATED_NEW"),
-        logger.info('%s s Table update: %s', LOG_PREFIX, json.dumps(table_update, cls=DecimalEncoder, indent=4))
+        logger.debug('%s Table update: %s', LOG_PREFIX, LazyJson(table_update))
         return True
     except Exception as error:
         logger.error('%s Error updating table: %s', LOG_PREFIX, error)
-        return error
+        raise error
@@ -0,0 +1,161 @@
+import { Duration, RemovalPolicy, Stack } from 'aws-cdk-lib';
+import {
+  CfnApi,
+  CfnIntegration,
+  CfnRoute,
+  CfnStage,
+} from 'aws-cdk-lib/aws-apigatewayv2';
+import { IUserPool, IUserPoolClient } from 'aws-cdk-lib/aws-cognito';
+import {
+  AttributeType,
+  Table,
+  BillingMode,
+  TableEncryption,
+  ProjectionType,
+} from 'aws-cdk-lib/aws-dynamodb';
+import { Rule } from 'aws-cdk-lib/aws-events';
+import { LambdaFunction } from 'aws-cdk-lib/aws-events-targets';
+import { PolicyStatement, ServicePrincipal } from 'aws-cdk-lib/aws-iam';
+import {
+  Architecture,
+  Runtime,
+  Code,
+  Function,
+  ILayerVersion,
+  StartingPosition,
+} from 'aws-cdk-lib/aws-lambda';
+import { DynamoEventSource } from 'aws-cdk-lib/aws-lambda-event-sources';
+import { Construct } from 'constructs';
+
+const STAGE_NAME = 'prod';
+
+export interface RosterFeedProps {
+  meetingTable: Table;
+  chimeSdkRule: Rule;
+  userPool: IUserPool;
+  userPoolClient: IUserPoolClient;
+  userPoolRegion: string;
+  commonLayer: ILayerVersion;
+  logLevel: string;
+  debugSampleRate: string;
+}
+
+export class RosterFeed extends Construct {
+  public connectionsTable: Table;
+  public rosterFeedHandler: Function;
+  public rosterFeedUrl: string;
+
+  constructor(scope: Construct, id: string, props: RosterFeedProps) {
+    super(scope, id);
+
+    const region = Stack.of(this).region;
+
+    this.connectionsTable = new Table(this, 'connectionsTable', {
+      partitionKey: {
+        name: 'MeetingId',
+        type: AttributeType.STRING,
+      },
+      sortKey: {
+        name: 'ConnectionId',
+        type: AttributeType.STRING,
+      },
+      removalPolicy: RemovalPolicy.DESTROY,
+      encryption: TableEncryption.AWS_MANAGED,
+      timeToLiveAttribute: 'TTL',
+      billingMode: BillingMode.PAY_PER_REQUEST,
+    });
+
+    this.connectionsTable.addGlobalSecondaryIndex({
+      projectionType: ProjectionType.KEYS_ONLY,
+      indexName: 'ConnectionIdIndex',
+      partitionKey: {
+        name: 'ConnectionId',
+        type: AttributeType.STRING,
+      },
+    });
+
+    const api = new CfnApi(this, 'rosterFeedApi', {
+      name: 'RosterFeed',
+      protocolType: 'WEBSOCKET',
+      routeSelectionExpression: '$request.body.action',
+    });
+
+    this.rosterFeedHandler = new Function(this, 'rosterFeedHandler', {
+      code: Code.fromAsset('src/resources/rosterFeed', {
+        bundling: {
+          image: Runtime.PYTHON_3_12.bundlingImage,
+          command: [
+            'bash',
+            '-c',
+            'pip install -r requirements.txt -t /asset-output && cp -au . /asset-output',
+          ],
+        },
+      }),
+      handler: 'index.handler',
+      layers: [props.commonLayer],
+      environment: {
+        CONNECTIONS_TABLE: this.connectionsTable.tableName,
+        CALLBACK_URL: `https://${api.ref}.execute-api.${region}.amazonaws.com/${STAGE_NAME}`,
+        USER_POOL_ID: props.userPool.userPoolId,
+        USER_POOL_CLIENT_ID: props.userPoolClient.userPoolClientId,
+        USER_POOL_REGION: props.userPoolRegion,
+        LOG_LEVEL: props.logLevel,
+        DEBUG_SAMPLE_RATE: props.debugSampleRate,
+      },
+      runtime: Runtime.PYTHON_3_12,
+      architecture: Architecture.ARM_64,
+      timeout: Duration.seconds(60),
+    });
+
+    this.connectionsTable.grantReadWriteData(this.rosterFeedHandler);
+    this.rosterFeedHandler.addToRolePolicy(
+      new PolicyStatement({
+        resources: [
+          `arn:aws:execute-api:${region}:${
+            Stack.of(this).account
+          }:${api.ref}/${STAGE_NAME}/POST/@connections/*`,
+        ],
+        actions: ['execute-api:ManageConnections'],
+      }),
+    );
+    this.rosterFeedHandler.addPermission('rosterFeedApiInvoke', {
+      principal: new ServicePrincipal('apigateway.amazonaws.com'),
+      sourceArn: `arn:aws:execute-api:${region}:${
+        Stack.of(this).account
+      }:${api.ref}/*`,
+    });
+
+    const integration = new CfnIntegration(this, 'rosterFeedIntegration', {
+      apiId: api.ref,
+      integrationType: 'AWS_PROXY',
+      integrationUri: `arn:aws:apigateway:${region}:lambda:path/2015-03-31/functions/${this.rosterFeedHandler.functionArn}/invocations`,
+    });
+
+    const stage = new CfnStage(this, 'rosterFeedStage', {
+      apiId: api.ref,
+      stageName: STAGE_NAME,
+      autoDeploy: true,
+    });
+
+    ['$connect', '$disconnect', '$default'].forEach((routeKey) => {
+      const route = new CfnRoute(this, `rosterFeedRoute${routeKey}`, {
+        apiId: api.ref,
+        routeKey: routeKey,
+        target: `integrations/${integration.ref}`,
+      });
+      stage.node.addDependency(route);
+    });
+
+    this.rosterFeedHandler.addEventSource(
+      new DynamoEventSource(props.meetingTable, {
+        startingPosition: StartingPosition.LATEST,
+        batchSize: 100,
+        maxBatchingWindow: Duration.seconds(1),
+        retryAttempts: 2,
+      }),
+    );
+    props.chimeSdkRule.addTarget(new LambdaFunction(this.rosterFeedHandler));
+
+    this.rosterFeedUrl = `wss://${api.ref}.execute-api.${region}.amazonaws.com/${STAGE_NAME}`;
+  }
+}
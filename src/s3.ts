@@ -26,6 +26,7 @@ export class S3Resources extends Construct {
     });
 
     this.triggerBucket.grantRead(props.createMeetingHandler);
+    this.triggerBucket.grantPut(props.createMeetingHandler, 'reports/*');
     props.meetingTable.grantReadWriteData(props.createMeetingHandler);
 
     props.createMeetingHandler.addEventSource(
@@ -15,6 +15,7 @@ import * as fsExtra from 'fs-extra';
 
 interface SiteProps {
   apiUrl: string;
+  rosterFeedUrl: string;
   userPool: IUserPool;
   userPoolClient: IUserPoolClient;
   siteBucket: Bucket;
@@ -91,6 +92,7 @@ export class Site extends Construct {
 
     const config = {
       apiUrl: props.apiUrl,
+      rosterFeedUrl: props.rosterFeedUrl,
       userPoolRegion: Stack.of(this).region,
       userPoolId: props.userPool.userPoolId,
       userPoolClientId: props.userPoolClient.userPoolClientId,
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks')
+sys.path.insert(0, BENCHMARKS)
+
+import load_test  # noqa: E402
+import stubs  # noqa: E402
+
+if load_test.LAYER not in sys.path:
+    sys.path.insert(0, load_test.LAYER)
+
+
+@pytest.fixture
+def handlers():
+    # Loads a fresh copy of each named handler with every AWS client replaced by the benchmark stubs
+    def load(*names):
+        modules = {name: load_test.load_handler(name) for name in names}
+        table = load_test.install_stubs(modules, stubs.Latency())
+        return table, modules
+    return load
@@ -0,0 +1,58 @@
+from load_test import EVENT_ID, JOINED, PASSCODE, POOLED_PASSCODE, digits, sma_event
+from sma_dialer.attendee_index import adjust_attendee_count, meeting_key
+
+MEETING_ID = 'meeting-' + EVENT_ID
+
+
+def outbound_arguments():
+    return {
+        'meeting_id': MEETING_ID,
+        'attendee_id': 'attendee-outbound',
+        'join_token': 'token-outbound',
+        'event_id': EVENT_ID,
+        'meeting_passcode': PASSCODE,
+        'phone_number': '+13125550000',
+    }
+
+
+def attendee_count(table):
+    return table.items[tuple(meeting_key(EVENT_ID).values())]['AttendeeCount']
+
+
+def test_outbound_hangup_leaves_inbound_caller_in_meeting(handlers):
+    table, modules = handlers('smaHandler')
+    handler = modules['smaHandler'].handler
+    deleted = []
+    modules['smaHandler'].meeting_clients.client.operations['delete_meeting'] = lambda **kwargs: deleted.append(kwargs['MeetingId']) or {}
+    # createMeeting marks the meeting active without counting its pooled attendees
+    adjust_attendee_count(table, EVENT_ID, MEETING_ID, 0)
+
+    inbound = handler(sma_event('NEW_INBOUND_CALL', None), None)['TransactionAttributes']
+    inbound = handler(sma_event('ACTION_SUCCESSFUL', inbound, action_data=digits(EVENT_ID)), None)['TransactionAttributes']
+    inbound = handler(sma_event('ACTION_SUCCESSFUL', inbound, action_data=digits(POOLED_PASSCODE)), None)['TransactionAttributes']
+    handler(sma_event('ACTION_SUCCESSFUL', inbound, action_data=JOINED), None)
+    assert attendee_count(table) == 1
+
+    action_data = {'Type': 'CallAndBridge', 'Parameters': {'Arguments': outbound_arguments()}}
+    outbound = handler(sma_event('NEW_OUTBOUND_CALL', None, action_data=action_data), None)['TransactionAttributes']
+    outbound = handler(sma_event('CALL_ANSWERED', outbound), None)['TransactionAttributes']
+    outbound = handler(sma_event('ACTION_SUCCESSFUL', outbound, action_data=digits('1')), None)['TransactionAttributes']
+    outbound = handler(sma_event('ACTION_SUCCESSFUL', outbound, action_data=JOINED), None)['TransactionAttributes']
+    assert attendee_count(table) == 2
+
+    handler(sma_event('HANGUP', outbound, participants=2), None)
+    assert attendee_count(table) == 1
+    assert deleted == []
+
+
+def test_outbound_hangup_before_join_is_not_counted(handlers):
+    table, modules = handlers('smaHandler')
+    handler = modules['smaHandler'].handler
+    adjust_attendee_count(table, EVENT_ID, MEETING_ID, 1)
+
+    action_data = {'Type': 'CallAndBridge', 'Parameters': {'Arguments': outbound_arguments()}}
+    outbound = handler(sma_event('NEW_OUTBOUND_CALL', None, action_data=action_data), None)['TransactionAttributes']
+    outbound = handler(sma_event('CALL_ANSWERED', outbound), None)['TransactionAttributes']
+    outbound = handler(sma_event('ACTION_SUCCESSFUL', outbound, action_data=digits('1')), None)['TransactionAttributes']
+    handler(sma_event('HANGUP', outbound, participants=2), None)
+    assert attendee_count(table) == 1
@@ -0,0 +1,87 @@
+import pytest
+
+import load_test
+from sma_dialer.call_state import CALL_STATE_KEY, CallPhase, CallState, CallStateError, decode, encode
+
+INBOUND = {
+    'call_type': 'inbound', 'event_id': '123456', 'meeting_passcode': '654321', 'meeting_id': 'meeting',
+    'attendee_id': 'attendee', 'join_token': 'token', 'phone_number': '+13125551212', 'media_region': 'us-east-1',
+    'trace_id': 'trace', 'trace_start': '1700000000000', 'trace_handler_ms': '12.5',
+}
+OUTBOUND = dict(INBOUND, call_type='outbound', control_region='us-east-1', trace_answered='1700000004000')
+
+
+@pytest.mark.parametrize('phase', list(CallPhase))
+@pytest.mark.parametrize('values', [
+    {},
+    {'call_type': 'inbound'},
+    dict(INBOUND, pending_update='1', pending_count='1', stale_attendee_id='stale'),
+    dict(OUTBOUND, pooled='1', hangup_recorded='1', redials='2'),
+    {'call_type': 'inbound', 'event_id': '123456', 'deferrals': '1', 'deferred_digits': '654321'},
+])
+def test_round_trip(phase, values):
+    state = decode(encode(CallState(phase, values)))
+    assert state == values
+    assert state.phase == phase
+
+
+def test_encoded_state_drops_trailing_blanks():
+    assert encode(CallState(CallPhase.AWAITING_EVENT_ID, {'call_type': 'inbound'})) == {CALL_STATE_KEY: '1E0|i'}
+
+
+def test_unknown_fields_are_refused():
+    with pytest.raises(CallStateError):
+        encode(CallState(CallPhase.NEW, {'unknown': 'value'}))
+    with pytest.raises(CallStateError):
+        encode(CallState(CallPhase.NEW, {'event_id': '1|2'}))
+    with pytest.raises(CallStateError):
+        decode({CALL_STATE_KEY: '9M0'})
+
+
+def legacy(values, *removed, **added):
+    return dict({name: value for name, value in values.items() if name not in removed}, **added)
+
+
+ANSWERED = legacy(OUTBOUND, 'media_region')
+RINGING = legacy(ANSWERED, 'trace_answered')
+
+
+# Attributes as the previous handler left them, one key per value, at each step of a call
+@pytest.mark.parametrize('attributes, phases', [
+    ({}, (CallPhase.NEW,)),
+    ({'call_type': 'inbound', 'trace_id': 'trace'}, (CallPhase.AWAITING_EVENT_ID,)),
+    ({'call_type': 'inbound', 'event_id': '123456'}, (CallPhase.AWAITING_PASSCODE,)),
+    ({'call_type': 'inbound', 'event_id': '123456', 'deferrals': '1', 'deferred_digits': '654321'}, (CallPhase.DEFERRED,)),
+    (legacy(INBOUND, pending_update='1', pending_count='1'), (CallPhase.JOINING,)),
+    (legacy(INBOUND, pooled='1'), (CallPhase.JOINING,)),
+    (legacy(INBOUND, deferrals='1'), (CallPhase.JOINING,)),
+    (INBOUND, (CallPhase.JOINED, CallPhase.JOINING)),
+    (RINGING, (CallPhase.DIALING,)),
+    (legacy(ANSWERED, pending_update='1'), (CallPhase.JOINING,)),
+    # Waiting on the participant's answer and joined carry the same keys
+    (ANSWERED, (CallPhase.JOINED, CallPhase.AWAITING_CONSENT)),
+    # Without the tracer's keys an outbound call could be at any step
+    (legacy(RINGING, 'trace_id', 'trace_start', 'trace_handler_ms'), (CallPhase.JOINED, CallPhase.AWAITING_CONSENT, CallPhase.DIALING)),
+])
+def test_legacy_attributes_round_trip(attributes, phases):
+    state = decode(dict(attributes, unknown='dropped'))
+    assert state.phases == phases
+    assert state.phase == phases[0]
+    assert state == attributes
+    again = decode(encode(state))
+    assert again == attributes
+    assert again.phase == phases[0]
+
+
+def test_legacy_call_is_routed_in_latest_phase_that_fits(handlers):
+    table, modules = handlers('smaHandler')
+    sma = modules['smaHandler']
+    # Answered and waiting on the participant, which the keys cannot tell apart from joined
+    attributes = legacy(ANSWERED, event_id=load_test.EVENT_ID, meeting_passcode=load_test.PASSCODE)
+    result = sma.handler(load_test.sma_event('ACTION_SUCCESSFUL', attributes, action_data=load_test.digits('1')), None)
+    assert [action['Type'] for action in result['Actions']] == ['JoinChimeMeeting']
+    assert decode(result['TransactionAttributes']).phase == CallPhase.JOINING
+    # A joined call has nothing left to do but hang up
+    result = sma.handler(load_test.sma_event('CALL_ANSWERED', attributes), None)
+    assert result['Actions'] == []
+    assert decode(result['TransactionAttributes']).phase == CallPhase.JOINED
@@ -0,0 +1,112 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from sma_dialer.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, GuardedClient, is_dependency_failure
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}, 'ResponseMetadata': {'HTTPStatusCode': 400}}, 'Operation')
+
+
+def raises(error):
+    def operation():
+        raise error
+    return operation
+
+
+def trip(breaker):
+    for attempt in range(breaker.failure_threshold):
+        with pytest.raises(ClientError):
+            breaker.call(raises(client_error('ThrottlingException')))
+
+
+def test_dependency_failures_are_told_apart_from_bad_requests():
+    assert is_dependency_failure(client_error('ThrottlingException'))
+    assert is_dependency_failure(client_error('ServiceUnavailableException'))
+    assert is_dependency_failure(CircuitOpenError('dynamodb', 1))
+    assert not is_dependency_failure(client_error('ConditionalCheckFailedException'))
+    assert not is_dependency_failure(ValueError())
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker('dynamodb', failure_threshold=3, reset_timeout=30, clock=Clock())
+    trip(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.call(lambda: 'ok')
+    assert error.value.retry_after == 30
+    assert breaker.rejected == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker('dynamodb', failure_threshold=3, clock=Clock())
+    for attempt in range(2):
+        with pytest.raises(ClientError):
+            breaker.call(raises(client_error('ThrottlingException')))
+    assert breaker.call(lambda: 'ok') == 'ok'
+    with pytest.raises(ClientError):
+        breaker.call(raises(client_error('ThrottlingException')))
+    assert breaker.state == CLOSED
+
+
+def test_request_errors_do_not_open_circuit():
+    breaker = CircuitBreaker('dynamodb', failure_threshold=1, clock=Clock())
+    with pytest.raises(ClientError):
+        breaker.call(raises(client_error('ConditionalCheckFailedException')))
+    assert breaker.state == CLOSED
+
+
+def test_half_open_trial_success_closes_circuit():
+    clock = Clock()
+    breaker = CircuitBreaker('dynamodb', failure_threshold=1, reset_timeout=30, clock=clock)
+    trip(breaker)
+    clock.now = 30
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only the one trial call is let through while it is in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.call(lambda: 'ok') == 'ok'
+
+
+def test_half_open_trial_failure_reopens_circuit():
+    clock = Clock()
+    breaker = CircuitBreaker('dynamodb', failure_threshold=3, reset_timeout=30, clock=clock)
+    trip(breaker)
+    clock.now = 30
+    with pytest.raises(ClientError):
+        breaker.call(raises(client_error('ServiceUnavailableException')))
+    assert breaker.state == OPEN
+    clock.now = 59
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'ok')
+    clock.now = 60
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CLOSED
+
+
+def test_guarded_client_passes_unguarded_attributes_through():
+    class Client:
+        meta = 'meta'
+
+        def get_item(self):
+            raise client_error('ThrottlingException')
+
+    breaker = CircuitBreaker('dynamodb', failure_threshold=1, clock=Clock())
+    client = GuardedClient(Client(), breaker)
+    with pytest.raises(ClientError):
+        client.get_item()
+    assert breaker.state == OPEN
+    assert client.meta == 'meta'
+    with pytest.raises(CircuitOpenError):
+        client.get_item()
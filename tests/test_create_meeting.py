@@ -0,0 +1,25 @@
+from load_test import EVENT_ID
+
+
+def test_progress_keeps_a_join_that_claimed_the_row(handlers):
+    table, modules = handlers('createMeeting')
+    create_meeting = modules['createMeeting']
+    table.put_item(Item={
+        'EventId': EVENT_ID, 'MeetingPasscode': '222222', 'MeetingId': 'meeting-1', 'AttendeeId': 'attendee-1',
+        'PhoneNumber': '+13125551212', 'PoolStatus': 'CLAIMED', 'JoinMethod': 'Phone'
+    })
+    # A participant resumed from a checkpoint carries no JoinToken
+    attendee = {'PhoneNumber': '+13125551212', 'MeetingId': 'meeting-1', 'AttendeeId': 'attendee-1', 'RunId': 'run'}
+    create_meeting.LOG_PREFIX = ''
+    create_meeting.record_progress([(attendee, {'MeetingPasscode': 222222, 'CallStatus': 'Success'})], EVENT_ID)
+    row = table.items[(EVENT_ID, '222222')]
+    assert row['CallStatus'] == 'Success'
+    assert (row['PoolStatus'], row['JoinMethod']) == ('CLAIMED', 'Phone')
+
+
+def test_progress_does_not_recreate_a_deleted_row(handlers):
+    table, modules = handlers('createMeeting')
+    create_meeting = modules['createMeeting']
+    create_meeting.LOG_PREFIX = ''
+    create_meeting.record_progress([({'PhoneNumber': '+13125551212'}, {'MeetingPasscode': 333333, 'EmailStatus': 'Success'})], EVENT_ID)
+    assert (EVENT_ID, '333333') not in table.items
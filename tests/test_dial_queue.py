@@ -0,0 +1,127 @@
+import json
+
+from botocore.exceptions import ClientError
+
+import stubs
+from sma_dialer.circuit import CircuitOpenError
+from sma_dialer.dial_queue import InMemoryDialQueue
+from sma_dialer.rate_limit import TokenBucket
+
+EVENT_ID = '123456'
+JOB = {'event_id': EVENT_ID, 'meeting_id': 'meeting', 'attendee_id': 'attendee', 'phone_number': '+13125551212'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def fail_all(event, context):
+    return {'batchItemFailures': [{'itemIdentifier': record['messageId']} for record in event['Records']]}
+
+
+def test_completed_messages_leave_the_queue():
+    queue = InMemoryDialQueue()
+    queue.send([JOB, JOB])
+    event = queue.receive()
+    assert len(queue) == 0
+    queue.complete(event, {'batchItemFailures': []})
+    assert len(queue) == 0
+    assert queue.dead_letters == []
+
+
+def test_failed_messages_are_received_again_until_dead_lettered():
+    queue = InMemoryDialQueue(max_receives=3)
+    queue.send([JOB])
+    receive_counts = []
+    while len(queue):
+        event = queue.receive()
+        receive_counts.extend(record['attributes']['ApproximateReceiveCount'] for record in event['Records'])
+        queue.complete(event, fail_all(event, None))
+    assert receive_counts == ['1', '2', '3']
+    assert [json.loads(record['body']) for record in queue.dead_letters] == [JOB]
+
+
+def test_delayed_messages_are_not_visible_until_released():
+    queue = InMemoryDialQueue()
+    queue.send([JOB], delay_seconds=5)
+    assert queue.receive() == {'Records': []}
+    assert queue.release_delayed() == 1
+    assert [json.loads(record['body']) for record in queue.receive()['Records']] == [JOB]
+
+
+def throttled_once():
+    calls = []
+
+    def create_sip_media_application_call(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'CreateSipMediaApplicationCall')
+        return {'SipMediaApplicationCall': {'TransactionId': 'transaction'}}
+    return calls, create_sip_media_application_call
+
+
+def test_dialer_retries_throttled_call(handlers, monkeypatch):
+    table, modules = handlers('dialer')
+    dialer = modules['dialer']
+    monkeypatch.setattr(dialer, 'DIAL_BACKOFF', 0)
+    calls, operation = throttled_once()
+    dialer.chime_sdk_voice_client = stubs.StubClient(stubs.Latency(), create_sip_media_application_call=operation)
+    queue = InMemoryDialQueue()
+    queue.send([JOB])
+    assert queue.drain(dialer.handler) == 1
+    assert len(calls) == 2
+    assert queue.dead_letters == []
+    assert table.items[(EVENT_ID, 'MEETING')]['DialsPlaced'] == 1
+
+
+def test_dialer_leaves_jobs_on_queue_while_circuit_is_open(handlers):
+    table, modules = handlers('dialer')
+    dialer = modules['dialer']
+
+    def create_sip_media_application_call(**kwargs):
+        raise CircuitOpenError('chime-sdk-voice', 30)
+    dialer.chime_sdk_voice_client = stubs.StubClient(stubs.Latency(), create_sip_media_application_call=create_sip_media_application_call)
+    queue = InMemoryDialQueue(max_receives=dialer.MAX_RECEIVES)
+    queue.send([JOB])
+    event = queue.receive()
+    queue.complete(event, dialer.handler(event, None))
+    assert len(queue) == 1
+    # Deferred jobs are not counted as failed, even once they reach the dead-letter queue
+    assert queue.drain(dialer.handler) == dialer.MAX_RECEIVES - 1
+    assert len(queue.dead_letters) == 1
+    assert 'DialsFailed' not in table.items.get((EVENT_ID, 'MEETING'), {})
+
+
+def test_token_bucket_refills_at_rate():
+    clock = Clock()
+    bucket = TokenBucket(2, burst=2, clock=clock, sleep=clock.sleep)
+    assert [bucket.try_acquire() for attempt in range(3)] == [True, True, False]
+    clock.now += 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    # Tokens do not build up beyond the burst
+    clock.now += 10
+    assert [bucket.try_acquire() for attempt in range(3)] == [True, True, False]
+
+
+def test_token_bucket_acquire_waits_for_token():
+    clock = Clock()
+    bucket = TokenBucket(4, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire()
+    assert bucket.acquire()
+    assert clock.now == 0.25
+
+
+def test_token_bucket_acquire_gives_up_at_deadline():
+    clock = Clock()
+    bucket = TokenBucket(1, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire(deadline=0.5)
+    assert not bucket.acquire(deadline=0.5)
+    assert clock.now == 0.0
@@ -0,0 +1,20 @@
+import json
+
+from sma_dialer.circuit import CircuitOpenError
+
+
+def open_circuit(**kwargs):
+    raise CircuitOpenError('chime-sdk-meetings', 30)
+
+
+def test_delete_is_refused_while_circuit_is_open(handlers):
+    table, modules = handlers('endMeeting')
+    end_meeting = modules['endMeeting']
+    end_meeting.meeting_clients.client.operations['delete_meeting'] = open_circuit
+    row = {'EventId': '123456', 'MeetingPasscode': '654321', 'MeetingId': 'meeting'}
+    table.put_item(Item=row)
+
+    response = end_meeting.handler({'body': json.dumps({'meetingId': 'meeting'})}, None)
+    assert response['statusCode'] == 503
+    # Left for the sweeper
+    assert table.items[('123456', '654321')] == row
@@ -0,0 +1,44 @@
+import json
+
+from load_test import EVENT_ID, PASSCODE, digits, sma_event
+
+
+def meeting_event(event_type, attendee_id, timestamp, **detail):
+    return {
+        'detail-type': 'Chime Meeting State Change',
+        'detail': dict(detail, eventType=event_type, meetingId='meeting', attendeeId=attendee_id, timestamp=timestamp),
+    }
+
+
+def test_outbound_answer_and_accept_are_counted(handlers):
+    table, modules = handlers('smaHandler')
+    sma = modules['smaHandler']
+    documents = []
+    sma.tracer.emit = lambda document: documents.append(json.loads(document))
+    arguments = {'meeting_id': 'meeting', 'attendee_id': 'attendee', 'join_token': 'token', 'event_id': EVENT_ID,
+                 'meeting_passcode': PASSCODE, 'phone_number': '+13125551212'}
+    action_data = {'Type': 'CallAndBridge', 'Parameters': {'Arguments': arguments}}
+    attributes = sma.handler(sma_event('NEW_OUTBOUND_CALL', None, action_data=action_data), None)['TransactionAttributes']
+    attributes = sma.handler(sma_event('CALL_ANSWERED', attributes), None)['TransactionAttributes']
+    sma.handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=digits('1')), None)
+
+    assert [document.get('CallsAnswered') for document in documents] == [None, 1, None]
+    assert [document.get('CallsAccepted') for document in documents] == [None, None, 1]
+    units = {metric['Name']: metric['Unit'] for metric in documents[1]['_aws']['CloudWatchMetrics'][0]['Metrics']}
+    assert units['CallsAnswered'] == 'Count'
+    assert units['SmaTurnTime'] == 'Milliseconds'
+
+
+def test_meeting_metrics_are_written_every_invocation(handlers):
+    table, modules = handlers('eventBridge')
+    event_bridge = modules['eventBridge']
+    documents = []
+    event_bridge.meeting_metrics.emit = lambda document: documents.append(json.loads(document))
+    event_bridge.handler(meeting_event('chime:AttendeeAdded', 'attendee', 1000), None)
+    event_bridge.handler(meeting_event('chime:AttendeeJoined', 'attendee', 3500, networkType='PSTN'), None)
+
+    assert [document['MeetingId'] for document in documents] == ['meeting', 'meeting']
+    assert documents[0]['AttendeesAdded'] == 1
+    assert documents[1]['AttendeesJoined'] == 1
+    assert documents[1]['PstnJoins'] == 1
+    assert documents[1]['JoinLatency'] == [2500]
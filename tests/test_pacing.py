@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from dial_simulation import CallOutcomes, simulate
+from sma_dialer.pacing import COUNTS, MAX_DELAY_SECONDS, PACING_DELAY, PACING_MAX_DELAY, Pacer, hold_delay
+
+EVENT_ID = '123456'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def counts(**values):
+    return dict(dict.fromkeys(COUNTS, 0), **values)
+
+
+def test_event_limit_uses_max_active_calls():
+    pacer = Pacer(max_active_calls=20, clock=Clock())
+    pacer.observe(0, {EVENT_ID: counts(queued=200)})
+    assert pacer.event_limit(EVENT_ID) == 20
+    assert pacer.allowance(EVENT_ID) == 20
+
+
+def test_event_limit_without_counters_uses_max_active_calls():
+    pacer = Pacer(max_active_calls=20, clock=Clock())
+    pacer.observe(0, {})
+    assert pacer.event_limit(EVENT_ID) == 20
+
+
+def test_event_limit_shrinks_to_remaining_jobs():
+    pacer = Pacer(max_active_calls=20, clock=Clock())
+    # Three jobs left at the prior answer rate of one in two
+    pacer.observe(0, {EVENT_ID: counts(queued=200, placed=197)})
+    assert pacer.event_limit(EVENT_ID) == 6
+
+
+def test_trunk_is_shared_between_dialers():
+    pacer = Pacer(max_active_calls=20, shares=2, clock=Clock())
+    pacer.observe(14, {EVENT_ID: counts(queued=200)})
+    assert pacer.allowance(EVENT_ID) == 3
+    assert [pacer.acquire(EVENT_ID) for attempt in range(4)] == [True, True, True, False]
+    pacer.release(EVENT_ID)
+    assert pacer.acquire(EVENT_ID)
+
+
+def test_hold_delay_backs_off_to_limit():
+    assert hold_delay(0) == PACING_DELAY
+    assert hold_delay(1) == 2 * PACING_DELAY
+    assert hold_delay(20) == min(PACING_MAX_DELAY, MAX_DELAY_SECONDS)
+
+
+@pytest.mark.parametrize('answer_rate', [0.2, 0.5, 0.8])
+def test_paced_campaign_is_no_slower_than_unpaced(answer_rate):
+    def run(max_active_calls):
+        outcomes = CallOutcomes(answer_rate, 0.6, 0.3, seed=1)
+        return simulate(outcomes, 200, 1.0, 2, {'max_active_calls': max_active_calls}, 0, 6 * 3600)
+
+    # With a trunk for every participant the pacer has no reason to hold a call back
+    unpaced = run(10 ** 9)
+    paced = run(200)
+    assert paced['finish_s'] <= unpaced['finish_s']
+    assert paced['held'] == 0
+
+
+def test_paced_campaign_stays_under_max_active_calls():
+    outcomes = CallOutcomes(0.5, 0.6, 0.3, seed=1)
+    result = simulate(outcomes, 200, 1.0, 2, {'max_active_calls': 20}, 2, 6 * 3600)
+    assert result['finish_s'] is not None
+    assert result['peak_active_calls'] <= 20
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, jobs, delay_seconds=0):
+        self.sent.append((jobs, delay_seconds))
+        return []
+
+
+def test_held_jobs_are_resent_with_backoff(handlers):
+    table, modules = handlers('dialer')
+    dialer = modules['dialer']
+    dialer.pacer = Pacer(max_active_calls=0)
+    dialer.dial_queue = RecordingQueue()
+    job = {'event_id': EVENT_ID, 'phone_number': '+13125551212'}
+    records = [
+        {'messageId': '0', 'body': json.dumps(job), 'attributes': {'ApproximateReceiveCount': '1'}},
+        {'messageId': '1', 'body': json.dumps(dict(job, holds='2')), 'attributes': {'ApproximateReceiveCount': '1'}},
+    ]
+    assert dialer.handler({'Records': records}, None) == {'batchItemFailures': []}
+    sent = {delay: jobs for jobs, delay in dialer.dial_queue.sent}
+    assert sent == {hold_delay(0): [dict(job, holds='1')], hold_delay(2): [dict(job, holds='3')]}
+
+
+def test_jobs_in_hand_count_as_remaining():
+    # The queued count is written after the jobs are sent, so a batch can arrive before it
+    pacer = Pacer(max_active_calls=20, clock=Clock())
+    pacer.observe(0, {EVENT_ID: counts(redialed=1)}, waiting={EVENT_ID: 10})
+    assert pacer.event_limit(EVENT_ID) == 20
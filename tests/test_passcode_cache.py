@@ -0,0 +1,37 @@
+import stubs
+from load_test import EVENT_ID, PASSCODE, PHONE_NUMBER, digits, sma_event
+from sma_dialer.attendee_pool import POOL_CLAIMED
+from sma_dialer.cache import PASSCODE_ATTRIBUTES, ItemCache
+from sma_dialer.call_state import decode
+
+KEY = {'EventId': EVENT_ID, 'MeetingPasscode': PASSCODE}
+ROW = dict(KEY, PhoneNumber=PHONE_NUMBER, MediaRegion='us-east-1', MeetingId='meeting-' + EVENT_ID, AttendeeId='attendee-web',
+           JoinToken='token-web', JoinMethod='Web', PoolStatus=POOL_CLAIMED)
+
+
+def test_only_passcode_attributes_are_cached():
+    table = stubs.StubTable(stubs.Latency())
+    table.put_item(Item=ROW)
+    cache = ItemCache()
+    expected = {name: ROW[name] for name in PASSCODE_ATTRIBUTES if name in ROW}
+    assert cache.get_item(table, Key=KEY) == {'Item': expected}
+    calls = table.calls
+    assert cache.get_item(table, Key=KEY) == {'Item': expected}
+    assert table.calls == calls
+
+
+def test_join_reads_current_join_details(handlers):
+    table, modules = handlers('smaHandler')
+    sma = modules['smaHandler']
+    sma.passcode_cache.get_item(table, Key=KEY)
+    # Another container has since joined this caller with the attendee the meeting stub hands out next
+    table.items[(EVENT_ID, PASSCODE)].update(MeetingId='meeting-' + EVENT_ID, AttendeeId='attendee-1', JoinMethod='Phone', PoolStatus=POOL_CLAIMED)
+
+    attributes = sma.handler(sma_event('NEW_INBOUND_CALL', None), None)['TransactionAttributes']
+    attributes = sma.handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=digits(EVENT_ID)), None)['TransactionAttributes']
+    attributes = sma.handler(sma_event('ACTION_SUCCESSFUL', attributes, action_data=digits(PASSCODE)), None)['TransactionAttributes']
+    state = decode(attributes)
+    assert state['attendee_id'] == 'attendee-1'
+    # The attendee was already counted and recorded, so there is nothing left to do once it joins
+    assert 'pending_count' not in state
+    assert 'pending_update' not in state
@@ -0,0 +1,62 @@
+import base64
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import load_test
+import stubs
+
+USER_POOL_ID = 'us-east-1_pool'
+CLIENT_ID = 'site-client'
+
+
+def token(**claims):
+    def part(value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+    return '%s.%s.signature' % (part({'alg': 'RS256'}), part(claims))
+
+
+def access_token(**claims):
+    return token(**dict({'token_use': 'access', 'client_id': CLIENT_ID, 'iss': 'https://cognito-idp.us-east-1.amazonaws.com/' + USER_POOL_ID}, **claims))
+
+
+@pytest.fixture
+def roster_feed(monkeypatch):
+    monkeypatch.setenv('CONNECTIONS_TABLE', 'benchmark-connections')
+    monkeypatch.setenv('CALLBACK_URL', 'https://example.execute-api.us-east-1.amazonaws.com/prod')
+    module = load_test.load_handler('rosterFeed')
+    module.LOG_PREFIX = 'Roster Feed: '
+    module.USER_POOL_ID = USER_POOL_ID
+    module.USER_POOL_CLIENT_ID = CLIENT_ID
+
+    def get_user(AccessToken):
+        if AccessToken.endswith('expired'):
+            raise ClientError({'Error': {'Code': 'NotAuthorizedException', 'Message': 'Access Token has expired'}}, 'GetUser')
+        return {'Username': 'user'}
+    module.cognito_client = stubs.StubClient(stubs.Latency(), get_user=get_user)
+    return module
+
+
+def test_access_token_for_site_client_is_authorized(roster_feed):
+    assert roster_feed.authorized(access_token())
+    assert roster_feed.cognito_client.calls == 1
+
+
+@pytest.mark.parametrize('value', [
+    'not-a-token',
+    'header.!!!.signature',
+    'header.' + base64.urlsafe_b64encode(b'\xff\xfe').decode() + '.signature',
+    'header.' + base64.urlsafe_b64encode(b'[1, 2]').decode() + '.signature',
+    token(token_use='id', aud=CLIENT_ID, iss='https://cognito-idp.us-east-1.amazonaws.com/' + USER_POOL_ID),
+    access_token(client_id='another-client'),
+    access_token(iss='https://cognito-idp.us-east-1.amazonaws.com/us-east-1_other'),
+])
+def test_other_tokens_are_rejected_without_calling_cognito(roster_feed, value):
+    assert not roster_feed.authorized(value)
+    assert roster_feed.cognito_client.calls == 0
+
+
+def test_token_rejected_by_cognito_is_not_authorized(roster_feed):
+    assert not roster_feed.authorized(access_token() + 'expired')
+    assert roster_feed.cognito_client.calls == 1
@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+
+import load_test
+
+
+def test_layer_import_does_not_load_botocore():
+    # Checked in a fresh interpreter as the stubs and other tests may already have imported botocore
+    environment = dict(os.environ, PYTHONPATH=load_test.LAYER)
+    output = subprocess.run(
+        [sys.executable, '-c', "import sys, sma_dialer.runtime; print('botocore' in sys.modules)"],
+        env=environment, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == 'False'